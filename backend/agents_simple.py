@@ -2,7 +2,7 @@
 Simplified Agent System with basic LangChain (no LangGraph)
 Consolidated to 3 core agents matching the original architecture
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_anthropic import ChatAnthropic
 from langchain.prompts import ChatPromptTemplate
 from langchain.memory import ConversationBufferMemory
@@ -10,12 +10,26 @@ from langchain.schema import BaseMessage, HumanMessage, AIMessage
 # import litellm  # Removed as we're not using it for fallback
 import os
 import json
+import asyncio
 import logging
+import time
 from datetime import datetime
 import pandas as pd
 from z2data_client import Z2DataClient
-from code_sandbox import SimpleSandbox as CodeSandbox
+from code_sandbox import sandbox
+from execution_scheduler import execution_scheduler, ExecutionQueueFull
+from code_extraction import extract_code, check_syntax, extraction_stats
+from tracing import traced, current_span
+from metrics import registry, Gauge, routing_latency, llm_latency, coalesced_requests, retries, model_name
+from logging_config import PAYLOAD
+from state_store import state_store, InProcessStore, StateStoreError
 from mcp_registry import MCPRegistry
+from tool_dispatch import ToolDispatcher
+from dataset_store import dataset_store, frame_to_records
+from bom_normalizer import prepare_bom
+from enrichment_cache import enrichment_cache, select_fields
+from manufacturer_index import manufacturer_index
+from mpn_recognizer import extract_mpn
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -23,6 +37,9 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+MEMORY_MAX_MESSAGES = int(os.getenv("MEMORY_MAX_MESSAGES", "100"))
+MEMORY_TTL = float(os.getenv("MEMORY_TTL_SECONDS", "86400"))  # Idle conversations are forgotten after a day
+
 class RouterAgent:
     """Routes messages to appropriate agents using LLM"""
     
@@ -100,33 +117,39 @@ Respond with ONLY the agent name: data, code, or chat"""),
         else:
             return None
     
+    @traced("router.route")
     async def route(self, message: str) -> str:
         """Route the message to appropriate agent"""
+        started = time.perf_counter()
         try:
             if self.llm:
-                response = self.llm.invoke(self.prompt.format_messages(message=message))
+                with llm_latency.time(model=model_name(self.llm)):
+                    response = await self.llm.ainvoke(self.prompt.format_messages(message=message))
                 route = response.content.strip().lower()
 
                 # Validate route
                 if route not in ["data", "code", "chat"]:
                     route = "chat"
 
-                logger.info(f"Routed to {route} agent")
+                logger.debug("Routed to %s agent", route)
+                routing_latency.labels(tier="llm").observe(time.perf_counter() - started)
                 return route
 
         except Exception as e:
-            logger.error(f"Routing error: {e} - falling back to keyword routing")
+            logger.error("Routing error: %s - falling back to keyword routing", e)
 
         # Fallback routing - use simple keyword matching when LLM fails
         message_lower = message.lower()
-        if any(word in message_lower for word in ['part', 'component', 'search', 'find', 'lm', 'tps', 'bav', 'resistor', 'capacitor', 'bom', 'enrich', 'lifecycle', 'market', 'availability', 'manufacturer', 'litigation', 'lawsuit', 'legal', 'company', 'supply chain', 'digikey', 'compliance', 'rohs', 'reach', 'cross reference', 'alternative', 'toshiba', 'intel', 'nxp', 'texas instruments']):
+        if any(word in message_lower for word in ['part', 'component', 'search', 'find', 'lm', 'tps', 'bav', 'resistor', 'capacitor', 'bom', 'enrich', 'lifecycle', 'market', 'availability', 'manufacturer', 'litigation', 'lawsuit', 'legal', 'company', 'supply chain', 'digikey', 'compliance', 'rohs', 'reach', 'cross reference', 'alternative']) or manufacturer_index.find(message):
             route = "data"
         elif any(word in message_lower for word in ['code', 'python', 'script', 'function', 'calculate', 'write', 'generate', 'program']):
             route = "code"
         else:
             route = "chat"
 
-        logger.info(f"Keyword routing: {message} -> {route} agent")
+        logger.debug("Keyword routing: %s -> %s agent", message, route, extra=PAYLOAD)
+        # Includes any failed LLM attempt before the fallback
+        routing_latency.labels(tier="keyword").observe(time.perf_counter() - started)
         return route
 
 class DataAgent:
@@ -137,6 +160,8 @@ class DataAgent:
         api_key = os.environ.get("Z2DATA_API_KEY", "AyxfLYocWpE5HNG")
         self.z2_client = Z2DataClient(api_key)
         self.mcp_registry = MCPRegistry()
+        self.tool_dispatcher = ToolDispatcher(self)
+        self.enrichment_cache = enrichment_cache
         self.llm = self._get_llm()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a specialized data agent for electronic components and supply chain intelligence.
@@ -193,23 +218,32 @@ Always provide structured, actionable data."""),
         else:
             return None
     
+    @traced("agent.data")
     async def process(self, message: str, context: Dict = None, websocket = None) -> Dict[str, Any]:
         """Process data-related requests"""
         try:
             # Check if this is a file enrichment request
-            if context and context.get("file_data"):
+            if context and (context.get("upload_id") or context.get("file_data")):
                 if websocket:
                     await websocket.send_json({
                         "type": "status",
                         "message": "Analyzing file structure and preparing enrichment..."
                     })
-                return await self._enrich_file_data(context["file_data"], websocket)
+                if context.get("upload_id"):
+                    # Load the dataset stored at upload time instead of re-sent JSON
+                    file_data = await asyncio.to_thread(dataset_store.read_frame, context["upload_id"])
+                else:
+                    file_data = context["file_data"]
+                return await self._enrich_file_data(file_data, websocket, fields=context.get("fields"))
 
             # Use MCP registry to analyze and route the query
-            mcp_analysis = self.mcp_registry.analyze_query(message)
+            mcp_analysis = await self.mcp_registry.analyze_query(message)
 
+            # Compound queries ("details, pricing and crosses for LM317 TI") run every planned tool
+            if len(mcp_analysis.get('plan') or []) > 1:
+                response = await self._execute_tool_plan(mcp_analysis, websocket)
             # If MCP registry found a high-confidence tool match, use it
-            if mcp_analysis['tool'] and mcp_analysis['confidence'] > 2.0:
+            elif mcp_analysis['tool'] and mcp_analysis['confidence'] > 2.0:
                 response = await self._execute_mcp_tool(mcp_analysis)
             else:
                 # Fallback to LLM analysis for complex queries
@@ -246,7 +280,7 @@ Always provide structured, actionable data."""),
                         response = f"To get cross references for {analysis.get('part_number', 'this part')}, please specify the manufacturer. For example: 'cross references for LM317 TI' or 'cross references for LM317 Texas Instruments'"
                     else:
                         # Handle cross references through MCP tool selection
-                        mcp_result = self.mcp_registry.analyze_query(message)
+                        mcp_result = await self.mcp_registry.analyze_query(message)
                         if mcp_result and mcp_result.get('tool'):
                             response = await self._execute_mcp_tool(mcp_result)
                         else:
@@ -275,7 +309,7 @@ Always provide structured, actionable data."""),
             if isinstance(response, dict):
                 # Check if it's a table format response
                 if response.get("type") == "table":
-                    logger.info(f"Returning table response with {len(response.get('data', []))} rows")
+                    logger.debug("Returning table response with %s rows", len(response.get('data', [])))
                     # Return the entire dict as the response for table rendering
                     return {
                         "response": response,  # Pass the entire table structure
@@ -284,7 +318,7 @@ Always provide structured, actionable data."""),
                     }
                 elif response.get("type") == "part_details":
                     # For part_details responses, return the structured data properly
-                    logger.info(f"Returning part_details response")
+                    logger.debug("Returning part_details response")
                     return {
                         "response": response,  # Pass the entire part_details structure
                         "agent_type": "data",
@@ -293,7 +327,7 @@ Always provide structured, actionable data."""),
                     }
                 else:
                     # For other dict responses
-                    logger.info(f"Returning dict response with type: {response.get('type', 'unknown')}")
+                    logger.debug("Returning dict response with type: %s", response.get('type', 'unknown'))
                     return {
                         "response": response if response.get("type") else response.get("summary", ""),
                         "agent_type": "data",
@@ -302,7 +336,7 @@ Always provide structured, actionable data."""),
                     }
             else:
                 # For string responses, return as before
-                logger.info(f"Returning string response, length: {len(str(response))}")
+                logger.debug("Returning string response, length: %s", len(str(response)))
                 return {
                     "response": response,
                     "agent_type": "data",
@@ -310,7 +344,7 @@ Always provide structured, actionable data."""),
                 }
             
         except Exception as e:
-            logger.error(f"Data agent error: {e}")
+            logger.error("Data agent error: %s", e)
             return {
                 "response": f"Error processing data request: {e}",
                 "agent_type": "data",
@@ -323,161 +357,101 @@ Always provide structured, actionable data."""),
         tool = mcp_analysis['tool']
         params = mcp_analysis['parameters']
 
-        logger.info(f"Executing MCP tool: {tool['name']} with params: {params}")
+        logger.debug("Executing MCP tool: %s with params: %s", tool['name'], params, extra=PAYLOAD)
 
         try:
-            # Get the API method name from the tool definition
-            api_method = tool.get('api_method')
-
-            if not api_method:
-                return f"Tool {tool['name']} does not have an API method configured"
-
-            # Call the appropriate Z2DataClient method based on the tool
-            if api_method == 'get_company_litigations':
-                if params.get('company'):
-                    result = await self.z2_client.get_company_litigations(params['company'])
-                    if result.get('success'):
-                        return self._format_litigation_response(result)
-                    else:
-                        return f"Failed to get litigation data: {result.get('error', 'Unknown error')}"
-                else:
-                    return "Company name is required for litigation search"
-
-            elif api_method == 'get_company_details':
-                if params.get('company'):
-                    result = await self.z2_client.get_company_details(params['company'])
-                    if result.get('success'):
-                        return self._format_company_details_response(result)
-                    else:
-                        return f"Failed to get company details: {result.get('error', 'Unknown error')}"
-                else:
-                    return "Company name is required for company details"
-
-            elif api_method == 'get_supply_chain_locations':
-                if params.get('company'):
-                    result = await self.z2_client.get_supply_chain_locations(params['company'])
-                    if result.get('success'):
-                        return self._format_supply_chain_response(result)
-                    else:
-                        return f"Failed to get supply chain locations: {result.get('error', 'Unknown error')}"
-                else:
-                    return "Company name is required for supply chain locations"
-
-            elif api_method == 'get_digikey_stock':
-                if params.get('part_number'):
-                    result = await self.z2_client.get_digikey_stock(
-                        params['part_number'],
-                        params.get('manufacturer')
-                    )
-                    if result.get('success'):
-                        return self._format_digikey_response(result)
-                    else:
-                        return f"Failed to get DigiKey stock: {result.get('error', 'Unknown error')}"
-                else:
-                    return "Part number is required for DigiKey stock check"
+            # Handler lookup, parameter binding and formatting live in the dispatch table
+            return await self.tool_dispatcher.dispatch(tool, params)
 
-            elif api_method == 'get_supply_chain_events':
-                result = await self.z2_client.get_supply_chain_events()
-                if result.get('success'):
-                    return self._format_events_response(result)
-                else:
-                    return f"Failed to get supply chain events: {result.get('error', 'Unknown error')}"
+        except Exception as e:
+            logger.error("Error executing MCP tool %s: %s", tool['name'], e, exc_info=True)
+            return f"Error executing {tool['name']}: {str(e)}"
 
-            elif api_method == 'get_part_details':
-                if params.get('part_number') and params.get('manufacturer'):
-                    result = await self._get_part_details(
-                        params['part_number'],
-                        params['manufacturer']
-                    )
-                    logger.info(f"Part details result type: {type(result)}, has type key: {isinstance(result, dict) and 'type' in result}")
-                    if isinstance(result, dict):
-                        logger.info(f"Part details result keys: {result.keys() if isinstance(result, dict) else 'N/A'}")
-
-                        # Convert sections format to part_details format for enhanced display
-                        if result.get('type') == 'sections' and 'sections' in result:
-                            # Use raw API data if available, otherwise use sections
-                            if 'raw_data' in result and result['raw_data']:
-                                # Use the raw API response for best compatibility
-                                result = {
-                                    "type": "part_details",
-                                    "data": result['raw_data'],
-                                    "query": params.get('part_number', '')
-                                }
-                                logger.info(f"Using raw API data for part_details format")
-                            else:
-                                # Fallback: convert sections to table format
-                                table_data = []
-                                for section in result['sections']:
-                                    # Add section header row
-                                    table_data.append({
-                                        "Category": f"--- {section['title']} ---",
-                                        "Field": "",
-                                        "Value": ""
-                                    })
-                                    # Add data rows
-                                    for item in section.get('data', []):
-                                        table_data.append({
-                                            "Category": section['title'],
-                                            "Field": item.get('Field', ''),
-                                            "Value": item.get('Value', '')
-                                        })
-
-                                # Convert to table format as fallback
-                                result = {
-                                    "type": "table",
-                                    "title": result.get('title', 'Part Details'),
-                                    "data": table_data,
-                                    "columns": ["Category", "Field", "Value"]
-                                }
-                                logger.info(f"Converted sections to table with {len(table_data)} rows")
-
-                    return result
-                else:
-                    return "Both part number and manufacturer are required for part details"
+    @traced("data.execute_tool_plan")
+    async def _execute_tool_plan(self, mcp_analysis: Dict[str, Any], websocket = None) -> Dict[str, Any]:
+        """Run several MCP tools for one message concurrently and combine their results"""
+        plan = mcp_analysis['plan']
+        params = dict(mcp_analysis['parameters'])
+        names = [tool['name'] for tool in plan]
+        logger.debug("Executing MCP tool plan: %s with params: %s", names, params, extra=PAYLOAD)
+
+        # Resolve the part once instead of once per part-level tool
+        if params.get('part_number') and sum(self.tool_dispatcher.uses_part_id(tool) for tool in plan) > 1:
+            validation = await self.z2_client.validate_part(params['part_number'], params.get('manufacturer') or "")
+            if validation.get('success'):
+                params['part_id'] = validation.get('part_id')
+                # Each part-level tool would otherwise validate the part itself
+                coalesced_requests.inc(sum(self.tool_dispatcher.uses_part_id(tool) for tool in plan) - 1)
+
+        if websocket:
+            await websocket.send_json({
+                "type": "status",
+                "message": f"Running {len(plan)} lookups: {', '.join(names)}..."
+            })
 
-            elif api_method == 'search_parts':
-                if params.get('part_number'):
-                    return await self._search_parts(params['part_number'])
-                else:
-                    return "Part number is required for part search"
+        async def run_step(tool: Dict[str, Any]) -> Dict[str, Any]:
+            content = await self._execute_mcp_tool({'tool': tool, 'parameters': params})
+            step = {"tool": tool['name'], "title": tool['description'], "content": content}
+            if websocket:
+                # The connection's outbound queue keeps frames from concurrent steps whole and in order
+                await websocket.send_json({"type": "partial", **step})
+            return step
 
-            elif api_method == 'get_market_availability':
-                if params.get('part_number'):
-                    result = await self.z2_client.get_market_availability(params['part_number'])
-                    if result.get('success'):
-                        return self._format_market_response(result)
-                    else:
-                        return await self._get_market_data(params['part_number'])
-                else:
-                    return "Part number is required for market availability"
+        results = await asyncio.gather(*(run_step(tool) for tool in plan))
 
-            elif api_method == 'get_cross_references':
-                if params.get('part_number') and params.get('manufacturer'):
-                    result = await self.z2_client.get_cross_references(
-                        params['part_number'],
-                        params['manufacturer']
-                    )
-                    if result.get('success'):
-                        return self._format_cross_reference_response(result)
-                    else:
-                        return f"Failed to get cross references: {result.get('error', 'Unknown error')}"
-                else:
-                    return "Both part number and manufacturer are required for cross references"
+        subject = params.get('part_number') or params.get('company') or ''
+        return {
+            "type": "composite",
+            "title": f"{len(results)} results for {subject}".strip(),
+            "results": list(results),
+            "toolName": "composite"
+        }
 
-            elif api_method == 'get_compliance_data':
-                if params.get('part_number'):
-                    result = await self.z2_client.get_compliance_data(params['part_number'])
-                    return self._format_compliance_response(result)
+    def _format_part_details_result(self, result: Any, params: Dict[str, Any]) -> Any:
+        """Shape a part details result for enhanced display; params are the registry parameters of the call"""
+        logger.debug("Part details result type: %s, has type key: %s", type(result), isinstance(result, dict) and 'type' in result)
+        if isinstance(result, dict):
+            logger.debug("Part details result keys: %s", list(result) if isinstance(result, dict) else 'N/A', extra=PAYLOAD)
+
+            # Convert sections format to part_details format for enhanced display
+            if result.get('type') == 'sections' and 'sections' in result:
+                # Use raw API data if available, otherwise use sections
+                if 'raw_data' in result and result['raw_data']:
+                    # Use the raw API response for best compatibility
+                    result = {
+                        "type": "part_details",
+                        "data": result['raw_data'],
+                        "query": params.get('part_number', '')
+                    }
+                    logger.debug("Using raw API data for part_details format")
                 else:
-                    return "Part number is required for compliance data"
+                    # Fallback: convert sections to table format
+                    table_data = []
+                    for section in result['sections']:
+                        # Add section header row
+                        table_data.append({
+                            "Category": f"--- {section['title']} ---",
+                            "Field": "",
+                            "Value": ""
+                        })
+                        # Add data rows
+                        for item in section.get('data', []):
+                            table_data.append({
+                                "Category": section['title'],
+                                "Field": item.get('Field', ''),
+                                "Value": item.get('Value', '')
+                            })
+
+                    # Convert to table format as fallback
+                    result = {
+                        "type": "table",
+                        "title": result.get('title', 'Part Details'),
+                        "data": table_data,
+                        "columns": ["Category", "Field", "Value"]
+                    }
+                    logger.debug("Converted sections to table with %s rows", len(table_data))
 
-            else:
-                return f"Unknown API method: {api_method}"
-
-        except Exception as e:
-            import traceback
-            logger.error(f"Error executing MCP tool {tool['name']}: {e}\n{traceback.format_exc()}")
-            return f"Error executing {tool['name']}: {str(e)}"
+        return result
 
     def _format_litigation_response(self, result: Dict) -> Dict:
         """Format litigation data response and return structured data for table display"""
@@ -529,37 +503,41 @@ Always provide structured, actionable data."""),
 
         return response
 
-    def _format_supply_chain_response(self, result: Dict) -> str:
-        """Format supply chain locations response"""
-        response = f"**Supply Chain Locations for {result.get('company')}**\n\n"
-        response += f"Total sites: {result.get('total_sites', 0)}\n\n"
-
-        for loc in result.get('locations', [])[:5]:  # Show first 5
-            response += f"• {loc.get('name', 'N/A')}\n"
-            response += f"  Location: {loc.get('city', '')}, {loc.get('country', '')}\n"
-            response += f"  Type: {loc.get('type', 'N/A')}\n\n"
-
-        return response
-
-    def _format_digikey_response(self, result: Dict) -> str:
-        """Format DigiKey stock response"""
-        data = result.get('digikey_data', {})
-        response = f"**DigiKey Stock Information**\n\n"
-        response += f"Part: {result.get('part_number')}\n"
-
-        if result.get('manufacturer'):
-            response += f"Manufacturer: {result.get('manufacturer')}\n"
+    def _format_supply_chain_response(self, result: Dict) -> Dict:
+        """Format supply chain locations response for table display"""
+        data = result.get('data') or []
+        company_name = result.get('company_name') or result.get('company', 'Unknown')
 
-        if data.get('stock'):
-            response += f"Stock: {data['stock']}\n"
+        # GetCompanySupplyChainByCompanyID returns either a list of sites or one record
+        if isinstance(data, list):
+            table_data = [row for row in data if isinstance(row, dict)]
+        else:
+            table_data = [{"Field": key, "Value": value} for key, value in data.items()]
 
-        if data.get('price'):
-            response += f"Price: {data['price']}\n"
+        return {
+            "type": "table",
+            "title": f"Supply Chain Locations for {company_name} ({len(table_data)} records)",
+            "data": table_data,
+            "toolName": "supply_chain_locations"
+        }
 
-        if data.get('lead_time'):
-            response += f"Lead Time: {data['lead_time']}\n"
+    def _format_digikey_response(self, result: Dict) -> Dict:
+        """Narrow a market availability result to DigiKey sellers"""
+        market_data = []
+        for entry in result.get('data') or []:
+            sellers = [
+                seller for seller in entry.get('Sellers') or []
+                if 'digikey' in (seller.get('SellerName') or '').lower().replace('-', '').replace(' ', '')
+            ]
+            market_data.append({**entry, 'Sellers': sellers, 'NumberOfSeller': len(sellers)})
+
+        if not any(entry['Sellers'] for entry in market_data):
+            return {
+                "type": "text",
+                "content": f"DigiKey does not list {result.get('part_number', 'this part')}"
+            }
 
-        return response
+        return {**result, "data": market_data, "toolName": "digikey_stock"}
 
     def _format_events_response(self, result: Dict) -> str:
         """Format supply chain events response"""
@@ -643,10 +621,11 @@ Always provide structured, actionable data."""),
         response += f"REACH: {result.get('REACH', 'Unknown')}\n"
         return response
 
+    @traced("data.analyze_query")
     async def _analyze_query(self, query: str) -> Dict[str, Any]:
         """Use LLM to analyze query and extract part numbers and manufacturers"""
-        import json
-        import re
+        # Part number picked by the shared recognizer; used whenever the LLM is unavailable
+        recognized_part = extract_mpn(query)
 
         # Extract original manufacturer from "by" pattern if present
         original_manufacturer = None
@@ -662,7 +641,7 @@ Always provide structured, actionable data."""),
                 logger.error("No LLM available for analysis - ANTHROPIC_API_KEY not set")
                 # Return basic analysis
                 return {
-                    "part_number": query.strip().upper(),
+                    "part_number": recognized_part,
                     "manufacturer": original_manufacturer,
                     "original_manufacturer": original_manufacturer,
                     "has_manufacturer": bool(original_manufacturer),
@@ -751,20 +730,23 @@ Important:
 - For queries like "cross references for LM317" or "alternatives for BAV99", set is_cross_reference_query to true.
 - Data enrichment refers ONLY to enriching uploaded CSV/Excel files with additional data columns."""
             
-            response = await self.llm.ainvoke(analysis_prompt)
+            with llm_latency.time(model=model_name(self.llm)):
+                response = await self.llm.ainvoke(analysis_prompt)
             
             # Try to parse the JSON response
             try:
                 result = json.loads(response.content)
+                if not result.get("part_number"):
+                    result["part_number"] = recognized_part
                 # Add original manufacturer if we extracted it
                 result["original_manufacturer"] = original_manufacturer
-                logger.info(f"LLM Analysis result for '{query}': {result}")
+                logger.debug("LLM Analysis result for '%s': %s", query, result, extra=PAYLOAD)
                 return result
             except Exception as parse_error:
-                logger.error(f"JSON parsing failed: {parse_error}, content: {response.content}")
+                logger.error("JSON parsing failed: %s, content: %s", parse_error, response.content)
                 # Return basic analysis without fallback
                 return {
-                    "part_number": query.strip().upper(),
+                    "part_number": recognized_part,
                     "manufacturer": None,
                     "has_manufacturer": False,
                     "is_part_search": True,
@@ -775,10 +757,10 @@ Important:
                 }
                 
         except Exception as e:
-            logger.error(f"LLM analysis failed: {e}")
+            logger.error("LLM analysis failed: %s", e)
             # Return basic analysis without fallback
             return {
-                "part_number": query.strip().upper(),
+                "part_number": recognized_part,
                 "manufacturer": None,
                 "has_manufacturer": False,
                 "is_part_search": True,
@@ -792,59 +774,22 @@ Important:
         """Simple fallback analysis without LLM"""
         query_lower = query.lower()
         
-        # Known manufacturers with their variations
-        manufacturer_map = {
-            "texas instruments": "Texas Instruments",
-            "ti": "Texas Instruments",
-            "analog devices": "Analog Devices",
-            "adi": "Analog Devices",
-            "stmicroelectronics": "STMicroelectronics",
-            "st": "STMicroelectronics",
-            "nxp": "NXP",
-            "infineon": "Infineon",
-            "microchip": "Microchip",
-            "toshiba": "Toshiba",
-            "vishay": "Vishay",
-            "murata": "Murata",
-            "tdk": "TDK",
-            "rohm": "Rohm",
-            "on semiconductor": "ON Semiconductor",
-            "onsemi": "ON Semiconductor",
-            "diodes": "Diodes Inc",
-            "maxim": "Maxim Integrated",
-            "renesas": "Renesas"
-        }
-        
-        found_manufacturer = None
+        # Known manufacturers come from the shared alias index
+        mentions = manufacturer_index.scan(query)
+        found_manufacturer = mentions[0]["manufacturer"] if mentions else None
         part_number = None
         
-        # Split query into tokens
-        tokens = query_lower.replace(',', ' ').split()
-        
-        # Check each token for manufacturer
-        for token in tokens:
-            if token in manufacturer_map:
-                found_manufacturer = manufacturer_map[token]
-                break
-        
-        # Also check for multi-word manufacturers
-        for mfg_key, mfg_name in manufacturer_map.items():
-            if mfg_key in query_lower:
-                found_manufacturer = mfg_name
-                break
-        
         # Check for "by" pattern as well
         if " by " in query_lower:
             parts = query_lower.split(" by ")
             if len(parts) == 2:
                 mfg_candidate = parts[1].strip()
                 # Check if it's a known manufacturer
-                for mfg_key, mfg_name in manufacturer_map.items():
-                    if mfg_key in mfg_candidate:
-                        found_manufacturer = mfg_name
-                        break
-                if not found_manufacturer:
-                    found_manufacturer = parts[1].strip().title()
+                found_manufacturer = (
+                    manufacturer_index.lookup(mfg_candidate) or
+                    manufacturer_index.find(mfg_candidate) or
+                    parts[1].strip().title()
+                )
                 # Part number is before "by"
                 part_number = parts[0].strip().upper()
         
@@ -852,9 +797,10 @@ Important:
         if not part_number:
             # Remove manufacturer from query to get part number
             remaining = query_lower
-            if found_manufacturer:
-                for mfg_key in manufacturer_map.keys():
-                    remaining = remaining.replace(mfg_key, "").strip()
+            # Remove manufacturer mentions back to front so offsets stay valid
+            for mention in reversed(mentions):
+                remaining = remaining[:mention["start"]] + remaining[mention["end"]:]
+            remaining = remaining.strip()
             # Clean up common words
             for word in ["search", "find", "for", "pricing", "cost", "stock"]:
                 remaining = remaining.replace(word, "").strip()
@@ -873,17 +819,18 @@ Important:
             "is_enrichment_query": any(word in query_lower for word in ["enrich", "enhance", "augment"])
         }
     
-    async def _get_part_details(self, part_number: str, manufacturer: str, original_manufacturer: str = None) -> Dict[str, Any]:
+    async def _get_part_details(self, part_number: str, manufacturer: str, original_manufacturer: str = None,
+                                part_id: int = None) -> Dict[str, Any]:
         """Get detailed part information with fallback to original manufacturer name"""
         try:
             # First try with the LLM-suggested manufacturer
-            result = await self.z2_client.get_part_details(part_number, manufacturer)
+            result = await self.z2_client.get_part_details(part_number, manufacturer, part_id=part_id)
 
             # Check if we found the part - check for error in result or empty raw_data
             if result.get("error") or (result.get("type") == "text" and "not found" in result.get("content", "").lower()):
                 # If not found and we have an original manufacturer that's different, try that
                 if original_manufacturer and original_manufacturer.lower() != manufacturer.lower():
-                    logger.info(f"Part not found with '{manufacturer}', trying original: '{original_manufacturer}'")
+                    logger.info("Part not found with '%s', trying original: '%s'", manufacturer, original_manufacturer)
                     result = await self.z2_client.get_part_details(part_number, original_manufacturer)
 
             return result
@@ -909,7 +856,7 @@ Important:
             result = await self.z2_client.get_market_availability(part_number, manufacturer or "")
             return result
         except Exception as e:
-            logger.error(f"Error getting market availability: {e}")
+            logger.error("Error getting market availability: %s", e)
             return {"type": "error", "content": f"Error getting market availability: {e}"}
 
     async def _get_company_litigations(self, company_name: str) -> Dict[str, Any]:
@@ -918,7 +865,7 @@ Important:
             result = await self.z2_client.get_company_litigations(company_name)
             return result
         except Exception as e:
-            logger.error(f"Error getting company litigations: {e}")
+            logger.error("Error getting company litigations: %s", e)
             return {"type": "error", "content": f"Error getting litigation data for {company_name}: {e}"}
 
     async def _get_company_details(self, company_name: str) -> Dict[str, Any]:
@@ -927,7 +874,7 @@ Important:
             result = await self.z2_client.get_company_details(company_name)
             return result
         except Exception as e:
-            logger.error(f"Error getting company details: {e}")
+            logger.error("Error getting company details: %s", e)
             return {"type": "error", "content": f"Error getting company details for {company_name}: {e}"}
 
     async def _analyze_bom(self, query: str) -> str:
@@ -950,66 +897,43 @@ Important:
         """Handle general data queries"""
         return {"type": "text", "content": f"Processing data query: {query}"}
     
-    async def _enrich_file_data(self, file_data: List[Dict], websocket = None) -> Dict[str, Any]:
-        """Enrich uploaded file data with Z2Data information"""
+    async def _enrich_file_data(self, file_data, websocket = None, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Enrich uploaded file data (row dicts or a DataFrame) with Z2Data information, reusing fresh cached parts"""
         try:
-            enriched_data = []
-            total_rows = len(file_data)
-            enriched_count = 0
+            frame = file_data if isinstance(file_data, pd.DataFrame) else pd.DataFrame(file_data)
+            total_rows = len(frame)
 
             if websocket:
                 await websocket.send_json({
                     "type": "status",
                     "message": f"Processing {total_rows} rows of data..."
                 })
-            
-            for idx, row in enumerate(file_data):
-                # Try different column names for part number
-                part_number = (
-                    row.get('part_number') or 
-                    row.get('Part Number') or 
-                    row.get('PartNumber') or
-                    row.get('MPN') or
-                    row.get('mpn') or
-                    row.get('Part')
-                )
-                
-                manufacturer = (
-                    row.get('manufacturer') or
-                    row.get('Manufacturer') or
-                    row.get('MFG') or
-                    row.get('mfg') or
-                    row.get('Brand')
-                )
-                
-                if part_number:
-                    try:
-                        # Get part details from Z2Data
-                        search_query = f"{part_number} {manufacturer}" if manufacturer else part_number
-                        result = await self.z2_client.search_parts(search_query)
-                        
-                        # Parse the result and add enrichment columns
-                        if result:
-                            # Add lifecycle status
-                            row['lifecycle_status'] = self._extract_lifecycle(result)
-                            row['rohs_status'] = self._extract_rohs(result)
-                            row['market_availability'] = self._extract_availability(result)
-                            row['avg_price'] = self._extract_price(result)
-                            row['lead_time'] = self._extract_lead_time(result)
-                            row['alternatives'] = self._extract_alternatives(result)
-                            enriched_count += 1
-                    except Exception as e:
-                        logger.warning(f"Failed to enrich part {part_number}: {e}")
-                        row['enrichment_error'] = str(e)
-                
-                enriched_data.append(row)
-            
+
+            # Column detection and normalization run once, before any API call
+            prepared = prepare_bom(frame)
+            unique_keys = prepared["unique_keys"]
+            plan = await self.enrichment_cache.plan(unique_keys, fields)
+
+            if websocket and unique_keys:
+                await websocket.send_json({
+                    "type": "status",
+                    "message": f"Looking up {len(plan['lookups'])} of {len(unique_keys)} unique parts "
+                               f"({len(plan['cached'])} cached)..."
+                })
+
+            # One lookup per distinct (mpn, manufacturer) without fresh cached data, broadcast to rows below
+            looked_up = {key: await self._lookup_part(*key) for key in plan["lookups"]}
+            await self.enrichment_cache.store(looked_up)
+            key_enrichment = [plan["cached"].get(key) or select_fields(looked_up[key], plan["fields"])
+                              for key in unique_keys]
+            enriched_count = self._apply_enrichment(frame, prepared["row_codes"], key_enrichment)
+
             # Format as table for display
             return {
                 "response": {
                     "type": "table",
                     "title": f"Enriched Data ({enriched_count}/{total_rows} parts enriched)",
-                    "data": enriched_data
+                    "data": frame_to_records(frame)
                 },
                 "agent_type": "data",
                 "success": True
@@ -1022,6 +946,48 @@ Important:
                 "error": str(e)
             }
     
+    async def plan_enrichment(self, file_data, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Dry run of enrichment: how many parts are cached and how many Z2Data calls the rest would take"""
+        frame = file_data if isinstance(file_data, pd.DataFrame) else pd.DataFrame(file_data)
+        unique_keys = prepare_bom(frame)["unique_keys"]
+        plan = await self.enrichment_cache.plan(unique_keys, fields)
+        return {
+            "total_rows": len(frame),
+            "unique_parts": len(unique_keys),
+            "cached_parts": len(plan["cached"]),
+            "parts_to_look_up": len(plan["lookups"]),
+            "api_calls": plan["api_calls"],
+            "stale_fields": plan["stale_fields"]
+        }
+
+    async def _lookup_part(self, part_number: str, manufacturer: Optional[str]) -> Dict[str, Any]:
+        """Enrichment columns for one distinct part; a failed lookup yields an enrichment_error column"""
+        try:
+            result = await self.z2_client.search_parts(part_number, manufacturer)
+            result_text = json.dumps(result, default=str)
+            return {
+                'lifecycle_status': self._extract_lifecycle(result_text),
+                'rohs_status': self._extract_rohs(result_text),
+                'market_availability': self._extract_availability(result_text),
+                'avg_price': self._extract_price(result_text),
+                'lead_time': self._extract_lead_time(result_text),
+                'alternatives': self._extract_alternatives(result_text)
+            }
+        except Exception as e:
+            logger.warning("Failed to enrich part %s: %s", part_number, e)
+            return {'enrichment_error': str(e)}
+
+    def _apply_enrichment(self, frame: pd.DataFrame, row_codes: List[int], key_enrichment: List[Dict[str, Any]]) -> int:
+        """Add per-key enrichment columns to every row in place; returns the number of enriched rows"""
+        columns = []
+        for enrichment in key_enrichment:
+            for column in enrichment:
+                if column not in columns:
+                    columns.append(column)
+        for column in columns:
+            frame[column] = [key_enrichment[code].get(column) if code >= 0 else None for code in row_codes]
+        return sum(1 for code in row_codes if code >= 0 and 'enrichment_error' not in key_enrichment[code])
+
     def _extract_lifecycle(self, result: str) -> str:
         """Extract lifecycle status from API result"""
         if "Active" in result:
@@ -1079,7 +1045,7 @@ class CodeAgent:
     """Handles code generation and execution"""
     
     def __init__(self):
-        self.sandbox = CodeSandbox()
+        self.sandbox = sandbox
         self.llm = self._get_llm()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert Python code generation and execution agent.
@@ -1095,7 +1061,8 @@ CAPABILITIES:
 
 2. Safe Execution
    - Run Python code in sandboxed environment
-   - Handle imports: math, random, datetime, json, statistics
+   - Handle imports: math, random, datetime, json, statistics, collections, itertools, functools, re, decimal, fractions, numpy, pandas
+   - Uploaded datasets are preloaded as a pandas DataFrame named df
    - Process results and errors
    - Format output clearly
 
@@ -1135,7 +1102,8 @@ When generating code:
         else:
             return None
     
-    async def process(self, message: str, websocket = None) -> Dict[str, Any]:
+    @traced("agent.code")
+    async def process(self, message: str, context: Dict = None, websocket = None) -> Dict[str, Any]:
         """Process code-related requests"""
         try:
             # Generate code if requested
@@ -1145,25 +1113,44 @@ When generating code:
                         "type": "status",
                         "message": "Generating Python code based on your requirements..."
                     })
-                code = await self._generate_code(message)
-                # Execute if it's a complete script
-                if code and ("def " in code or "import " in code):
-                    result = await self.sandbox.execute(code)
-                    response = f"**Generated Code:**\n```python\n{code}\n```\n\n**Execution Result:**\n{result}"
+                generated = await self._generate_code(message, context)
+                code = extract_code(generated)
+                if not code:
+                    # Prose (or an error note) only; there is nothing to run
+                    extraction_stats.record("no_code")
+                    response = generated
                 else:
-                    response = f"**Generated Code:**\n```python\n{code}\n```"
+                    error = check_syntax(code)
+                    if error:
+                        code, error = await self._repair_code(code, error)
+                    if error:
+                        extraction_stats.record("syntax_error")
+                        response = f"**Generated Code:**\n```python\n{code}\n```\n\n**Syntax Error:**\n{error}"
+                    else:
+                        extraction_stats.record("executed")
+                        result = await self._run_sandboxed(code, context, websocket)
+                        response = f"**Generated Code:**\n```python\n{code}\n```\n\n**Execution Result:**\n{result}"
             else:
                 # Direct execution request
-                response = await self._execute_code(message)
+                response = await self._execute_code(message, context, websocket)
             
             return {
                 "response": response,
                 "agent_type": "code",
                 "success": True
             }
+
+        except ExecutionQueueFull as e:
+            return {
+                "response": f"The code execution queue is full right now. Please try again in about {e.retry_after} seconds.",
+                "agent_type": "code",
+                "success": False,
+                "error": str(e),
+                "metadata": {"retry_after": e.retry_after}
+            }
             
         except Exception as e:
-            logger.error(f"Code agent error: {e}")
+            logger.error("Code agent error: %s", e)
             return {
                 "response": f"Error processing code request: {e}",
                 "agent_type": "code",
@@ -1171,12 +1158,17 @@ When generating code:
                 "error": str(e)
             }
     
-    async def _generate_code(self, request: str) -> str:
+    @traced("code.generate")
+    async def _generate_code(self, request: str, context: Dict = None) -> str:
         """Generate code based on request"""
         try:
             if self.llm:
                 prompt = f"Generate Python code for: {request}\nOnly return the code, no explanations."
-                response = self.llm.invoke(prompt)
+                dataset_note = self._describe_dataset(context)
+                if dataset_note:
+                    prompt += f"\n{dataset_note}"
+                with llm_latency.time(model=model_name(self.llm)):
+                    response = await self.llm.ainvoke(prompt)
                 return response.content
             else:
                 # Simple fallback - return basic template
@@ -1192,11 +1184,85 @@ if __name__ == "__main__":
         except Exception as e:
             return f"# Error generating code: {e}"
     
-    async def _execute_code(self, code: str) -> str:
-        """Execute provided code"""
-        result = await self.sandbox.execute(code)
+    @traced("code.repair")
+    async def _repair_code(self, code: str, error: str) -> Tuple[str, Optional[str]]:
+        """Ask the LLM once to fix code that does not compile; returns (code, remaining error)"""
+        if not self.llm:
+            return code, error
+        try:
+            prompt = (f"This Python code fails to compile with {error}:\n```python\n{code}\n```\n"
+                      f"Return only the corrected code, no explanations.")
+            retries.labels(operation="code_repair").inc()
+            with llm_latency.time(model=model_name(self.llm)):
+                response = await self.llm.ainvoke(prompt)
+            repaired = extract_code(response.content)
+        except Exception as e:
+            logger.warning("Code repair failed: %s", e)
+            repaired = None
+        if repaired and check_syntax(repaired) is None:
+            extraction_stats.record("repaired")
+            return repaired, None
+        extraction_stats.record("repair_failed")
+        return code, error
+
+    async def _execute_code(self, message: str, context: Dict = None, websocket = None) -> str:
+        """Execute code provided in the message (fenced or plain)"""
+        code = extract_code(message)
+        if not code:
+            extraction_stats.record("no_code")
+            return "No Python code found to execute."
+        error = check_syntax(code)
+        if error:
+            # User-written code is reported back rather than rewritten
+            extraction_stats.record("syntax_error")
+            return f"**Syntax Error:**\n{error}"
+        extraction_stats.record("executed")
+        result = await self._run_sandboxed(code, context, websocket)
         return f"**Execution Result:**\n{result}"
 
+    def _describe_dataset(self, context: Dict = None) -> Optional[str]:
+        """Tell the LLM about the uploaded dataset preloaded as df, instead of pasting its rows"""
+        upload_id = (context or {}).get('upload_id')
+        metadata = dataset_store.get_metadata(upload_id) if upload_id else None
+        if not metadata:
+            return None
+        return (f"A pandas DataFrame named df is already loaded with the uploaded file "
+                f"{metadata['filename']} ({metadata['rows']} rows; string columns: "
+                f"{', '.join(metadata['columns'])}). Use df directly; do not read files.")
+
+    async def _run_sandboxed(self, code: str, context: Dict = None, websocket = None) -> Dict[str, Any]:
+        """Run code through the execution scheduler, reporting queue position while waiting"""
+        context = context or {}
+        conversation_id = context.get('conversation_id', 'default')
+        # Clients can set bypass_cache in the message context to force a fresh run
+        use_cache = not context.get('bypass_cache')
+
+        # An uploaded dataset is shared with the sandbox as a memory-mapped Arrow file
+        dataset = None
+        if context.get('upload_id'):
+            dataset = await asyncio.to_thread(dataset_store.export_arrow, context['upload_id'])
+
+        # Re-runs of a deterministic snippet skip the queue entirely; on a miss the
+        # execution below does not look the result up again (it still stores it)
+        if use_cache:
+            cached = self.sandbox.cached_result(code, dataset)
+            if cached:
+                return cached
+
+        async def report_position(position: int):
+            if websocket:
+                await websocket.send_json({
+                    "type": "status",
+                    "message": f"Waiting for a code execution slot (position {position} in queue)...",
+                    "queue_position": position
+                })
+
+        return await execution_scheduler.run(
+            conversation_id,
+            lambda: self.sandbox.execute(code, use_cache=False, dataset=dataset),
+            report_position
+        )
+
 class ChatAgent:
     """Handles general conversation with LangChain memory"""
 
@@ -1210,6 +1276,7 @@ class ChatAgent:
         else:
             return None
 
+    @traced("agent.chat")
     async def process(self, message: str, context: Dict = None, websocket = None) -> Dict[str, Any]:
         """Process general chat requests with conversation history"""
         try:
@@ -1226,7 +1293,7 @@ class ChatAgent:
                 if memory:
                     # Get chat history from memory
                     messages = memory.chat_memory.messages
-                    logger.info(f"Using memory with {len(messages)} previous messages")
+                    logger.debug("Using memory with %s previous messages", len(messages))
 
                     # Build conversation with history
                     conversation = []
@@ -1250,11 +1317,13 @@ IMPORTANT: If a user tells you their name or any personal information, you MUST
                     conversation.append({"role": "user", "content": message})
 
                     # Invoke LLM with full conversation
-                    response = self.llm.invoke(conversation)
+                    with llm_latency.time(model=model_name(self.llm)):
+                        response = await self.llm.ainvoke(conversation)
                     content = response.content
                 else:
                     # No memory, just respond to current message
-                    response = self.llm.invoke(message)
+                    with llm_latency.time(model=model_name(self.llm)):
+                        response = await self.llm.ainvoke(message)
                     content = response.content
             else:
                 # Simple fallback response
@@ -1267,7 +1336,7 @@ IMPORTANT: If a user tells you their name or any personal information, you MUST
             }
             
         except Exception as e:
-            logger.error(f"Chat agent error: {e}")
+            logger.error("Chat agent error: %s", e)
             return {
                 "response": f"Error in chat: {e}",
                 "agent_type": "chat",
@@ -1283,24 +1352,41 @@ class SimpleAgentOrchestrator:
         self.data_agent = DataAgent()
         self.code_agent = CodeAgent()
         self.chat_agent = ChatAgent()
-        # Store memory per conversation
-        self.conversation_memories = {}
-
-    def get_or_create_memory(self, conversation_id: str) -> ConversationBufferMemory:
-        """Get existing memory or create new one for conversation"""
-        if conversation_id not in self.conversation_memories:
-            self.conversation_memories[conversation_id] = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
+        # Conversation memory lives in the state store, so any worker can serve a reconnect
+        self.state_store = state_store
+
+    async def load_memory(self, conversation_id: str) -> ConversationBufferMemory:
+        """Rebuild a conversation's memory from the state store"""
+        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+        try:
+            turns = await self.state_store.get_list(f"memory:{conversation_id}")
+        except StateStoreError as e:
+            logger.warning("Conversation memory unavailable for %s: %s", conversation_id, e)
+            return memory
+        for turn in turns:
+            if turn["role"] == "user":
+                memory.chat_memory.add_user_message(turn["content"])
+            else:
+                memory.chat_memory.add_ai_message(turn["content"])
+        return memory
+
+    async def save_memory(self, conversation_id: str, message: str, output: str):
+        """Append one exchange, keeping the newest MEMORY_MAX_MESSAGES messages"""
+        try:
+            await self.state_store.append(
+                f"memory:{conversation_id}",
+                [{"role": "user", "content": message}, {"role": "assistant", "content": output}],
+                max_len=MEMORY_MAX_MESSAGES, ttl=MEMORY_TTL
             )
-            logger.info(f"Created new memory for conversation {conversation_id}")
-        return self.conversation_memories[conversation_id]
+        except StateStoreError as e:
+            logger.warning("Could not save conversation memory for %s: %s", conversation_id, e)
 
+    @traced("orchestrator.process_message")
     async def process_message(self, message: str, conversation_id: str, context: Dict = None, websocket = None) -> Dict[str, Any]:
         """Process a message through the appropriate agent"""
         try:
-            # Get or create memory for this conversation
-            memory = self.get_or_create_memory(conversation_id)
+            # Get memory for this conversation
+            memory = await self.load_memory(conversation_id)
 
             # Send routing status
             if websocket:
@@ -1311,6 +1397,9 @@ class SimpleAgentOrchestrator:
 
             # Route the message
             route = await self.router.route(message)
+            span = current_span()
+            if span:
+                span.set_attribute("route", route)
 
             # Send agent-specific status
             if websocket:
@@ -1328,21 +1417,23 @@ class SimpleAgentOrchestrator:
             if context is None:
                 context = {}
             context['memory'] = memory
+            context['conversation_id'] = conversation_id
 
             # Process with appropriate agent
             if route == "data":
                 result = await self.data_agent.process(message, context, websocket)
             elif route == "code":
-                result = await self.code_agent.process(message, websocket)
+                result = await self.code_agent.process(message, context, websocket)
             else:  # chat
                 result = await self.chat_agent.process(message, context, websocket)
 
-            # Save the interaction to memory
-            memory.save_context(
-                {"input": message},
-                {"output": result.get("response", "")}
-            )
-            logger.info(f"Saved interaction to memory for conversation {conversation_id}")
+            # Save the interaction to memory; tables and other structured
+            # replies are remembered by their title, not their rows
+            output = result.get("response", "")
+            if isinstance(output, dict):
+                output = output.get("title") or output.get("content") or output.get("type", "")
+            await self.save_memory(conversation_id, message, str(output))
+            logger.debug("Saved interaction to memory for conversation %s", conversation_id)
 
             # Add metadata
             result["conversation_id"] = conversation_id
@@ -1351,7 +1442,7 @@ class SimpleAgentOrchestrator:
             return result
 
         except Exception as e:
-            logger.error(f"Orchestrator error: {e}")
+            logger.error("Orchestrator error: %s", e)
             return {
                 "response": f"Error processing message: {e}",
                 "agent_type": "error",
@@ -1361,4 +1452,9 @@ class SimpleAgentOrchestrator:
             }
 
 # Singleton instance
-agent_orchestrator = SimpleAgentOrchestrator()
\ No newline at end of file
+agent_orchestrator = SimpleAgentOrchestrator()
+
+if isinstance(state_store, InProcessStore):
+    registry.register(Gauge(
+        "conversation_memories", "Conversation memories resident in this process",
+        callback=lambda: len(state_store.keys("memory:"))))
\ No newline at end of file
@@ -1,18 +1,17 @@
 """
 Simplified Agents Backend with LangGraph Integration
 """
-from fastapi import FastAPI, WebSocket, HTTPException, UploadFile, File, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 import os
 import json
+import uuid
 import asyncio
 import logging
 from datetime import datetime
-import pandas as pd
-import io
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,7 +19,19 @@ load_dotenv()
 
 # Import our consolidated agent system
 from agents_simple import agent_orchestrator
-from models import get_db, init_db, Conversation, Message, SystemConfig
+from dataset_store import dataset_store, is_supported_filename
+from code_sandbox import sandbox
+from execution_scheduler import execution_scheduler
+from code_extraction import extraction_stats
+from tracing import tracer, timings_requested, RingBufferExporter
+from metrics import registry, active_websockets, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from logging_config import configure_logging, PAYLOAD
+from serialization import ResponseFrame, loads
+from state_store import state_store
+from enrichment_jobs import enrichment_jobs, JobStateError
+from enrichment_cache import check_fields
+from outbound_queue import OutboundQueue, TurnSender
+from models import get_db, init_db, async_session, Conversation, Message, SystemConfig
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from db_helpers import (
@@ -31,9 +42,11 @@ from db_helpers import (
 )
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+MAX_TURNS_IN_FLIGHT = int(os.getenv("WS_MAX_TURNS_IN_FLIGHT", "3"))  # Concurrent turns per conversation connection
+
 # Initialize FastAPI app
 app = FastAPI(title="Agents Simple API", version="0.2.0")
 
@@ -53,8 +66,14 @@ class ChatMessage(BaseModel):
     role: str = "user"
 
 class FileEnrichmentRequest(BaseModel):
-    file_content: str
+    upload_id: Optional[str] = None  # Preferred: dataset already stored by /api/upload
+    file_content: Optional[str] = None  # Legacy: JSON-encoded rows
     enrichment_type: str = "auto"
+    fields: Optional[List[str]] = None  # Enrichment columns to fill; only these need to be fresh
+    dry_run: bool = False  # Report the Z2Data calls the run would make instead of making them
+
+class EnrichmentJobRequest(BaseModel):
+    upload_id: str  # Dataset stored by /api/upload
 
 class AdminConfig(BaseModel):
     key: str
@@ -63,151 +82,229 @@ class AdminConfig(BaseModel):
 # WebSocket endpoint with LangGraph
 @app.websocket("/ws/{conversation_id}")
 async def websocket_endpoint(websocket: WebSocket, conversation_id: str):
+    """Read messages while earlier turns run; {"type": "cancel"} stops one turn (turn_id) or all of them"""
     await websocket.accept()
-    logger.info(f"WebSocket connection established for conversation {conversation_id}")
+    logger.info("WebSocket connection established for conversation %s", conversation_id)
 
-    # Get database session
-    db_gen = get_db()
-    db = await anext(db_gen)
+    # Agents send through the queue, so a slow client never stalls a turn
+    outbound = OutboundQueue(websocket).start()
+    turns: Dict[str, asyncio.Task] = {}  # turn_id -> in-flight turn
 
+    active_websockets.inc()
     try:
         # Get or create conversation
-        conversation = await get_or_create_conversation(conversation_id, db)
+        async with async_session() as db:
+            await get_or_create_conversation(conversation_id, db)
 
         while True:
             data = await websocket.receive_text()
-            logger.info(f"Received message: {data[:100]}...")
+            logger.debug("Received message: %s", data[:100], extra=PAYLOAD)
 
             # Parse the message to check for file data context
             try:
-                message_data = json.loads(data)
+                message_data = loads(data)
                 content = message_data.get('content', data)
                 context = message_data.get('context', {})
             except:
+                message_data = {}
                 content = data
                 context = {}
 
-            # Save user message to database
-            await save_message(
-                conversation_id=conversation_id,
-                role="user",
-                content=content,
-                agent_type=None,
-                db=db
-            )
-
-            # Get conversation history
-            history = await get_conversation_history(conversation_id, db, limit=10)
-
-            # Add history to context
-            if history:
-                context['conversation_history'] = history
-                context['formatted_history'] = await format_history_for_llm(history)
-                logger.info(f"Including {len(history)} messages in conversation context")
-
-            # Send initial status
-            await websocket.send_json({
-                "type": "status",
-                "message": "Analyzing your request and determining the best approach..."
-            })
-
-            # Process through agent orchestrator with history context
-            result = await agent_orchestrator.process_message(content, conversation_id, context, websocket)
-
-            # Log what we got back
-            logger.info(f"Agent result keys: {result.keys() if isinstance(result, dict) else 'not a dict'}")
-
-            # Send response - preserve structured data if present
-            response_content = result["response"]
-
-            # Log response content type
-            logger.info(f"Response content type: {type(response_content)}, is dict: {isinstance(response_content, dict)}")
-            if isinstance(response_content, dict):
-                logger.info(f"Response content keys: {response_content.keys()}")
-
-            # If the response is already structured (has type field), send it directly
-            if isinstance(response_content, dict) and "type" in response_content:
-                response = {
-                    "type": "response",
-                    "content": response_content,  # This preserves the table structure
-                    "agent_type": result["agent_type"],
-                    "metadata": result.get("metadata", {})
-                }
-            else:
-                # For simple text responses
-                response = {
-                    "type": "response",
-                    "content": response_content,
-                    "agent_type": result["agent_type"],
-                    "metadata": result.get("metadata", {})
-                }
-
-            # Save assistant response to database
-            response_content = response.get('content', '')
-            if isinstance(response_content, dict):
-                response_content = json.dumps(response_content)
-
-            await save_message(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=response_content,
-                agent_type=result.get("agent_type"),
-                db=db,
-                meta_data=result.get("metadata", {})
-            )
-
-            logger.info(f"Sending WebSocket response, type: {response.get('type')}, agent: {response.get('agent_type')}")
-            await websocket.send_json(response)
-            logger.info(f"WebSocket response sent successfully")
-
+            if message_data.get('type') == 'cancel':
+                cancel_id = message_data.get('turn_id')
+                for turn_id, task in list(turns.items()):
+                    if cancel_id is None or turn_id == cancel_id:
+                        task.cancel()
+                continue
+
+            turn_id = str(message_data.get('turn_id') or uuid.uuid4())
+            if turn_id in turns:
+                await outbound.send_json({
+                    "type": "error",
+                    "turn_id": turn_id,
+                    "content": f"A request with turn_id '{turn_id}' is already in progress; "
+                               f"send each message with a new turn_id"
+                })
+                continue
+            if len(turns) >= MAX_TURNS_IN_FLIGHT:
+                await outbound.send_json({
+                    "type": "error",
+                    "turn_id": turn_id,
+                    "content": f"{len(turns)} requests are already in progress in this conversation; "
+                               f"wait for one to finish or cancel it"
+                })
+                continue
+
+            task = asyncio.create_task(run_turn(conversation_id, turn_id, content, context, outbound))
+            turns[turn_id] = task
+            task.add_done_callback(lambda done, turn_id=turn_id: turns.pop(turn_id, None))
+
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        logger.error("WebSocket error: %s", e)
     finally:
-        # Close database session
-        await db.close()
-        logger.info(f"WebSocket connection closed for conversation {conversation_id}")
+        # Turns for a client that is gone would only spend gateway quota and CPU
+        for task in turns.values():
+            task.cancel()
+        await asyncio.gather(*turns.values(), return_exceptions=True)
+        active_websockets.dec()
+        await outbound.close()
+        logger.info("WebSocket connection closed for conversation %s", conversation_id)
+
+
+async def run_turn(conversation_id: str, turn_id: str, content: str, context: Dict[str, Any], outbound: OutboundQueue):
+    """Answer one message with its own database session; cancelling the task stops its in-flight calls"""
+    sender = TurnSender(outbound, turn_id)
+    try:
+        async with async_session() as db:
+            with tracer.span("websocket.turn", conversation_id=conversation_id) as turn:
+                # Save user message to database
+                await save_message(
+                    conversation_id=conversation_id,
+                    role="user",
+                    content=content,
+                    agent_type=None,
+                    db=db
+                )
+
+                # Get conversation history
+                history = await get_conversation_history(conversation_id, db, limit=10)
+
+                # Add history to context
+                if history:
+                    context['conversation_history'] = history
+                    context['formatted_history'] = await format_history_for_llm(history)
+                    logger.debug("Including %s messages in conversation context", len(history))
+
+                # Send initial status
+                await sender.send_json({
+                    "type": "status",
+                    "message": "Analyzing your request and determining the best approach..."
+                })
+
+                # Process through agent orchestrator with history context
+                result = await agent_orchestrator.process_message(content, conversation_id, context, sender)
+
+                # Send response - preserve structured data if present
+                response_content = result["response"]
+                logger.debug("Agent result keys: %s, response type: %s, response keys: %s",
+                             list(result), type(response_content).__name__,
+                             list(response_content) if isinstance(response_content, dict) else None, extra=PAYLOAD)
+
+                # Structured content (tables) is encoded once, for the database and the socket
+                response = ResponseFrame(response_content, result["agent_type"], result.get("metadata", {}))
+
+                await save_message(
+                    conversation_id=conversation_id,
+                    role="assistant",
+                    content=response.stored_content,
+                    agent_type=response.agent_type,
+                    db=db,
+                    meta_data=response.metadata
+                )
+
+                response.metadata = {**response.metadata, "turn_id": turn_id}
+                # Optional per-turn timing breakdown (routing, Z2Data, sandbox, database)
+                if timings_requested(context):
+                    response.metadata["timings"] = turn.breakdown()
+
+                logger.debug("Sending WebSocket response, agent: %s", response.agent_type)
+                await sender.send_text(response.encode())
+
+    except asyncio.CancelledError:
+        logger.info("Cancelled turn %s in conversation %s", turn_id, conversation_id)
+        await sender.send_json({"type": "cancelled"})
+        raise
+    except Exception as e:
+        logger.error("Turn %s in conversation %s failed: %s", turn_id, conversation_id, e)
+        await sender.send_json({"type": "error", "content": f"Error processing message: {e}"})
 
 # File upload endpoint
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Handle file uploads for BOM analysis and data enrichment"""
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Detect file type and process accordingly
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(content))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(content))
-        else:
+        if not is_supported_filename(file.filename):
             return {"error": "Unsupported file format. Please upload CSV or Excel files."}
-        
-        # Convert to JSON for processing
-        data = df.to_dict(orient='records')
-        
+
+        # Spool to disk and parse in chunks; only the preview rows come back
+        metadata = await dataset_store.ingest_upload(file)
+
         return {
             "success": True,
+            "upload_id": metadata["upload_id"],
             "filename": file.filename,
-            "rows": len(data),
-            "columns": list(df.columns),
-            "preview": data[:5] if len(data) > 5 else data
+            "rows": metadata["rows"],
+            "columns": metadata["columns"],
+            "preview": metadata["preview"]
         }
         
     except Exception as e:
-        logger.error(f"File upload error: {e}")
+        logger.error("File upload error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
+# Stored upload endpoints
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Get metadata and preview rows for a stored upload"""
+    metadata = dataset_store.get_metadata(upload_id)
+    if not metadata:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return metadata
+
+@app.get("/api/uploads/{upload_id}/rows")
+async def get_upload_rows(upload_id: str, offset: int = 0, limit: int = 100):
+    """Page through the rows of a stored upload"""
+    metadata = dataset_store.get_metadata(upload_id)
+    if not metadata:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), 1000)
+    rows = await asyncio.to_thread(dataset_store.read_rows, upload_id, offset, limit)
+
+    return {
+        "upload_id": upload_id,
+        "offset": offset,
+        "limit": limit,
+        "total_rows": metadata["rows"],
+        "columns": metadata["columns"],
+        "rows": rows
+    }
+
+@app.delete("/api/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Remove a stored upload"""
+    if not dataset_store.delete(upload_id):
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return {"success": True}
+
 # Data enrichment endpoint
 @app.post("/api/enrich")
 async def enrich_data(request: FileEnrichmentRequest):
-    """Enrich uploaded data with Z2Data information"""
+    """Enrich uploaded data with Z2Data information within the request; large BOMs should use /api/enrich/jobs"""
     try:
-        # Parse the file content
-        data = json.loads(request.file_content)
-        
+        # Prefer the server-side dataset; fall back to rows sent in the request
+        if request.upload_id:
+            if not dataset_store.get_metadata(request.upload_id):
+                raise HTTPException(status_code=404, detail=f"Upload {request.upload_id} not found")
+            context = {"upload_id": request.upload_id}
+            data = []
+        elif request.file_content:
+            data = json.loads(request.file_content)
+            context = {"file_data": data}
+        else:
+            raise HTTPException(status_code=400, detail="Either upload_id or file_content is required")
+        context["fields"] = check_fields(request.fields)
+
+        if request.dry_run:
+            file_data = (await asyncio.to_thread(dataset_store.read_frame, request.upload_id)
+                         if request.upload_id else data)
+            plan = await agent_orchestrator.data_agent.plan_enrichment(file_data, context["fields"])
+            return {"success": True, "dry_run": True, **plan}
+
         # Process through data agent for enrichment with context
-        context = {"file_data": data}
         result = await agent_orchestrator.process_message(
             "Enrich this data with part information, lifecycle status, and market availability",
             "enrichment",
@@ -239,10 +336,51 @@ async def enrich_data(request: FileEnrichmentRequest):
             "error": "Enrichment failed - returning original data"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Enrichment error: {e}")
+        logger.error("Enrichment error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
+# Background enrichment jobs
+@app.post("/api/enrich/jobs", status_code=202)
+async def submit_enrichment_job(request: EnrichmentJobRequest):
+    """Queue enrichment of a stored upload; poll the returned job for progress"""
+    try:
+        return await enrichment_jobs.submit(request.upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Upload {request.upload_id} not found")
+
+@app.get("/api/enrich/jobs/{job_id}")
+async def get_enrichment_job(job_id: str):
+    """Status and progress of an enrichment job"""
+    job = await enrichment_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/api/enrich/jobs/{job_id}/result")
+async def get_enrichment_job_result(job_id: str, offset: int = 0, limit: int = 100):
+    """Page through the enriched rows of a completed job"""
+    try:
+        result = await enrichment_jobs.result(job_id, max(offset, 0), min(max(limit, 1), 1000))
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return result
+
+@app.post("/api/enrich/jobs/{job_id}/cancel")
+async def cancel_enrichment_job(job_id: str):
+    """Cancel a queued or running enrichment job"""
+    try:
+        job = await enrichment_jobs.cancel(job_id)
+    except JobStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 # Admin panel HTML
 ADMIN_HTML = """
 <!DOCTYPE html>
@@ -470,6 +608,27 @@ async def get_stats(db: AsyncSession = Depends(get_db)):
         # If database not initialized, return defaults
         return {"conversations": 0, "messages": 0, "agents": 3}
 
+@app.get("/api/admin/execution-stats")
+async def get_execution_stats():
+    """Get code execution queue depth, wait-time, result cache and code extraction metrics"""
+    return {
+        **execution_scheduler.stats(),
+        "result_cache": sandbox.result_cache.stats(),
+        "code_extraction": extraction_stats.stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/admin/traces")
+async def get_traces(limit: int = 20):
+    """Get the most recent request traces in OTLP/JSON form"""
+    if not isinstance(tracer.exporter, RingBufferExporter):
+        raise HTTPException(status_code=404, detail="Traces are only kept in memory with TRACE_EXPORTER=memory")
+    return {"traces": tracer.exporter.traces(limit)}
+
 @app.post("/api/admin/config")
 async def save_config(config: AdminConfig, db: AsyncSession = Depends(get_db)):
     """Save system configuration"""
@@ -490,7 +649,7 @@ async def save_config(config: AdminConfig, db: AsyncSession = Depends(get_db)):
         await db.commit()
         return {"success": True}
     except Exception as e:
-        logger.error(f"Config save error: {e}")
+        logger.error("Config save error: %s", e)
         return {"success": False, "error": str(e)}
 
 @app.post("/api/admin/clear-cache")
@@ -507,7 +666,7 @@ async def reset_database():
         await init_db()
         return {"success": True}
     except Exception as e:
-        logger.error(f"Database reset error: {e}")
+        logger.error("Database reset error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Health check endpoint
@@ -528,9 +687,25 @@ async def startup_event():
         await init_db()
         logger.info("Database initialized successfully")
     except Exception as e:
-        logger.error(f"Database initialization error: {e}")
+        logger.error("Database initialization error: %s", e)
+    # Resumes jobs interrupted by a previous shutdown or crash
+    await enrichment_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop enrichment workers, warm sandbox workers and state store connections"""
+    await enrichment_jobs.stop()
+    if sandbox.pool:
+        await sandbox.pool.close()
+    await state_store.close()
 
 if __name__ == "__main__":
     import uvicorn
-    logger.info("Starting Agents Simple API with LangGraph on port 8003")
-    uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
+    # Several workers need STATE_BACKEND=redis so they share conversation memory and caches
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and state_store.backend == "memory":
+        logger.warning("Running %s workers with in-process state; reconnects to another worker lose memory", workers)
+    # permessage-deflate shrinks table frames several-fold at some CPU cost per frame
+    per_message_deflate = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
+    logger.info("Starting Agents Simple API with LangGraph on port 8003 (%s workers)", workers)
+    uvicorn.run("app:app", host="0.0.0.0", port=8003, workers=workers, ws_per_message_deflate=per_message_deflate)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Vectorized BOM pre-processing
+Detects the part number / manufacturer columns once per file, normalizes them
+in bulk with pandas string operations and computes the unique lookup keys, so
+enrichment only issues one Z2Data call per distinct part.
+"""
+import re
+import difflib
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from manufacturer_index import manufacturer_index
+
+logger = logging.getLogger(__name__)
+
+# Header spellings in priority order, compared after _header_key normalization
+PART_NUMBER_HEADERS = [
+    'part_number', 'Part Number', 'PartNumber', 'MPN', 'Part',
+    'Manufacturer Part Number', 'Mfr Part Number', 'Mfg Part Number', 'Mfr PN',
+    'Part No', 'Part #', 'P/N', 'PN',
+]
+MANUFACTURER_HEADERS = [
+    'manufacturer', 'Manufacturer', 'MFG', 'Brand',
+    'Mfr', 'Manufacturer Name', 'Mfr Name', 'Maker', 'Make',
+]
+FUZZY_HEADER_CUTOFF = 0.85
+
+# Packaging / ordering suffixes that do not identify a different part
+PACKAGING_SUFFIX_PATTERN = r'(?:#TRPBF|#PBF|#TR|[-/]TR|[-/]REEL7?|,(?:115|215|235))$'
+
+
+def _header_key(header: Any) -> str:
+    """Lowercase a header and drop everything but letters, digits and '#'"""
+    return re.sub(r'[^a-z0-9#]', '', str(header).lower())
+
+
+def _match_column(columns: List[Any], aliases: List[str], exclude: set) -> Optional[Any]:
+    """Find the column matching an alias list, exact spellings first then fuzzy"""
+    keyed = {_header_key(col): col for col in columns if col not in exclude}
+
+    for alias in aliases:
+        col = keyed.get(_header_key(alias))
+        if col is not None:
+            return col
+
+    alias_keys = [_header_key(alias) for alias in aliases]
+    best_col, best_ratio = None, 0.0
+    for key, col in keyed.items():
+        close = difflib.get_close_matches(key, alias_keys, n=1, cutoff=FUZZY_HEADER_CUTOFF)
+        if close:
+            ratio = difflib.SequenceMatcher(None, key, close[0]).ratio()
+            if ratio > best_ratio:
+                best_col, best_ratio = col, ratio
+    return best_col
+
+
+def detect_columns(columns: List[Any]) -> Dict[str, Optional[Any]]:
+    """Detect the part number and manufacturer columns from a header row.
+
+    The part number column is resolved first so "Manufacturer Part Number"
+    is never mistaken for the manufacturer column.
+    """
+    mpn_column = _match_column(columns, PART_NUMBER_HEADERS, set())
+    exclude = {mpn_column} if mpn_column is not None else set()
+    manufacturer_column = _match_column(columns, MANUFACTURER_HEADERS, exclude)
+    return {"mpn_column": mpn_column, "manufacturer_column": manufacturer_column}
+
+
+def normalize_mpn(values: pd.Series) -> pd.Series:
+    """Uppercase, remove whitespace and strip packaging suffixes from MPNs"""
+    mpns = values.astype('string').str.upper().str.replace(r'\s+', '', regex=True)
+    mpns = mpns.str.replace(PACKAGING_SUFFIX_PATTERN, '', regex=True)
+    return mpns.mask(mpns == '')
+
+
+def canonicalize_manufacturer(values: pd.Series) -> pd.Series:
+    """Map manufacturer spellings to canonical names.
+
+    Only the distinct values go through the shared manufacturer index; the
+    result is broadcast back to every row. Unknown names are kept as written.
+    """
+    names = values.astype('string').str.strip()
+    names = names.mask(names == '')
+
+    canonical = {}
+    for name in names.dropna().unique():
+        canonical[name] = manufacturer_index.lookup(name) or name
+    return names.map(canonical).astype('string')
+
+
+def _on_distinct(values: pd.Series, func) -> pd.Series:
+    """Apply a Series transform to the distinct values only and broadcast back.
+
+    BOMs repeat the same parts many times, so this cuts the string work to
+    the number of distinct spellings.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    transformed = func(pd.Series(uniques, dtype='string')).array
+    result = pd.Series(pd.NA, index=values.index, dtype='string')
+    present = codes >= 0
+    result[present] = transformed.take(codes[present])
+    return result
+
+
+def prepare_bom(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Run the whole pre-processing stage once per file.
+
+    Returns the detected columns, the normalized MPN and manufacturer
+    series, the distinct (mpn, manufacturer) keys, and per-row codes into
+    that key list (-1 for rows without a part number).
+    """
+    detected = detect_columns(list(frame.columns))
+    mpn_column = detected["mpn_column"]
+    manufacturer_column = detected["manufacturer_column"]
+
+    if mpn_column is None:
+        logger.info("No part number column found in %s", list(frame.columns))
+        return {
+            **detected,
+            "mpn": None,
+            "manufacturer": None,
+            "unique_keys": [],
+            "row_codes": [-1] * len(frame)
+        }
+
+    mpn = _on_distinct(frame[mpn_column], normalize_mpn)
+    if manufacturer_column is not None:
+        manufacturer = _on_distinct(frame[manufacturer_column], canonicalize_manufacturer)
+    else:
+        manufacturer = pd.Series(pd.NA, index=frame.index, dtype='string')
+
+    # One code per distinct (mpn, manufacturer); rows without an MPN get -1
+    combined = mpn + '\x1f' + manufacturer.fillna('')
+    codes, _ = pd.factorize(combined, use_na_sentinel=True)
+
+    # Codes follow first appearance, so the first row of each code carries its key
+    _, first_rows = np.unique(codes, return_index=True)
+    first_rows = first_rows[codes[first_rows] >= 0]
+    makers = [m if isinstance(m, str) else None for m in manufacturer.take(first_rows).tolist()]
+    unique_keys = list(zip(mpn.take(first_rows).tolist(), makers))
+
+    logger.info("Prepared BOM: %s rows, %s unique parts (mpn column '%s', manufacturer column '%s')",
+                len(frame), len(unique_keys), mpn_column, manufacturer_column)
+
+    return {
+        **detected,
+        "mpn": mpn,
+        "manufacturer": manufacturer,
+        "unique_keys": unique_keys,
+        "row_codes": codes.tolist()
+    }
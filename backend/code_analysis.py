@@ -0,0 +1,360 @@
+"""
+Static safety analysis for sandbox code
+A single ast walk checks imports, builtin names and attribute access against
+allowlists and reports each violation with its line and column. The same walk
+notes whether the snippet is deterministic, so its results can be memoized.
+Results are cached per snippet, so regenerated or re-run code is not parsed twice.
+"""
+import ast
+import builtins
+import importlib
+from types import ModuleType
+from functools import lru_cache
+from typing import NamedTuple, Tuple, Dict, List, Any
+
+ANALYSIS_CACHE_SIZE = 512
+
+# Modules user code may import (submodules included)
+ALLOWED_MODULES = {
+    'math', 'random', 'datetime', 'json', 'statistics',
+    'collections', 'itertools', 'functools', 'heapq', 'bisect',
+    're', 'textwrap', 'decimal', 'fractions', 'numbers',
+    'copy', 'enum', 'dataclasses', 'typing', 'pprint', 'calendar',
+    'numpy', 'pandas',
+}
+
+# Allowed modules that are slow to import; one-shot workers preload them only on demand
+DATA_LIBRARIES = {'numpy', 'pandas'}
+
+# Parts of allowed packages that read or write files, or load native code
+BLOCKED_SUBMODULES = {
+    'pandas.io', 'numpy.lib.format', 'numpy.lib.npyio', 'numpy.ctypeslib',
+    'numpy.f2py', 'numpy.distutils', 'numpy.testing',
+}
+
+# Names the sandbox worker binds before running user code (the data
+# libraries only when they are installed)
+PRELOADED_MODULES = {
+    'math': 'math', 'random': 'random', 'datetime': 'datetime', 'json': 'json',
+    'statistics': 'statistics', 'np': 'numpy', 'pd': 'pandas',
+}
+
+ALLOWED_BUILTINS = {
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 'callable', 'chr',
+    'classmethod', 'complex', 'dict', 'dir', 'divmod', 'enumerate', 'filter', 'float',
+    'format', 'frozenset', 'hasattr', 'hash', 'hex', 'id', 'int', 'isinstance', 'issubclass',
+    'iter', 'len', 'list', 'map', 'max', 'min', 'next', 'object', 'oct', 'ord', 'pow',
+    'print', 'property', 'range', 'repr', 'reversed', 'round', 'set', 'slice', 'sorted',
+    'staticmethod', 'str', 'sum', 'super', 'tuple', 'type', 'zip',
+    'True', 'False', 'None', 'Ellipsis', 'NotImplemented', 'exit', 'quit',
+}
+
+# Dunder attributes needed by ordinary classes; every other dunder is rejected
+ALLOWED_DUNDERS = {
+    '__name__', '__doc__', '__init__', '__str__', '__repr__', '__len__', '__iter__',
+    '__next__', '__enter__', '__exit__', '__eq__', '__ne__', '__lt__', '__le__', '__gt__',
+    '__ge__', '__hash__', '__contains__', '__getitem__', '__setitem__', '__call__',
+    '__add__', '__sub__', '__mul__', '__truediv__',
+}
+
+# Frame and code introspection reaches globals and builtins without any dunder,
+# and DataFrame/ndarray writers take file paths
+BLOCKED_ATTRIBUTES = {
+    'gi_frame', 'gi_code', 'cr_frame', 'cr_code', 'ag_frame', 'ag_code',
+    'tb_frame', 'tb_next', 'f_globals', 'f_locals', 'f_builtins', 'f_back', 'f_code',
+    'to_csv', 'to_excel', 'to_parquet', 'to_pickle', 'to_hdf', 'to_sql', 'to_feather',
+    'to_stata', 'to_orc', 'to_xml', 'to_clipboard', 'to_json', 'to_html', 'to_latex',
+    'to_markdown', 'tofile', 'dump',
+}
+
+# File readers, writers and openers (pd.read_csv, np.load, ...), rejected on any
+# receiver since an alias (p = pd) hides which module an attribute belongs to
+BLOCKED_MODULE_ATTRIBUTES = {
+    'load', 'loadtxt', 'genfromtxt', 'fromfile', 'fromregex', 'memmap', 'save', 'savez',
+    'savez_compressed', 'savetxt', 'DataSource', 'ExcelWriter', 'ExcelFile', 'HDFStore',
+    'open', 'open_memmap', 'memory_map', 'popen', 'system',
+    # Resolve dotted attribute paths given as strings, which the walk never sees
+    'attrgetter', 'methodcaller', 'Formatter', 'get_field', 'vformat',
+}
+BLOCKED_MODULE_PREFIXES = ('read_',)
+
+# Formatters that write to a path or buffer when given one (df.to_string('/tmp/x')),
+# allowed only when called directly with keyword options
+BUFFER_WRITERS = {'to_string'}
+BLOCKED_KEYWORDS = {'buf', 'path_or_buf'}
+
+# Modules that allowed modules import and so expose as attributes (json.codecs,
+# datetime.sys, numpy.lib.npyio), rejected by name on any receiver
+REEXPORTED_MODULES = {
+    'os', 'sys', 'codecs', 'subprocess', 'builtins', 'bltns', 'io', 'importlib', 'inspect',
+    'ctypes', 'pickle', 'copyreg', 'marshal', 'types', 'gc', 'sysconfig', 'platform',
+    'threading', 'multiprocessing', 'signal', 'socket', 'shutil', 'tempfile', 'pathlib',
+    'glob', 'posix', 'nt', 'mmap', 'runpy', 'tokenize', 'gzip', 'bz2', 'lzma', 'zipfile',
+    'tarfile', 'npyio', 'fmt', 'pa', 'pc', 'pyarrow',
+}
+
+# Anything that makes two runs of the same snippet print different output. Clock
+# functions are matched by attribute name, as the time module is only reachable
+# through other modules; pandas and numpy parse "now" and "today" as the clock
+NONDETERMINISTIC_MODULES = {'random', 'numpy.random'}
+NONDETERMINISTIC_ATTRIBUTES = {
+    'now', 'today', 'utcnow', 'random', 'sample', 'uuid1', 'uuid4', '__hash__',
+    'time', 'time_ns', 'perf_counter', 'perf_counter_ns', 'monotonic', 'monotonic_ns',
+    'process_time', 'process_time_ns', 'thread_time', 'thread_time_ns',
+    'localtime', 'gmtime', 'ctime', 'asctime',
+}
+NONDETERMINISTIC_BUILTINS = {'id', 'hash'}
+NONDETERMINISTIC_STRINGS = {'now', 'today'}
+
+# Strings may name dunders for helpers that look attributes up by name, so only
+# these may contain '__'
+ALLOWED_DUNDER_STRINGS = {'__main__'}
+
+
+class Diagnostic(NamedTuple):
+    """One reason a snippet was rejected"""
+    line: int
+    col: int
+    rule: str
+    message: str
+
+    def __str__(self):
+        return f"line {self.line}, col {self.col}: {self.message}"
+
+
+class CodeAnalysis(NamedTuple):
+    """Safety diagnostics plus whether repeated runs produce the same output"""
+    diagnostics: Tuple[Diagnostic, ...]
+    deterministic: bool
+    data_libraries: bool = False  # Uses numpy or pandas
+
+
+def _is_exception_name(name: str) -> bool:
+    value = getattr(builtins, name, None)
+    return isinstance(value, type) and issubclass(value, BaseException)
+
+
+def _is_dunder(name: str) -> bool:
+    return name.startswith('__') and name.endswith('__')
+
+
+def _module_allowed(name: str) -> bool:
+    if name.split('.')[0] not in ALLOWED_MODULES:
+        return False
+    return not any(name == blocked or name.startswith(blocked + '.') for blocked in BLOCKED_SUBMODULES)
+
+
+def _data_module(name: str) -> bool:
+    return name.split('.')[0] in DATA_LIBRARIES
+
+
+def _nondeterministic_module(name: str) -> bool:
+    return any(name == module or name.startswith(module + '.') for module in NONDETERMINISTIC_MODULES)
+
+
+def _import(name: str):
+    """Import an allowed module for resolution, or None when it is not installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _preloaded_modules() -> Dict[str, ModuleType]:
+    modules = {alias: _import(name) for alias, name in PRELOADED_MODULES.items()}
+    return {alias: module for alias, module in modules.items() if module is not None}
+
+
+class _SafetyVisitor(ast.NodeVisitor):
+    """Collects diagnostics while tracking which names are bound to allowed modules"""
+
+    def __init__(self):
+        self.diagnostics = []
+        self.deterministic = True
+        self.data_libraries = False
+        self.modules: Dict[str, ModuleType] = _preloaded_modules()
+        self._resolved: Dict[int, ModuleType] = {}
+        self._plain_writer_calls = set()  # ids of BUFFER_WRITERS attributes called without a target
+
+    def report(self, node: ast.AST, rule: str, message: str):
+        self.diagnostics.append(Diagnostic(node.lineno, node.col_offset, rule, message))
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if not _module_allowed(alias.name):
+                self.report(node, "import", f"import of '{alias.name}' is not allowed")
+                continue
+            module = _import(alias.name)
+            if module is None:
+                continue  # Let the ImportError surface at run time
+            if _nondeterministic_module(alias.name):
+                self.deterministic = False
+            if _data_module(alias.name):
+                self.data_libraries = True
+            if alias.asname:
+                self.modules[alias.asname] = module
+            else:
+                root = alias.name.split('.')[0]
+                self.modules[root] = _import(root)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.level or not node.module or not _module_allowed(node.module):
+            self.report(node, "import", f"import from '{'.' * node.level}{node.module or ''}' is not allowed")
+            return
+        module = _import(node.module)
+        if module is None:
+            return  # Let the ImportError surface at run time
+        if _nondeterministic_module(node.module):
+            self.deterministic = False
+        if _data_module(node.module):
+            self.data_libraries = True
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            if alias.name.startswith('_'):
+                self.report(node, "import", f"import of private name '{node.module}.{alias.name}' is not allowed")
+                continue
+            if alias.name in BLOCKED_MODULE_ATTRIBUTES or alias.name.startswith(BLOCKED_MODULE_PREFIXES):
+                self.report(node, "import", f"import of '{node.module}.{alias.name}' is not allowed")
+                continue
+            value = getattr(module, alias.name, None)
+            if value is None:
+                value = _import(f"{node.module}.{alias.name}")
+                if value is None:
+                    continue
+            if isinstance(value, ModuleType):
+                if not _module_allowed(value.__name__):
+                    self.report(node, "import", f"import of module '{value.__name__}' is not allowed")
+                    continue
+                self.modules[alias.asname or alias.name] = value
+
+    def visit_Name(self, node: ast.Name):
+        name = node.id
+        if name in self.modules and isinstance(node.ctx, ast.Load):
+            self._resolved[id(node)] = self.modules[name]
+            if _nondeterministic_module(self.modules[name].__name__):
+                self.deterministic = False
+            if _data_module(self.modules[name].__name__):
+                self.data_libraries = True
+            return
+        if name in NONDETERMINISTIC_BUILTINS:
+            self.deterministic = False
+        if _is_dunder(name):
+            if name not in ('__name__', '__doc__'):
+                self.report(node, "name", f"name '{name}' is not allowed")
+        elif (hasattr(builtins, name) and name not in ALLOWED_BUILTINS
+              and not _is_exception_name(name)):
+            self.report(node, "name", f"builtin '{name}' is not allowed")
+
+    def visit_Constant(self, node: ast.Constant):
+        if not isinstance(node.value, str):
+            return
+        if '__' in node.value and node.value not in ALLOWED_DUNDER_STRINGS:
+            self.report(node, "string", "strings containing '__' are not allowed")
+        if node.value.strip().lower() in NONDETERMINISTIC_STRINGS:
+            self.deterministic = False
+
+    def visit_Call(self, node: ast.Call):
+        for keyword in node.keywords:
+            if keyword.arg in BLOCKED_KEYWORDS:
+                self.report(keyword, "argument", f"argument '{keyword.arg}' is not allowed")
+        if (isinstance(node.func, ast.Attribute) and node.func.attr in BUFFER_WRITERS
+                and not node.args and all(keyword.arg is not None for keyword in node.keywords)):
+            self._plain_writer_calls.add(id(node.func))
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self.visit(node.value)
+        attr = node.attr
+        if attr in NONDETERMINISTIC_ATTRIBUTES:
+            self.deterministic = False
+        if (_is_dunder(attr) and attr not in ALLOWED_DUNDERS) or attr in BLOCKED_ATTRIBUTES:
+            self.report(node, "attribute", f"attribute '{attr}' is not allowed")
+            return
+
+        # Private helpers and file functions (random._os, pd.read_csv) are rejected
+        # whatever the receiver is, so aliases and expressions (r = random; r._os)
+        # cannot reach them
+        module = self._resolved.get(id(node.value))
+        qualified = f"{module.__name__}.{attr}" if module is not None else attr
+        if attr.startswith('_') and not _is_dunder(attr):
+            self.report(node, "attribute", f"private attribute '{qualified}' is not allowed")
+            return
+        if attr in BLOCKED_MODULE_ATTRIBUTES or attr.startswith(BLOCKED_MODULE_PREFIXES):
+            self.report(node, "attribute", f"'{qualified}' is not allowed")
+            return
+        if attr in BUFFER_WRITERS and id(node) not in self._plain_writer_calls:
+            self.report(node, "attribute", f"'{attr}' may only be called with keyword options")
+            return
+
+        # Attributes of modules are resolved, so disallowed modules cannot be reached;
+        # on other receivers re-exported modules (j = json; j.codecs) are matched by name
+        value = getattr(module, attr, None) if module is not None else None
+        if isinstance(value, ModuleType):
+            if not _module_allowed(value.__name__):
+                self.report(node, "attribute", f"module '{value.__name__}' is not allowed")
+            else:
+                self._resolved[id(node)] = value
+        elif attr in REEXPORTED_MODULES:
+            self.report(node, "attribute", f"module '{attr}' is not allowed")
+
+
+def _guarded_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """__import__ for sandbox code: allowed modules only, never relative"""
+    if level or not _module_allowed(name):
+        raise ImportError(f"import of '{name}' is not allowed")
+    return builtins.__import__(name, globals, locals, fromlist, level)
+
+
+def restricted_builtins() -> Dict[str, Any]:
+    """Builtins for executing sandbox code: the allowlist, exception types, and the
+    hooks class statements and allowed imports need"""
+    allowed = {name: getattr(builtins, name) for name in dir(builtins)
+               if name in ALLOWED_BUILTINS or _is_exception_name(name)}
+    allowed['__build_class__'] = builtins.__build_class__
+    allowed['__import__'] = _guarded_import
+    return allowed
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def parse_code(code: str) -> ast.Module:
+    """Parse a snippet once; callers must not mutate the returned tree"""
+    return ast.parse(code, filename='<sandbox>')
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def inspect_code(code: str) -> CodeAnalysis:
+    """Safety diagnostics (in source order) and determinism of a snippet"""
+    try:
+        tree = parse_code(code)
+    except SyntaxError as e:
+        diagnostic = Diagnostic(e.lineno or 1, (e.offset or 1) - 1, "syntax", f"syntax error: {e.msg}")
+        return CodeAnalysis((diagnostic,), False)
+
+    visitor = _SafetyVisitor()
+    visitor.visit(tree)
+    diagnostics = tuple(sorted(visitor.diagnostics, key=lambda d: (d.line, d.col)))
+    return CodeAnalysis(diagnostics, visitor.deterministic, visitor.data_libraries)
+
+
+def analyze_code(code: str) -> Tuple[Diagnostic, ...]:
+    """All safety violations in a snippet, in source order (empty when it is safe to run)"""
+    return inspect_code(code).diagnostics
+
+
+def normalized_code(code: str) -> str:
+    """Canonical form of a parseable snippet; formatting and comments do not change it"""
+    return ast.dump(parse_code(code))
+
+
+def format_diagnostics(diagnostics: Tuple[Diagnostic, ...]) -> str:
+    """Human-readable rejection message, one violation per line"""
+    lines = "\n".join(str(d) for d in diagnostics)
+    if all(d.rule == "syntax" for d in diagnostics):
+        return f"Code has a syntax error:\n{lines}"
+    return f"Code contains potentially unsafe operations:\n{lines}"
+
+
+def diagnostics_to_dicts(diagnostics: Tuple[Diagnostic, ...]) -> List[Dict[str, Any]]:
+    """Diagnostics as plain dicts for JSON responses"""
+    return [d._asdict() for d in diagnostics]
@@ -0,0 +1,118 @@
+"""
+Code extraction for LLM responses
+Pulls a single runnable Python block out of a response that may mix markdown
+fences, prose and other languages, and compile-checks it in the parent
+process so the sandbox never spends an execution on text that cannot run.
+"""
+import re
+import textwrap
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+# ```lang ... ``` or ~~~lang ... ~~~ (a response cut off mid-block still yields it)
+FENCE_PATTERN = re.compile(
+    r'^[ \t]*(?P<fence>```|~~~)[ \t]*(?P<lang>[\w+-]*)[^\n]*\n(?P<body>.*?)(?:^[ \t]*(?P=fence)[ \t]*$|\Z)',
+    re.DOTALL | re.MULTILINE
+)
+PYTHON_LANGUAGES = {'', 'python', 'py', 'python3', 'py3'}
+
+# First line of unfenced code after any leading prose
+CODE_START_PATTERN = re.compile(
+    r'^\s*(import\s|from\s+[\w.]+\s+import\s|def\s|async\s+def\s|class\s|@\w|#|print\(|'
+    r'for\s|while\s|if\s|with\s|try:|[A-Za-z_][\w.\[\]\'"]*\s*(=|\(|\+=|-=))'
+)
+MAX_TRAILING_TRIM = 20  # Prose lines dropped from the end of unfenced code
+
+
+@lru_cache(maxsize=512)
+def check_syntax(code: str) -> Optional[str]:
+    """Compile code without running it; returns the error message, or None if it compiles"""
+    try:
+        compile(code, '<sandbox>', 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        return f"{type(e).__name__}: {e.msg} (line {e.lineno})"
+    except ValueError as e:  # e.g. null bytes in the source
+        return f"ValueError: {e}"
+    return None
+
+
+def _has_statements(code: str) -> bool:
+    """Whether code contains anything besides blank lines and comments"""
+    return any(line.strip() and not line.strip().startswith('#') for line in code.splitlines())
+
+
+def extract_code_blocks(text: str) -> List[Dict[str, str]]:
+    """All fenced blocks in a response, with their language tags"""
+    return [
+        {"language": match.group('lang').lower(), "code": textwrap.dedent(match.group('body')).strip()}
+        for match in FENCE_PATTERN.finditer(text or "")
+    ]
+
+
+def _unfenced_code(text: str) -> Optional[str]:
+    """Code from a response without fences, skipping leading and trailing prose"""
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if CODE_START_PATTERN.match(line)), None)
+    if start is None:
+        return None
+
+    candidate = lines[start:]
+    for _ in range(min(MAX_TRAILING_TRIM, len(candidate))):
+        code = "\n".join(candidate).strip()
+        if check_syntax(code) is None:
+            return code
+        candidate = candidate[:-1]
+    # Nothing compiles; hand back the whole thing so a repair round can fix it
+    return "\n".join(lines[start:]).strip()
+
+
+def extract_code(text: str) -> Optional[str]:
+    """
+    The single Python block to run from an LLM response or user message.
+    Prefers fenced Python (or untagged) blocks that compile, longest first;
+    falls back to unfenced code. Returns None when there is no code at all.
+    """
+    if not text or not text.strip():
+        return None
+
+    blocks = [
+        block["code"] for block in extract_code_blocks(text)
+        if block["language"] in PYTHON_LANGUAGES and _has_statements(block["code"])
+    ]
+    if blocks:
+        return max(blocks, key=lambda code: (check_syntax(code) is None, len(code)))
+
+    if check_syntax(text.strip()) is None:
+        code = text.strip()
+        return code if _has_statements(code) else None
+
+    code = _unfenced_code(text)
+    return code if code and _has_statements(code) else None
+
+
+class ExtractionStats:
+    """Counts how code requests ended, including sandbox executions that were never started"""
+
+    def __init__(self):
+        self.outcomes = Counter()
+
+    def record(self, outcome: str):
+        """outcome: executed, no_code, syntax_error, repaired or repair_failed"""
+        self.outcomes[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        outcomes = self.outcomes
+        return {
+            "executed": outcomes["executed"],
+            "no_code": outcomes["no_code"],
+            "syntax_errors": outcomes["syntax_error"],
+            "repairs_attempted": outcomes["repaired"] + outcomes["repair_failed"],
+            "repairs_succeeded": outcomes["repaired"],
+            # Responses that would previously have been sent to the sandbox and failed
+            "executions_avoided": outcomes["no_code"] + outcomes["syntax_error"]
+        }
+
+
+# Global extraction stats instance
+extraction_stats = ExtractionStats()
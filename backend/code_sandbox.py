@@ -1,131 +1,457 @@
 """
 Simplified Code Execution Sandbox
-Uses subprocess with timeout for basic safety (not production-ready)
+Checks code against an AST allowlist, then runs it in a pool of pre-warmed
+worker processes with a timeout, OS resource limits and capped output for
+basic safety (not production-ready). Results of deterministic snippets are
+memoized by content hash. An uploaded dataset can be memory-mapped into the
+worker as a pandas DataFrame named `df`.
 In production, use WebAssembly or container-based sandboxing
 """
-import subprocess
-import tempfile
 import os
+import re
+import sys
+import json
+import time
 import asyncio
+import hashlib
 import logging
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from execution_scheduler import DEFAULT_MAX_CONCURRENT
+from code_analysis import inspect_code, normalized_code, format_diagnostics, diagnostics_to_dicts
+from tracing import traced, current_span
+from metrics import cache_requests, sandbox_execution_time
 
 logger = logging.getLogger(__name__)
 
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "sandbox_worker.py")
+
+# Warm worker pool settings (SANDBOX_POOL_SIZE=0 starts a fresh interpreter per execution);
+# by default there is one warm worker per execution slot of the scheduler
+DEFAULT_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", str(DEFAULT_MAX_CONCURRENT)))
+DEFAULT_MAX_EXECUTIONS = int(os.getenv("SANDBOX_MAX_EXECUTIONS_PER_WORKER", "100"))
+WORKER_STREAM_LIMIT = 1024 * 1024  # Longest result line a worker may send
+# Failed spawns are retried with exponential backoff, and a caller waits at most
+# ACQUIRE_TIMEOUT seconds for a worker before running in a one-shot one instead
+SPAWN_RETRY_DELAY = 0.5
+SPAWN_RETRY_MAX_DELAY = float(os.getenv("SANDBOX_SPAWN_RETRY_MAX_DELAY", "30"))
+ACQUIRE_TIMEOUT = float(os.getenv("SANDBOX_ACQUIRE_TIMEOUT", "30"))
+
+# Per-execution resource limits, enforced with setrlimit inside the worker
+DEFAULT_LIMITS = {
+    'cpu_seconds': int(os.getenv("SANDBOX_CPU_SECONDS", "5")),
+    'memory_mb': int(os.getenv("SANDBOX_MEMORY_MB", "1024")),
+    'file_size_mb': int(os.getenv("SANDBOX_FILE_SIZE_MB", "1")),
+    'max_processes': int(os.getenv("SANDBOX_MAX_PROCESSES", "0")),
+}
+
+# Memoized results of deterministic snippets
+RESULT_CACHE_ENTRIES = int(os.getenv("SANDBOX_RESULT_CACHE_ENTRIES", "256"))
+RESULT_CACHE_BYTES = int(os.getenv("SANDBOX_RESULT_CACHE_BYTES", str(4 * 1024 * 1024)))
+# Default object reprs print memory addresses, which differ between runs
+ADDRESS_PATTERN = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def _sandbox_version() -> str:
+    """Changes whenever the worker, its builtins allowlist or the interpreter running it changes"""
+    digest = hashlib.sha256(sys.version.encode())
+    for path in (WORKER_SCRIPT, os.path.join(os.path.dirname(__file__), "code_analysis.py")):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+SANDBOX_VERSION = _sandbox_version()
+
+_cache_hits = cache_requests.labels(cache="sandbox_result", result="hit")
+_cache_misses = cache_requests.labels(cache="sandbox_result", result="miss")
+
+
+class PoolUnavailable(Exception):
+    """No pooled worker could be had in time"""
+    pass
+
+
+class SandboxWorker:
+    """One pre-warmed interpreter running sandbox_worker.py"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.executions = 0
+
+    @classmethod
+    async def start(cls, limits: Dict[str, int] = None, preload_data: bool = True) -> "SandboxWorker":
+        """Spawn a worker with its resource limits and wait until its safe modules are imported"""
+        config = {**(limits or DEFAULT_LIMITS), 'preload_data': preload_data}
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, json.dumps(config),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # A fixed hash seed keeps set and dict-of-str ordering stable across workers;
+            # single-threaded BLAS stays within the process limit
+            env={**os.environ, "PYTHONHASHSEED": "0", "OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1"},
+            limit=WORKER_STREAM_LIMIT
+        )
+        ready = await process.stdout.readline()
+        if not ready:
+            raise RuntimeError("Sandbox worker exited during startup")
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def run(self, code: str, max_output: int, dataset: Optional[str] = None) -> Dict[str, Any]:
+        """Send one snippet (and the Arrow file to expose as df) and wait for its result line"""
+        self.executions += 1
+        request = json.dumps({"code": code, "max_output": max_output, "dataset": dataset}) + "\n"
+        self.process.stdin.write(request.encode('utf-8'))
+        await self.process.stdin.drain()
+
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Sandbox worker exited unexpectedly")
+        return json.loads(line)
+
+    async def stop(self):
+        """Kill the worker and reap the process"""
+        if self.alive:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+        await self.process.wait()
+
+
+class SandboxPool:
+    """Pool of warm sandbox workers, recycled after max_executions or any violation"""
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, max_executions: int = DEFAULT_MAX_EXECUTIONS,
+                 limits: Dict[str, int] = None):
+        self.size = size
+        self.max_executions = max_executions
+        self.limits = limits or DEFAULT_LIMITS
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._workers = set()
+        self._tasks = set()
+        self._unavailable: Optional[asyncio.Event] = None  # Set while no worker is alive and spawns fail
+        self._closing: Optional[asyncio.Event] = None
+
+    def _ensure_started(self):
+        """Bind the pool to the running loop, spawning workers on first use"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Workers from a previous event loop cannot be awaited on this one
+        for worker in self._workers:
+            if worker.alive:
+                worker.process.kill()
+        self._loop = loop
+        self._idle = asyncio.Queue()
+        self._workers = set()
+        self._tasks = set()
+        self._unavailable = asyncio.Event()
+        self._closing = asyncio.Event()
+        for _ in range(self.size):
+            self._background(self._start_worker())
+
+    def _background(self, coro):
+        """Run pool housekeeping without blocking the caller"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _start_worker(self):
+        """Spawn a worker, retrying with exponential backoff until one starts or the pool closes"""
+        closing = self._closing
+        delay = SPAWN_RETRY_DELAY
+        while True:
+            try:
+                worker = await SandboxWorker.start(self.limits)
+                break
+            except Exception as e:
+                if not self._workers:
+                    self._unavailable.set()
+                logger.error("Failed to start sandbox worker, retrying in %.1fs: %s", delay, e)
+            try:
+                await asyncio.wait_for(closing.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if closing.is_set():
+                return
+            delay = min(delay * 2, SPAWN_RETRY_MAX_DELAY)
+        if closing.is_set():
+            await worker.stop()
+            return
+        self._unavailable.clear()
+        self._workers.add(worker)
+        self._idle.put_nowait(worker)
+
+    async def _replace_worker(self, worker: SandboxWorker):
+        self._workers.discard(worker)
+        await worker.stop()
+        await self._start_worker()
+
+    async def acquire(self, timeout: float = ACQUIRE_TIMEOUT) -> SandboxWorker:
+        """Take an idle, live worker, waiting up to timeout seconds if all are busy.
+        Raises PoolUnavailable when none frees up in time or none can be started."""
+        self._ensure_started()
+        deadline = self._loop.time() + timeout
+        while True:
+            worker = await self._next_idle(deadline)
+            if worker.alive:
+                return worker
+            self._background(self._replace_worker(worker))
+
+    async def _next_idle(self, deadline: float) -> SandboxWorker:
+        if self._idle.empty() and self._unavailable.is_set():
+            raise PoolUnavailable("no sandbox worker could be started")
+        get = asyncio.ensure_future(self._idle.get())
+        failed = asyncio.ensure_future(self._unavailable.wait())
+        try:
+            await asyncio.wait((get, failed), timeout=max(0.0, deadline - self._loop.time()),
+                               return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            if get.done() and not get.cancelled():
+                self._idle.put_nowait(get.result())  # A worker arrived as the caller was cancelled
+            raise
+        finally:
+            failed.cancel()
+            get.cancel()
+        if get.done() and not get.cancelled():
+            return get.result()
+        if self._unavailable.is_set():
+            raise PoolUnavailable("no sandbox worker could be started")
+        raise PoolUnavailable("all sandbox workers stayed busy")
+
+    def release(self, worker: SandboxWorker, recycle: bool = False):
+        """Return a worker to the pool, or replace it when it is used up or tainted"""
+        if recycle or not worker.alive or worker.executions >= self.max_executions:
+            self._background(self._replace_worker(worker))
+        else:
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        """Stop every worker once pending spawns and replacements have settled"""
+        if self._loop is None:
+            return
+        self._closing.set()
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self._workers), return_exceptions=True)
+        self._workers = set()
+        self._loop = None
+        self._idle = None
+
+
+class ExecutionCache:
+    """LRU of execution results keyed by content hash, bounded by entry count and output bytes"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_ENTRIES, max_bytes: int = RESULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            _cache_misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        _cache_hits.inc()
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        size = self._size(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.size_bytes -= self._size(self._entries.pop(key))
+        self._entries[key] = result
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= self._size(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    @staticmethod
+    def _size(result: Dict[str, Any]) -> int:
+        return len(result.get("output", "")) + len(result.get("error", ""))
+
+
 class SimpleSandbox:
     """Simple code execution sandbox with basic safety measures"""
     
-    def __init__(self):
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_executions: int = DEFAULT_MAX_EXECUTIONS,
+                 limits: Dict[str, int] = None):
         self.timeout = 10  # 10 second timeout
         self.max_output_size = 10000  # Max 10KB output
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.pool = SandboxPool(pool_size, max_executions, self.limits) if pool_size > 0 else None
+        self.result_cache = ExecutionCache()
         
-    async def execute(self, code: str) -> Dict[str, Any]:
-        """Execute Python code in a subprocess with timeout"""
-        
-        # Basic safety checks
-        dangerous_patterns = [
-            'import os',
-            'import subprocess', 
-            'import sys',
-            '__import__',
-            'eval(',
-            'exec(',
-            'compile(',
-            'open(',
-            'file(',
-            'input(',
-            'raw_input',
-            'globals(',
-            'locals(',
-            'vars(',
-            'dir(',
-            'getattr(',
-            'setattr(',
-            'delattr(',
-            'type(',
-            'help(',
-        ]
-        
-        code_lower = code.lower()
-        for pattern in dangerous_patterns:
-            if pattern.lower() in code_lower:
-                return {
-                    "success": False,
-                    "error": f"Code contains potentially unsafe operation: {pattern}",
-                    "output": ""
-                }
+    @traced("sandbox.execute")
+    async def execute(self, code: str, use_cache: bool = True, dataset: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute Python code in a warm worker (or a fresh one) with timeout and resource limits.
+        dataset is the path of an Arrow IPC file exposed read-only to the code as `df`.
+        """
         
-        # Add safe imports
-        safe_code = """
-import math
-import random
-import datetime
-import json
-import statistics
+        # Static safety analysis (cached per snippet)
+        analysis = inspect_code(code)
+        span = current_span()
+        if analysis.diagnostics:
+            span.set_attribute("rejected", True)
+            return {
+                "success": False,
+                "error": format_diagnostics(analysis.diagnostics),
+                "output": "",
+                "diagnostics": diagnostics_to_dicts(analysis.diagnostics)
+            }
 
-# User code below
-""" + code
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(safe_code)
-            temp_file = f.name
-        
+        key = self._cache_key(code, dataset) if analysis.deterministic else None
+        if key and use_cache:
+            cached = self.result_cache.get(key)
+            if cached:
+                span.set_attribute("cached", True)
+                return {**cached, "cached": True}
+
+        span.set_attribute("pooled", bool(self.pool))
+        with sandbox_execution_time.time(mode="pooled" if self.pool else "fresh"):
+            if self.pool:
+                result, recycle = await self._execute_pooled(code, dataset)
+            else:
+                # A one-shot worker only pays for importing pandas when the snippet needs it
+                preload_data = bool(dataset) or analysis.data_libraries
+                result, recycle = await self._execute_subprocess(code, dataset, preload_data)
+        if result.get("violation"):
+            span.set_attribute("violation", result["violation"])
+
+        # Limit violations and timeouts depend on the host, not the code
+        if key and not recycle and not ADDRESS_PATTERN.search(result["output"]):
+            self.result_cache.put(key, dict(result))
+        return result
+
+    def cached_result(self, code: str, dataset: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Memoized result for a deterministic snippet, without running anything"""
+        analysis = inspect_code(code)
+        if analysis.diagnostics or not analysis.deterministic:
+            return None
+        cached = self.result_cache.get(self._cache_key(code, dataset))
+        return {**cached, "cached": True} if cached else None
+
+    def _cache_key(self, code: str, dataset: Optional[str] = None) -> str:
+        """Content address of a run: normalized code, sandbox version, run settings and dataset version"""
+        data_version = None
+        if dataset:
+            try:
+                stat = os.stat(dataset)
+                data_version = [dataset, stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                data_version = [dataset]
+        payload = json.dumps(
+            [SANDBOX_VERSION, normalized_code(code), self.max_output_size, self.limits, data_version],
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def _execute_pooled(self, code: str, dataset: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Run code in a pre-warmed worker; any failure or limit violation retires the worker"""
+        try:
+            worker = await self.pool.acquire()
+        except PoolUnavailable as e:
+            logger.warning("Sandbox pool unavailable (%s); running in a one-shot worker", e)
+            return await self._execute_subprocess(code, dataset)
+        recycle = True
+        try:
+            result, recycle = await self._run(worker, code, dataset)
+            return result, recycle
+        finally:
+            self.pool.release(worker, recycle=recycle)
+
+    async def _execute_subprocess(self, code: str, dataset: Optional[str] = None,
+                                  preload_data: bool = True) -> Tuple[Dict[str, Any], bool]:
+        """Run code in a one-shot worker (used when the pool is disabled)"""
+        try:
+            worker = await SandboxWorker.start(self.limits, preload_data)
+        except Exception as e:
+            logger.error("Sandbox execution error: %s", e)
+            return {
+                "success": False,
+                "error": str(e),
+                "output": ""
+            }, True
+
+        try:
+            return await self._run(worker, code, dataset)
+        finally:
+            await worker.stop()
+
+    async def _run(self, worker: SandboxWorker, code: str, dataset: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Execute code in a worker; returns the result and whether the worker must be retired"""
+        started = time.perf_counter()
         try:
-            # Run in subprocess with timeout
-            process = await asyncio.create_subprocess_exec(
-                'python', temp_file,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            result = await asyncio.wait_for(
+                worker.run(code, self.max_output_size, dataset),
+                timeout=self.timeout
             )
-            
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.timeout
-                )
-                
-                output = stdout.decode('utf-8')
-                error = stderr.decode('utf-8')
-                
-                # Limit output size
-                if len(output) > self.max_output_size:
-                    output = output[:self.max_output_size] + "\n... (output truncated)"
-                
-                if error:
-                    return {
-                        "success": False,
-                        "error": error,
-                        "output": output
-                    }
-                
-                return {
-                    "success": True,
-                    "output": output,
-                    "error": ""
-                }
-                
-            except asyncio.TimeoutError:
-                process.kill()
-                return {
-                    "success": False,
-                    "error": f"Code execution timed out after {self.timeout} seconds",
-                    "output": ""
-                }
-                
+        except asyncio.TimeoutError:
+            return {
+                "success": False,
+                "error": f"Code execution timed out after {self.timeout} seconds",
+                "output": ""
+            }, True
         except Exception as e:
-            logger.error(f"Sandbox execution error: {e}")
+            logger.error("Sandbox execution error: %s", e)
             return {
                 "success": False,
                 "error": str(e),
                 "output": ""
+            }, True
+
+        usage = {**result["usage"], "wall_time_ms": round((time.perf_counter() - started) * 1000, 2)}
+        violation = result.get("violation")
+        output = result["output"]
+        if violation:
+            logger.warning("Sandbox limit violation: %s (usage %s)", violation, usage)
+        if violation == "output_limit":
+            output += "\n... (output truncated)"
+
+        if result["error"]:
+            outcome = {
+                "success": False,
+                "error": result["error"],
+                "output": output,
+                "usage": usage
             }
-        finally:
-            # Clean up temp file
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+        else:
+            outcome = {
+                "success": True,
+                "output": output,
+                "error": "",
+                "usage": usage
+            }
+        if violation:
+            outcome["violation"] = violation
+        return outcome, violation is not None
 
 class ProductionSandbox:
     """
@@ -147,9 +473,8 @@ class ProductionSandbox:
     async def execute(self, code: str) -> Dict[str, Any]:
         """Execute code in production sandbox"""
         if not self.available:
-            # Fall back to simple sandbox
-            simple = SimpleSandbox()
-            return await simple.execute(code)
+            # Fall back to the shared simple sandbox and its warm workers
+            return await sandbox.execute(code)
         
         # Production implementation would go here
         return {
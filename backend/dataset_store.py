@@ -0,0 +1,358 @@
+"""
+Server-side dataset store for uploaded BOM files
+Uploads are spooled to disk and parsed in chunks, so a large export never has
+to be held in memory as a single DataFrame. Each parsed upload is kept as a
+Parquet file under an upload ID, with an uncompressed Arrow IPC copy written
+on demand for the code sandbox to memory-map.
+"""
+import os
+import re
+import json
+import uuid
+import shutil
+import asyncio
+import tempfile
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+SPOOL_BLOCK_SIZE = 1024 * 1024  # 1 MB reads from the request body
+DEFAULT_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+PREVIEW_ROWS = 5
+
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_supported_filename(filename: Optional[str]) -> bool:
+    """Check whether the uploaded file has an extension we can parse"""
+    return bool(filename) and filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def detect_format(head: bytes) -> str:
+    """Detect the real file format from its leading bytes.
+
+    Exports are often mislabelled (CSV saved as .xls, xlsx renamed to .xls),
+    so the magic bytes win over the extension.
+    """
+    if head.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    return 'csv'
+
+
+def _header_names(header: tuple) -> List[str]:
+    """Build unique string column names from an Excel header row, like pandas does"""
+    # Drop trailing empty header cells that read-only sheets report past the data
+    cells = list(header)
+    while cells and cells[-1] is None:
+        cells.pop()
+
+    names = []
+    seen: Dict[str, int] = {}
+    for idx, cell in enumerate(cells):
+        name = str(cell).strip() if cell is not None else f"Unnamed: {idx}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _cell_to_str(value: Any) -> Optional[str]:
+    """Normalize an Excel cell value to the string representation used for CSV columns"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _iter_csv_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield CSV chunks with every column kept as text (MPNs like 0805 keep leading zeros)"""
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str):
+        yield chunk
+
+
+def _iter_xlsx_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield chunks from the first worksheet using openpyxl's streaming read-only mode"""
+    from openpyxl import load_workbook
+
+    # Pass a file object: openpyxl rejects paths without an Excel extension
+    source = open(path, 'rb')
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header_names(header)
+        width = len(columns)
+
+        batch = []
+        yielded = False
+        for row in rows:
+            values = [_cell_to_str(v) for v in row[:width]]
+            if all(v is None for v in values):
+                continue
+            values.extend([None] * (width - len(values)))
+            batch.append(values)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+                yielded = True
+
+        # A header-only sheet still yields one empty chunk so the columns are recorded
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+        source.close()
+
+
+def _iter_xls_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Legacy .xls has no streaming reader, so it is parsed in one pass"""
+    yield pd.read_excel(path, dtype=str)
+
+
+_CHUNK_READERS = {
+    'csv': _iter_csv_chunks,
+    'xlsx': _iter_xlsx_chunks,
+    'xls': _iter_xls_chunks,
+}
+
+
+def _read_page(parquet: pq.ParquetFile, offset: int, limit: int) -> List[Dict[str, Any]]:
+    """Read one page of rows, decoding only the row groups that overlap it"""
+    end = offset + limit
+
+    groups = []
+    first_row = None
+    group_start = 0
+    for idx in range(parquet.metadata.num_row_groups):
+        group_rows = parquet.metadata.row_group(idx).num_rows
+        group_end = group_start + group_rows
+        if group_end > offset and group_start < end:
+            groups.append(idx)
+            if first_row is None:
+                first_row = group_start
+        group_start = group_end
+
+    if not groups:
+        return []
+
+    table = parquet.read_row_groups(groups)
+    return table.slice(offset - first_row, limit).to_pylist()
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a frame to JSON-safe records (missing values become None)"""
+    return df.astype(object).where(pd.notna(df), None).to_dict(orient='records')
+
+
+class DatasetStore:
+    """Stores parsed uploads on disk as Parquet, keyed by upload ID"""
+
+    def __init__(self, root: str = None, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.root = root or os.getenv(
+            "UPLOAD_STORE_DIR",
+            os.path.join(tempfile.gettempdir(), "agentsimple_uploads")
+        )
+        self.chunk_rows = chunk_rows
+        os.makedirs(self.root, exist_ok=True)
+
+    # ==================== PATHS ====================
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not _UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise ValueError(f"Invalid upload ID: {upload_id}")
+        return os.path.join(self.root, upload_id)
+
+    def dataset_path(self, upload_id: str) -> str:
+        """Path of the Parquet file holding the parsed dataset"""
+        return os.path.join(self._upload_dir(upload_id), "dataset.parquet")
+
+    def arrow_path(self, upload_id: str) -> str:
+        """Path of the Arrow IPC copy the code sandbox memory-maps"""
+        return os.path.join(self._upload_dir(upload_id), "dataset.arrow")
+
+    def _metadata_path(self, upload_id: str) -> str:
+        return os.path.join(self._upload_dir(upload_id), "meta.json")
+
+    # ==================== INGESTION ====================
+
+    async def ingest_upload(self, file) -> Dict[str, Any]:
+        """Spool an uploaded file to disk in blocks, then parse it off the event loop"""
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        os.makedirs(upload_dir)
+        source_path = os.path.join(upload_dir, "source")
+
+        try:
+            with open(source_path, 'wb') as out:
+                while True:
+                    block = await file.read(SPOOL_BLOCK_SIZE)
+                    if not block:
+                        break
+                    out.write(block)
+
+            return await asyncio.to_thread(self.ingest_file, upload_id, source_path, file.filename)
+        except Exception:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+
+    def ingest_file(self, upload_id: str, source_path: str, filename: str) -> Dict[str, Any]:
+        """Parse a spooled file chunk by chunk into the store.
+
+        Row count and columns are accumulated as chunks stream through, and the
+        preview comes from the first chunk only.
+        """
+        with open(source_path, 'rb') as f:
+            file_format = detect_format(f.read(8))
+
+        read_chunks = _CHUNK_READERS[file_format]
+        os.makedirs(self._upload_dir(upload_id), exist_ok=True)
+        dataset_path = self.dataset_path(upload_id)
+
+        writer = None
+        schema = None
+        columns: List[str] = []
+        preview: List[Dict[str, Any]] = []
+        rows = 0
+
+        try:
+            for chunk in read_chunks(source_path, self.chunk_rows):
+                if writer is None:
+                    columns = [str(c) for c in chunk.columns]
+                    schema = pa.schema([(name, pa.string()) for name in columns])
+                    writer = pq.ParquetWriter(dataset_path, schema)
+                    preview = frame_to_records(chunk.head(PREVIEW_ROWS))
+
+                chunk.columns = columns
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            raise ValueError("Uploaded file contains no data")
+
+        os.remove(source_path)
+
+        metadata = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "format": file_format,
+            "rows": rows,
+            "columns": columns,
+            "preview": preview,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        with open(self._metadata_path(upload_id), 'w') as f:
+            json.dump(metadata, f)
+
+        logger.info("Stored upload %s (%s): %s rows, %s columns", upload_id, filename, rows, len(columns))
+        return metadata
+
+    # ==================== ACCESS ====================
+
+    def get_metadata(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Get stored metadata for an upload, or None if it does not exist"""
+        try:
+            with open(self._metadata_path(upload_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read_frame(self, upload_id: str, columns: List[str] = None) -> pd.DataFrame:
+        """Load a stored dataset (optionally a subset of columns) as a DataFrame"""
+        return pq.read_table(self.dataset_path(upload_id), columns=columns).to_pandas()
+
+    def read_records(self, upload_id: str) -> List[Dict[str, Any]]:
+        """Load a stored dataset as row dicts, the shape the enrichment code works on"""
+        return pq.read_table(self.dataset_path(upload_id)).to_pylist()
+
+    def export_arrow(self, upload_id: str) -> str:
+        """Write the Arrow IPC copy of a dataset once, batch by batch, and return its path"""
+        path = self.arrow_path(upload_id)
+        if os.path.exists(path):
+            return path
+
+        parquet = pq.ParquetFile(self.dataset_path(upload_id))
+        # Write beside the final path so concurrent readers never see a partial file
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with ipc.new_file(temp_path, parquet.schema_arrow) as writer:
+                for batch in parquet.iter_batches(batch_size=self.chunk_rows):
+                    writer.write_batch(batch)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def read_rows(self, upload_id: str, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Read one page of rows, decoding only the row groups that overlap it"""
+        return _read_page(pq.ParquetFile(self.dataset_path(upload_id)), offset, limit)
+
+    # ==================== ENRICHED COPIES ====================
+
+    def enriched_path(self, upload_id: str, job_id: str) -> str:
+        """Path of the enriched rows an enrichment job stores when it completes"""
+        return os.path.join(self._upload_dir(upload_id), f"enriched-{job_id}.parquet")
+
+    def write_enriched(self, upload_id: str, job_id: str, frame: pd.DataFrame) -> str:
+        """Store a job's enriched rows once, so result pages are read instead of recomputed"""
+        path = self.enriched_path(upload_id, job_id)
+        schema = pa.schema([(str(name), pa.string()) for name in frame.columns])
+        table = pa.Table.from_pandas(frame.set_axis(schema.names, axis=1), schema=schema, preserve_index=False)
+        # Write beside the final path so concurrent readers never see a partial file
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            pq.write_table(table, temp_path, row_group_size=self.chunk_rows)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path
+
+    def read_enriched_page(self, upload_id: str, job_id: str, offset: int = 0,
+                           limit: int = 100) -> Optional[Dict[str, Any]]:
+        """One page of a job's enriched rows with their count and columns, or None if none are stored"""
+        path = self.enriched_path(upload_id, job_id)
+        if not os.path.exists(path):
+            return None
+        parquet = pq.ParquetFile(path)
+        return {
+            "total_rows": parquet.metadata.num_rows,
+            "columns": parquet.schema_arrow.names,
+            "rows": _read_page(parquet, offset, limit)
+        }
+
+    def delete(self, upload_id: str) -> bool:
+        """Remove an upload and its parsed dataset"""
+        try:
+            upload_dir = self._upload_dir(upload_id)
+        except ValueError:
+            return False
+        if not os.path.isdir(upload_dir):
+            return False
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return True
+
+# Global dataset store instance
+dataset_store = DatasetStore()
@@ -6,11 +6,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from typing import List, Dict, Optional
 import uuid
-import json
 import logging
+from tracing import traced
+from serialization import dumps, loads
 
 logger = logging.getLogger(__name__)
 
+@traced("db.get_or_create_conversation")
 async def get_or_create_conversation(conversation_id: str, db: AsyncSession) -> Conversation:
     """Get existing conversation or create new one"""
     try:
@@ -29,16 +31,17 @@ async def get_or_create_conversation(conversation_id: str, db: AsyncSession) ->
             db.add(conversation)
             await db.commit()
             await db.refresh(conversation)
-            logger.info(f"Created new conversation: {conversation_id}")
+            logger.info("Created new conversation: %s", conversation_id)
         else:
-            logger.info(f"Retrieved existing conversation: {conversation_id}")
+            logger.debug("Retrieved existing conversation: %s", conversation_id)
 
         return conversation
     except Exception as e:
-        logger.error(f"Error in get_or_create_conversation: {e}")
+        logger.error("Error in get_or_create_conversation: %s", e)
         await db.rollback()
         raise
 
+@traced("db.save_message")
 async def save_message(
     conversation_id: str,
     role: str,
@@ -53,20 +56,21 @@ async def save_message(
             id=str(uuid.uuid4()),
             conversation_id=conversation_id,
             role=role,
-            content=content if isinstance(content, str) else json.dumps(content),
+            content=content if isinstance(content, str) else dumps(content),
             agent_type=agent_type,
             meta_data=meta_data or {}
         )
         db.add(message)
         await db.commit()
         await db.refresh(message)
-        logger.info(f"Saved {role} message to conversation {conversation_id}")
+        logger.debug("Saved %s message to conversation %s", role, conversation_id)
         return message
     except Exception as e:
-        logger.error(f"Error saving message: {e}")
+        logger.error("Error saving message: %s", e)
         await db.rollback()
         raise
 
+@traced("db.get_conversation_history")
 async def get_conversation_history(
     conversation_id: str,
     db: AsyncSession,
@@ -92,10 +96,10 @@ async def get_conversation_history(
                 "created_at": msg.created_at.isoformat() if msg.created_at else None
             })
 
-        logger.info(f"Retrieved {len(history)} messages for conversation {conversation_id}")
+        logger.debug("Retrieved %s messages for conversation %s", len(history), conversation_id)
         return history
     except Exception as e:
-        logger.error(f"Error getting conversation history: {e}")
+        logger.error("Error getting conversation history: %s", e)
         return []
 
 async def format_history_for_llm(history: List[Dict]) -> str:
@@ -110,8 +114,7 @@ async def format_history_for_llm(history: List[Dict]) -> str:
         content = msg["content"]
         if content.startswith('{') or content.startswith('['):
             try:
-                import json
-                parsed = json.loads(content)
+                parsed = loads(content)
                 if isinstance(parsed, dict) and 'content' in parsed:
                     content = str(parsed['content'])
             except:
@@ -124,6 +127,7 @@ async def format_history_for_llm(history: List[Dict]) -> str:
 
     return formatted.strip()
 
+@traced("db.clear_old_conversations")
 async def clear_old_conversations(db: AsyncSession, days_old: int = 30):
     """Clean up old conversations (optional maintenance function)"""
     from datetime import datetime, timedelta
@@ -139,9 +143,9 @@ async def clear_old_conversations(db: AsyncSession, days_old: int = 30):
             await db.delete(conv)
 
         await db.commit()
-        logger.info(f"Deleted {len(old_conversations)} old conversations")
+        logger.info("Deleted %s old conversations", len(old_conversations))
         return len(old_conversations)
     except Exception as e:
-        logger.error(f"Error clearing old conversations: {e}")
+        logger.error("Error clearing old conversations: %s", e)
         await db.rollback()
         return 0
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Per-part enrichment cache with per-field freshness
+Enrichment results are stored per (normalized MPN, manufacturer) together
+with the time each column was fetched. Columns age at different rates:
+lifecycle, RoHS and alternatives are refreshed monthly, price, stock and lead
+time hourly. A re-enrichment looks up only the parts with a missing or stale
+column among the ones requested and reuses the rest, and plan() reports what
+a run would cost without calling Z2Data.
+
+Every column comes from the same search_parts lookup, so a part looked up
+for one stale column gets all of its columns refreshed.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import async_session, PartEnrichment
+
+logger = logging.getLogger(__name__)
+
+STATIC_MAX_AGE = float(os.getenv("ENRICH_STATIC_MAX_AGE", str(30 * 86400)))  # Lifecycle, RoHS, alternatives
+MARKET_MAX_AGE = float(os.getenv("ENRICH_MARKET_MAX_AGE", "3600"))  # Price, stock, lead time
+LOAD_CHUNK = 500  # MPNs per SELECT, below SQLite's bound parameter limit
+
+FIELD_MAX_AGE = {
+    'lifecycle_status': STATIC_MAX_AGE,
+    'rohs_status': STATIC_MAX_AGE,
+    'alternatives': STATIC_MAX_AGE,
+    'market_availability': MARKET_MAX_AGE,
+    'avg_price': MARKET_MAX_AGE,
+    'lead_time': MARKET_MAX_AGE,
+}
+ENRICHMENT_FIELDS = list(FIELD_MAX_AGE)
+
+
+def check_fields(fields: Optional[List[str]] = None) -> List[str]:
+    """The requested enrichment columns, all of them by default"""
+    if not fields:
+        return list(ENRICHMENT_FIELDS)
+    unknown = [field for field in fields if field not in FIELD_MAX_AGE]
+    if unknown:
+        raise ValueError(f"Unknown enrichment fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def select_fields(enrichment: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keep the requested columns of a lookup result; a failed lookup keeps its error"""
+    if 'enrichment_error' in enrichment:
+        return enrichment
+    return {field: enrichment.get(field) for field in fields}
+
+
+def api_calls_for(manufacturer: Optional[str]) -> int:
+    """Z2Data requests per search_parts lookup: validation and details with a manufacturer, one search without"""
+    return 2 if manufacturer else 1
+
+
+class EnrichmentCache:
+    """Stores part enrichment in the database and decides which parts need a lookup"""
+
+    def __init__(self, session_factory=async_session, max_age: Optional[Dict[str, float]] = None):
+        self.session_factory = session_factory
+        self.max_age = {**FIELD_MAX_AGE, **(max_age or {})}
+
+    @staticmethod
+    def _key(mpn: str, manufacturer: Optional[str]) -> Tuple[str, str]:
+        return mpn, manufacturer or ""
+
+    async def load(self, keys: List[Tuple]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Cached records for the keys; an unreachable cache behaves as an empty one"""
+        wanted = {self._key(*key) for key in keys}
+        mpns = sorted({mpn for mpn, _ in wanted})
+        records = {}
+        try:
+            async with self.session_factory() as session:
+                for start in range(0, len(mpns), LOAD_CHUNK):
+                    rows = await session.execute(
+                        select(PartEnrichment).where(PartEnrichment.mpn.in_(mpns[start:start + LOAD_CHUNK]))
+                    )
+                    for row in rows.scalars():
+                        if (row.mpn, row.manufacturer) in wanted:
+                            records[(row.mpn, row.manufacturer)] = {"fields": row.fields or {},
+                                                                    "fetched_at": row.fetched_at or {}}
+        except Exception as e:
+            logger.warning("Enrichment cache unavailable, looking up every part: %s", e)
+            return {}
+        return records
+
+    def stale_fields(self, record: Optional[Dict[str, Any]], fields: List[str], now: datetime) -> List[str]:
+        """Requested columns the record lacks or fetched longer ago than their max age"""
+        if record is None:
+            return list(fields)
+        stale = []
+        for field in fields:
+            fetched = record["fetched_at"].get(field)
+            if (field not in record["fields"] or fetched is None
+                    or now - datetime.fromisoformat(fetched) > timedelta(seconds=self.max_age[field])):
+                stale.append(field)
+        return stale
+
+    async def plan(self, keys: List[Tuple], fields: Optional[List[str]] = None,
+                   now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Split keys into fresh cached enrichment and parts that need a lookup"""
+        fields = check_fields(fields)
+        now = now or datetime.utcnow()
+        records = await self.load(keys)
+        cached, lookups = {}, []
+        stale_counts = {field: 0 for field in fields}  # Parts whose column is missing or stale
+        for key in keys:
+            record = records.get(self._key(*key))
+            stale = self.stale_fields(record, fields, now)
+            if stale:
+                lookups.append(key)
+                for field in stale:
+                    stale_counts[field] += 1
+            else:
+                cached[key] = {field: record["fields"][field] for field in fields}
+        return {
+            "fields": fields,
+            "cached": cached,
+            "lookups": lookups,
+            "stale_fields": stale_counts,
+            "api_calls": sum(api_calls_for(manufacturer) for _, manufacturer in lookups)
+        }
+
+    async def store(self, results: Dict[Tuple, Dict[str, Any]], now: Optional[datetime] = None):
+        """Save lookup results; failed lookups are not cached so the next run retries them"""
+        stamp = (now or datetime.utcnow()).isoformat()
+        fresh = {self._key(*key): enrichment for key, enrichment in results.items()
+                 if 'enrichment_error' not in enrichment}
+        if not fresh:
+            return
+        try:
+            async with self.session_factory() as session:
+                for (mpn, manufacturer), enrichment in fresh.items():
+                    await session.merge(PartEnrichment(
+                        mpn=mpn, manufacturer=manufacturer, fields=enrichment,
+                        fetched_at={field: stamp for field in enrichment}
+                    ))
+                await session.commit()
+        except Exception as e:
+            # Another worker may have cached the same part first; the next run uses whichever landed
+            logger.warning("Failed to cache enrichment for %s parts: %s", len(fresh), e)
+
+
+# Global enrichment cache instance
+enrichment_cache = EnrichmentCache()
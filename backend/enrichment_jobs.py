@@ -0,0 +1,313 @@
+"""
+Background BOM enrichment jobs
+Enrichment of a stored upload runs as a job instead of inside an HTTP
+request. Worker tasks look up the BOM's distinct parts in batches and commit
+each batch to the database as a checkpoint, so a job interrupted by a crash
+or restart resumes with the parts it has not done yet.
+
+A worker claims a job with a lease: the claim and every checkpoint refresh
+heartbeat_at, and a running job whose heartbeat is older than the lease is
+claimed again by whichever process sweeps it first. Jobs therefore survive
+restarts and move between workers sharing the database. Parts with fresh
+data in the enrichment cache are checkpointed without a lookup. A completed
+job stores its enriched rows as Parquet beside the upload, and result pages
+are read from that copy.
+"""
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, or_, and_
+
+from models import async_session, EnrichmentJob, EnrichmentJobPart
+from dataset_store import dataset_store
+from bom_normalizer import prepare_bom
+from agents_simple import agent_orchestrator
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("ENRICH_JOB_WORKERS", "2"))
+BATCH_SIZE = int(os.getenv("ENRICH_JOB_BATCH_SIZE", "25"))  # Concurrent lookups per checkpoint
+LEASE_SECONDS = float(os.getenv("ENRICH_JOB_LEASE_SECONDS", "120"))
+POLL_SECONDS = float(os.getenv("ENRICH_JOB_POLL_SECONDS", "30"))  # How often to look for queued or stale jobs
+
+ACTIVE_STATUSES = ("queued", "running")
+# Enrichment for a key the job has no checkpoint for (e.g. a manufacturer alias learned since it ran)
+MISSING_PART = {'enrichment_error': "Part was not looked up"}
+
+
+class JobStateError(Exception):
+    """The job is not in a state that allows the request"""
+
+
+def _job_to_dict(job: EnrichmentJob) -> Dict[str, Any]:
+    total, completed = job.total_parts, job.completed_parts or 0
+    return {
+        "job_id": job.id,
+        "upload_id": job.upload_id,
+        "status": job.status,
+        "progress": {
+            "completed_parts": completed,
+            "total_parts": total,
+            "percent": round(100.0 * completed / total, 1) if total else (100.0 if job.status == "completed" else 0.0)
+        },
+        "enriched_rows": job.enriched_rows,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class EnrichmentJobManager:
+    """Persists enrichment jobs and runs them on a pool of worker tasks"""
+
+    def __init__(self, agent, session_factory=async_session, datasets=dataset_store, workers: int = JOB_WORKERS,
+                 batch_size: int = BATCH_SIZE, lease_seconds: float = LEASE_SECONDS, poll_seconds: float = POLL_SECONDS):
+        self.agent = agent  # DataAgent: enrichment_cache, _lookup_part and _apply_enrichment
+        self.session_factory = session_factory
+        self.datasets = datasets
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: set = set()  # Job IDs waiting in the local queue
+        self._tasks: List[asyncio.Task] = []
+
+    # ==================== LIFECYCLE ====================
+
+    async def start(self):
+        """Start the workers and the sweeper, which immediately picks up jobs left by a previous run"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        """Stop the workers and hand this process's running jobs back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        async with self.session_factory() as session:
+            await session.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.worker == self.worker_id, EnrichmentJob.status == "running")
+                .values(status="queued", worker=None)
+            )
+            await session.commit()
+
+    # ==================== API ====================
+
+    async def submit(self, upload_id: str) -> Dict[str, Any]:
+        """Create a queued job for a stored upload"""
+        if not self.datasets.get_metadata(upload_id):
+            raise KeyError(upload_id)
+        async with self.session_factory() as session:
+            job = EnrichmentJob(id=str(uuid.uuid4()), upload_id=upload_id, status="queued", completed_parts=0)
+            session.add(job)
+            await session.commit()
+            logger.info("Queued enrichment job %s for upload %s", job.id, upload_id)
+            self._enqueue(job.id)
+            return _job_to_dict(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as session:
+            job = await session.get(EnrichmentJob, job_id)
+            return _job_to_dict(job) if job else None
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; the worker stops at its next checkpoint"""
+        async with self.session_factory() as session:
+            job = await session.get(EnrichmentJob, job_id)
+            if job is None:
+                return None
+            if job.status not in ACTIVE_STATUSES:
+                raise JobStateError(f"Job is already {job.status}")
+            await session.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.id == job_id, EnrichmentJob.status.in_(ACTIVE_STATUSES))
+                .values(status="cancelled", finished_at=datetime.utcnow())
+            )
+            await session.commit()
+            await session.refresh(job)
+            logger.info("Cancelled enrichment job %s", job_id)
+            return _job_to_dict(job)
+
+    async def result(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """A page of the enriched rows of a completed job"""
+        async with self.session_factory() as session:
+            job = await session.get(EnrichmentJob, job_id)
+            if job is None:
+                return None
+            if job.status != "completed":
+                raise JobStateError(f"Job is {job.status}")
+
+        page = await asyncio.to_thread(self.datasets.read_enriched_page, job.upload_id, job_id, offset, limit)
+        if page is None:
+            # Completed before enriched rows were stored with the job
+            async with self.session_factory() as session:
+                parts = await self._checkpointed_parts(session, job_id)
+            frame, prepared = await asyncio.to_thread(self._prepare, job.upload_id)
+            await asyncio.to_thread(self._store_result, job.upload_id, job_id, frame, prepared, parts)
+            page = await asyncio.to_thread(self.datasets.read_enriched_page, job.upload_id, job_id, offset, limit)
+
+        return {
+            "job_id": job_id,
+            "title": f"Enriched Data ({job.enriched_rows}/{page['total_rows']} parts enriched)",
+            "offset": offset,
+            "limit": limit,
+            **page
+        }
+
+    # ==================== WORKERS ====================
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await self._sweep()
+            except Exception as e:
+                logger.warning("Enrichment job sweep failed: %s", e)
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _sweep(self):
+        """Queue jobs no live worker holds: never started, released, or with an expired lease"""
+        stale = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        async with self.session_factory() as session:
+            rows = await session.execute(
+                select(EnrichmentJob.id)
+                .where(or_(EnrichmentJob.status == "queued",
+                           and_(EnrichmentJob.status == "running", EnrichmentJob.heartbeat_at < stale)))
+                .order_by(EnrichmentJob.created_at)
+            )
+            for job_id in rows.scalars():
+                self._enqueue(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                if await self._claim(job_id):
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Enrichment job %s failed: %s", job_id, e, exc_info=True)
+                await self._finish(job_id, "failed", error=str(e))
+
+    async def _claim(self, job_id: str) -> bool:
+        """Atomically take a queued job, or a running one whose lease expired"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lease_seconds)
+        async with self.session_factory() as session:
+            claimed = await session.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.id == job_id,
+                       or_(EnrichmentJob.status == "queued",
+                           and_(EnrichmentJob.status == "running", EnrichmentJob.heartbeat_at < stale)))
+                .values(status="running", worker=self.worker_id, heartbeat_at=now,
+                        started_at=func.coalesce(EnrichmentJob.started_at, now))
+            )
+            await session.commit()
+            return claimed.rowcount == 1
+
+    def _prepare(self, upload_id: str):
+        frame = self.datasets.read_frame(upload_id)
+        return frame, prepare_bom(frame)
+
+    def _store_result(self, upload_id: str, job_id: str, frame, prepared: Dict[str, Any],
+                      parts: Dict[Tuple, Dict[str, Any]]) -> int:
+        """Apply the checkpointed parts to the upload's rows and store them; returns the enriched row count"""
+        key_enrichment = [parts.get(key, MISSING_PART) for key in prepared["unique_keys"]]
+        enriched_rows = self.agent._apply_enrichment(frame, prepared["row_codes"], key_enrichment)
+        self.datasets.write_enriched(upload_id, job_id, frame)
+        return enriched_rows
+
+    async def _checkpointed_parts(self, session, job_id: str) -> Dict[Tuple, Dict[str, Any]]:
+        rows = await session.execute(
+            select(EnrichmentJobPart.mpn, EnrichmentJobPart.manufacturer, EnrichmentJobPart.data)
+            .where(EnrichmentJobPart.job_id == job_id)
+        )
+        return {(mpn, manufacturer): data for mpn, manufacturer, data in rows}
+
+    def _held(self):
+        """Conditions under which this worker still owns the job"""
+        return (EnrichmentJob.worker == self.worker_id, EnrichmentJob.status == "running")
+
+    async def _run(self, job_id: str):
+        async with self.session_factory() as session:
+            job = await session.get(EnrichmentJob, job_id)
+            upload_id = job.upload_id
+            done = set(await self._checkpointed_parts(session, job_id))
+
+        frame, prepared = await asyncio.to_thread(self._prepare, upload_id)
+        unique_keys = prepared["unique_keys"]
+        pending = [key for key in unique_keys if key not in done]
+        if done:
+            logger.info("Resuming enrichment job %s: %s of %s parts already done", job_id, len(done), len(unique_keys))
+
+        async with self.session_factory() as session:
+            await session.execute(
+                update(EnrichmentJob).where(EnrichmentJob.id == job_id, *self._held())
+                .values(total_parts=len(unique_keys), completed_parts=len(unique_keys) - len(pending))
+            )
+            await session.commit()
+
+        plan = await self.agent.enrichment_cache.plan(pending)
+        if plan["cached"] and not await self._checkpoint(job_id, plan["cached"]):
+            return
+
+        lookups = plan["lookups"]
+        for start in range(0, len(lookups), self.batch_size):
+            batch = lookups[start:start + self.batch_size]
+            results = await asyncio.gather(*(self.agent._lookup_part(mpn, manufacturer) for mpn, manufacturer in batch))
+            looked_up = dict(zip(batch, results))
+            if not await self._checkpoint(job_id, looked_up):
+                return
+            await self.agent.enrichment_cache.store(looked_up)
+
+        async with self.session_factory() as session:
+            parts = await self._checkpointed_parts(session, job_id)
+        enriched_rows = await asyncio.to_thread(self._store_result, upload_id, job_id, frame, prepared, parts)
+        await self._finish(job_id, "completed", enriched_rows=enriched_rows)
+        logger.info("Completed enrichment job %s: %s parts, %s rows enriched", job_id, len(unique_keys), enriched_rows)
+
+    async def _checkpoint(self, job_id: str, parts: Dict[Tuple, Dict[str, Any]]) -> bool:
+        """Record finished parts; only lands if the job is still ours, a cancel or a lost lease discards them"""
+        async with self.session_factory() as session:
+            checkpoint = await session.execute(
+                update(EnrichmentJob).where(EnrichmentJob.id == job_id, *self._held())
+                .values(completed_parts=EnrichmentJob.completed_parts + len(parts), heartbeat_at=datetime.utcnow())
+            )
+            if checkpoint.rowcount != 1:
+                await session.rollback()
+                logger.info("Enrichment job %s stopped: cancelled or taken over", job_id)
+                return False
+            session.add_all(EnrichmentJobPart(job_id=job_id, mpn=mpn, manufacturer=manufacturer, data=data)
+                            for (mpn, manufacturer), data in parts.items())
+            await session.commit()
+            return True
+
+    async def _finish(self, job_id: str, status: str, **values):
+        async with self.session_factory() as session:
+            await session.execute(
+                update(EnrichmentJob).where(EnrichmentJob.id == job_id, *self._held())
+                .values(status=status, finished_at=datetime.utcnow(), **values)
+            )
+            await session.commit()
+
+
+# Global enrichment job manager instance
+enrichment_jobs = EnrichmentJobManager(agent_orchestrator.data_agent)
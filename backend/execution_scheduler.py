@@ -0,0 +1,212 @@
+"""
+Code Execution Scheduler
+Caps how many sandbox executions run at once and queues the rest fairly:
+waiting conversations take turns, so one conversation's burst cannot starve
+the others. When the queue is full, new work is rejected with a retry hint.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Awaitable, Optional
+from tracing import tracer
+from metrics import registry, Gauge
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT = int(os.getenv("SANDBOX_MAX_CONCURRENT", str(os.cpu_count() or 2)))
+DEFAULT_MAX_QUEUE = int(os.getenv("SANDBOX_MAX_QUEUE", str(DEFAULT_MAX_CONCURRENT * 4)))
+DEFAULT_MAX_QUEUED_PER_CONVERSATION = int(os.getenv("SANDBOX_MAX_QUEUED_PER_CONVERSATION", "4"))
+TIMING_SAMPLES = 1000  # Recent wait and run times kept for percentiles and retry hints
+
+
+class ExecutionQueueFull(Exception):
+    """Raised when an execution cannot be queued; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """One queued execution waiting for a slot"""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.moved = asyncio.Event()
+
+
+class ExecutionScheduler:
+    """Global concurrency cap with a bounded, per-conversation round-robin queue"""
+
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_queued_per_conversation: int = DEFAULT_MAX_QUEUED_PER_CONVERSATION):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queued_per_conversation = max_queued_per_conversation
+        self.running = 0
+        self.queued = 0
+        # Conversations in turn order, each with its own FIFO of waiters
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._wait_times = deque(maxlen=TIMING_SAMPLES)
+        self._run_times = deque(maxlen=TIMING_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+
+    async def run(self, conversation_id: str, job: Callable[[], Awaitable[Any]],
+                  on_queued: Optional[Callable[[int], Awaitable[None]]] = None) -> Any:
+        """
+        Run job() once a slot is free.
+        on_queued(position) is awaited whenever the job's 1-based queue position changes.
+        Raises ExecutionQueueFull when the job cannot be queued.
+        """
+        with tracer.span("scheduler.wait"):
+            await self._acquire(conversation_id, on_queued)
+        started = time.monotonic()
+        try:
+            return await job()
+        finally:
+            self._run_times.append(time.monotonic() - started)
+            self.completed += 1
+            self._release()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        average = sum(self._run_times) / len(self._run_times) if self._run_times else 1.0
+        return max(1, math.ceil(average * (self.queued + self.running) / self.max_concurrent))
+
+    def position(self, waiter: _Waiter) -> int:
+        """1-based position of a waiter in round-robin service order"""
+        index = self._queues[waiter.conversation_id].index(waiter)
+        position = 1
+        ahead_in_round = True
+        for conversation_id, queue in self._queues.items():
+            # Every conversation is served `index` times before our round...
+            position += min(len(queue), index)
+            if conversation_id == waiter.conversation_id:
+                ahead_in_round = False
+            elif ahead_in_round and len(queue) > index:
+                # ...and those earlier in turn order once more within it
+                position += 1
+        return position
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and wait-time metrics"""
+        waits = sorted(self._wait_times)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else 0.0
+
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "queued_conversations": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "wait_time_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 2) if waits else 0.0
+            }
+        }
+
+    async def _acquire(self, conversation_id: str, on_queued):
+        if self.running < self.max_concurrent and not self.queued:
+            self.running += 1
+            self.admitted += 1
+            self._wait_times.append(0.0)
+            return
+
+        waiting = len(self._queues.get(conversation_id, ()))
+        if self.queued >= self.max_queue or waiting >= self.max_queued_per_conversation:
+            self.rejected += 1
+            retry_after = self.retry_after()
+            logger.warning("Code execution queue full for conversation %s (%s queued, %s from this conversation)",
+                           conversation_id, self.queued, waiting)
+            raise ExecutionQueueFull("Code execution queue is full", retry_after)
+
+        waiter = _Waiter(conversation_id)
+        self._queues.setdefault(conversation_id, deque()).append(waiter)
+        self.queued += 1
+        # A new conversation can take a turn ahead of waiters already queued
+        self._notify_moved()
+        enqueued = time.monotonic()
+        try:
+            await self._wait_turn(waiter, on_queued)
+        except asyncio.CancelledError:
+            if waiter.granted.done():
+                # The slot was handed over just before the cancellation
+                self._release()
+            else:
+                self._remove(waiter)
+            raise
+        self.admitted += 1
+        self._wait_times.append(time.monotonic() - enqueued)
+
+    async def _wait_turn(self, waiter: _Waiter, on_queued):
+        """Wait for a slot, reporting each new queue position"""
+        reported = None
+        while not waiter.granted.done():
+            waiter.moved.clear()
+            position = self.position(waiter)
+            if on_queued and position != reported:
+                reported = position
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    logger.debug("Queue position update failed: %s", e)
+                if waiter.granted.done():
+                    break
+            moved = asyncio.ensure_future(waiter.moved.wait())
+            try:
+                await asyncio.wait([waiter.granted, moved], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                moved.cancel()
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiters, one conversation per turn"""
+        if not self.queued:
+            return
+        while self.running < self.max_concurrent and self.queued:
+            conversation_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(conversation_id)
+            else:
+                del self._queues[conversation_id]
+            self.queued -= 1
+            self.running += 1
+            waiter.granted.set_result(None)
+        self._notify_moved()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues[waiter.conversation_id]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.conversation_id]
+        self.queued -= 1
+        self._notify_moved()
+
+    def _notify_moved(self):
+        for queue in self._queues.values():
+            for waiter in queue:
+                waiter.moved.set()
+
+
+# Global execution scheduler instance
+execution_scheduler = ExecutionScheduler()
+
+registry.register(Gauge(
+    "sandbox_executions", "Sandbox executions running or waiting for a slot", ["state"],
+    callback=lambda: {"running": execution_scheduler.running, "queued": execution_scheduler.queued}))
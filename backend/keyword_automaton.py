@@ -0,0 +1,101 @@
+"""
+Aho-Corasick keyword automaton
+Scans a text against any number of keywords in a single pass, so lookups cost
+O(len(text) + matches) instead of one substring search per keyword.
+"""
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """Multi-keyword matcher built once and reused for every scan"""
+
+    def __init__(self, word_boundaries: bool = False):
+        # With word_boundaries, a match must not be glued to letters or digits
+        # ("ti" matches "LM317 TI" but not "litigation")
+        self.word_boundaries = word_boundaries
+        self._goto: List[Dict[str, int]] = [{}]
+        self._keywords: List[List[Tuple[str, Any]]] = [[]]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[str, Any]]] = [[]]
+        self._built = True
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, keyword: str, value: Any = None):
+        """Register a keyword; value is returned with every match of it"""
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._keywords.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._keywords[node].append((keyword, value))
+        self._count += 1
+        self._built = False
+
+    def build(self):
+        """Compute failure links; called lazily by scan after keywords change"""
+        size = len(self._goto)
+        self._fail = [0] * size
+        self._outputs = [list(entries) for entries in self._keywords]
+
+        queue = deque()
+        for child in self._goto[0].values():
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child].extend(self._outputs[self._fail[child]])
+
+        self._built = True
+
+    def scan(self, text: str) -> Iterator[Tuple[int, int, str, Any]]:
+        """Yield (start, end, keyword, value) for every match, overlapping ones included"""
+        if not self._built:
+            self.build()
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        boundaries = self.word_boundaries
+        length = len(text)
+        node = 0
+        for idx, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not outputs[node]:
+                continue
+            end = idx + 1
+            for keyword, value in outputs[node]:
+                start = end - len(keyword)
+                if boundaries and (
+                    (start > 0 and text[start - 1].isalnum()) or
+                    (end < length and text[end].isalnum())
+                ):
+                    continue
+                yield start, end, keyword, value
+
+    def longest_matches(self, text: str) -> List[Tuple[int, int, str, Any]]:
+        """Leftmost-longest, non-overlapping matches in text order"""
+        matches = sorted(self.scan(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        selected = []
+        last_end = -1
+        for match in matches:
+            if match[0] >= last_end:
+                selected.append(match)
+                last_end = match[1]
+        return selected
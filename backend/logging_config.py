@@ -0,0 +1,132 @@
+"""
+Structured, non-blocking logging
+Log calls on the request path only merge their arguments and put the record
+on an in-memory queue; a QueueListener thread renders JSON (or plain text)
+and writes to stderr. Levels are set per module, and DEBUG payload dumps
+marked with extra=PAYLOAD are sampled so turning DEBUG on under load does not
+flood the output.
+
+LOG_LEVEL sets the root level, LOG_LEVELS overrides it per logger
+("agents_simple=DEBUG,httpx=WARNING"), LOG_FORMAT is json or text, and
+LOG_PAYLOAD_SAMPLE_RATE is the fraction of payload records kept.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import itertools
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional
+
+from tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+
+# Libraries that log every request at INFO
+DEFAULT_LEVELS = {"httpx": "WARNING", "httpcore": "WARNING", "sqlalchemy.engine": "WARNING"}
+
+# Mark a debug record as a payload dump: logger.debug("...%s", data, extra=PAYLOAD)
+PAYLOAD = {"payload": True}
+
+# LogRecord attributes that are not caller-supplied extras
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Per-logger levels from "name=LEVEL,name=LEVEL"; malformed entries are ignored"""
+    levels = {}
+    for entry in spec.split(","):
+        name, sep, level = entry.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class PayloadSampler(logging.Filter):
+    """Keep every Nth payload record; all other records pass"""
+
+    def __init__(self, rate: float = PAYLOAD_SAMPLE_RATE):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._seen = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "payload", False):
+            return True
+        return bool(self.every) and next(self._seen) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, since callers may mutate them after the call
+        # returns, and capture the trace while still in the caller's context
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        span = current_span()
+        record.trace_id = span.trace_id if span else None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, trace and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != "payload" and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, fmt: str = LOG_FORMAT,
+                      sample_rate: float = PAYLOAD_SAMPLE_RATE, stream=None) -> QueueListener:
+    """Route the root logger through a queue; calling it again replaces the previous setup"""
+    global _listener
+    if _listener:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else
+                        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(PayloadSampler(sample_rate))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, name_level in {**DEFAULT_LEVELS, **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(name_level)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
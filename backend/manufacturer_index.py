@@ -0,0 +1,131 @@
+"""
+Manufacturer alias index shared by query extraction, routing, BOM
+normalization and Z2Data validation
+Aliases are loaded from a data file and compiled into one keyword automaton,
+so a query or BOM cell is scanned for every known manufacturer in one pass.
+"""
+import os
+import re
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+from keyword_automaton import KeywordAutomaton
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALIASES_PATH = os.path.join(os.path.dirname(__file__), "data", "manufacturers.json")
+
+# Legal-entity words dropped from the end of a name before exact lookup
+_CORPORATE_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited',
+    'llc', 'gmbh', 'ag', 'nv', 'bv', 'sa', 'plc', 'technology', 'technologies',
+}
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase and turn punctuation into single spaces ("Burr-Brown" -> "burr brown")"""
+    return ' '.join(re.sub(r'[^0-9a-zà-ÿ&]+', ' ', name.lower()).split())
+
+
+def _strip_corporate_suffixes(key: str) -> str:
+    words = key.split()
+    while len(words) > 1 and words[-1] in _CORPORATE_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+class ManufacturerIndex:
+    """Maps manufacturer names and abbreviations to canonical names"""
+
+    def __init__(self, path: str = None):
+        self._canonical: Dict[str, str] = {}  # normalized alias -> canonical name
+        self._automaton = KeywordAutomaton(word_boundaries=True)
+        if path:
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def load(self, path: str):
+        """Load aliases from a JSON data file.
+
+        Each entry has a canonical "name", "aliases" used for both lookup and
+        free-text scanning, and optional "lookup_only" aliases (like "TE")
+        that are too ambiguous to scan for inside sentences.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        for entry in data.get("manufacturers", []):
+            name = entry["name"]
+            lookup_only = set(entry.get("lookup_only", []))
+            if name not in lookup_only:
+                self.add(name, name)
+            for alias in entry.get("aliases", []):
+                self.add(alias, name)
+            for alias in lookup_only:
+                self.add(alias, name, scan=False)
+
+        logger.info("Loaded %s manufacturer aliases from %s", len(self._canonical), path)
+
+    def add(self, alias: str, canonical: str, scan: bool = True):
+        """Register an alias for a canonical manufacturer name"""
+        key = normalize_name(alias)
+        if not key or key in self._canonical:
+            return
+        self._canonical[key] = canonical
+        if scan:
+            self._automaton.add(key, canonical)
+
+        # "Diodes Incorporated" also resolves a bare "Diodes" cell, but only by lookup
+        stripped = _strip_corporate_suffixes(key)
+        if stripped != key and stripped not in self._canonical:
+            self._canonical[stripped] = canonical
+
+    def lookup(self, name: Optional[str]) -> Optional[str]:
+        """Resolve a whole name (e.g. a BOM cell) to its canonical form, or None"""
+        if not name:
+            return None
+        key = normalize_name(name)
+        canonical = self._canonical.get(key)
+        if canonical is None:
+            canonical = self._canonical.get(_strip_corporate_suffixes(key))
+        return canonical
+
+    def scan(self, text: str) -> List[Dict[str, Any]]:
+        """Find every known manufacturer mentioned in a free-text query"""
+        # Same-length normalization keeps match offsets aligned with the input
+        normalized = re.sub(r'[^0-9a-zà-ÿ&]', ' ', text.lower())
+        return [
+            {"manufacturer": canonical, "alias": text[start:end], "start": start, "end": end}
+            for start, end, _, canonical in self._automaton.longest_matches(normalized)
+        ]
+
+    def find(self, text: str) -> Optional[str]:
+        """Canonical name of the first manufacturer mentioned in text, or None"""
+        matches = self.scan(text)
+        return matches[0]["manufacturer"] if matches else None
+
+    def learn(self, name: str, validated_name: Optional[str]) -> Optional[str]:
+        """Feed a Z2Data validation result back into the index.
+
+        The validated name is mapped onto an existing canonical entry when one
+        matches, otherwise it becomes a new canonical name. Either way the
+        spelling the user typed resolves locally from now on, by lookup only:
+        it is free text ("the", "inc") and must not start matching inside
+        every query that happens to contain it.
+        """
+        if not validated_name:
+            return None
+        canonical = self.lookup(validated_name)
+        if canonical is None:
+            canonical = validated_name
+            self.add(validated_name, canonical)
+        if name and self.lookup(name) is None:
+            self.add(name, canonical, scan=False)
+            logger.info("Learned manufacturer alias '%s' -> '%s'", name, canonical)
+        return canonical
+
+# Global index loaded from the bundled data file (override with MANUFACTURER_ALIASES_PATH)
+manufacturer_index = ManufacturerIndex(os.getenv("MANUFACTURER_ALIASES_PATH", DEFAULT_ALIASES_PATH))
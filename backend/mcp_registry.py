@@ -3,18 +3,30 @@ Simplified MCP Registry for Z2Data API Tool Management
 Provides intelligent routing to appropriate Z2Data APIs based on query analysis
 """
 from typing import Dict, List, Any, Optional
+import json
 import logging
 import os
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from keyword_automaton import KeywordAutomaton
+from manufacturer_index import manufacturer_index
+from mpn_recognizer import extract_mpn
+from tracing import traced
+from metrics import llm_latency, model_name
+from logging_config import PAYLOAD
 
 logger = logging.getLogger(__name__)
 
+# Words that make a manufacturer mention a company-level query (litigation, details, sites)
+COMPANY_QUERY_KEYWORDS = ['litigation', 'lawsuit', 'legal', 'company', 'supply chain', 'revenue', 'employees']
+
 class MCPRegistry:
     """Manages MCP tool definitions and routing logic"""
 
     def __init__(self):
         self.tools = self._initialize_tools()
+        self._tools_by_name = {tool['name']: tool for tool in self.tools}
+        self._build_keyword_index()
         # Use GPT-5 nano for fast extraction
         if os.getenv("OPENAI_API_KEY"):
             self.llm = ChatOpenAI(model="gpt-5-nano", temperature=0)
@@ -45,8 +57,10 @@ Return ONLY the JSON object, no explanation."""),
             {
                 'name': 'Part_Details',
                 'description': 'Get detailed part information when both part number and manufacturer are provided',
-                'keywords': ['part details', 'specifications', 'datasheet', 'parameters', 'features'],
+                'keywords': ['part details', 'details', 'specifications', 'datasheet', 'parameters', 'features'],
                 'requires': ['part_number', 'manufacturer'],
+                # If we have both part and manufacturer, prefer Part_Details
+                'param_boosts': [{'present': ['part_number', 'manufacturer'], 'score': 3.0}],
                 'api_method': 'get_part_details'
             },
             {
@@ -54,6 +68,10 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Search for parts when only part number is provided',
                 'keywords': ['search', 'find', 'lookup', 'part number'],
                 'requires': ['part_number'],
+                # Generic verbs; never a step of its own in a multi-tool plan
+                'compound': False,
+                # If only part number, prefer Part_Search
+                'param_boosts': [{'present': ['part_number'], 'absent': ['manufacturer'], 'score': 2.0}],
                 'api_method': 'search_parts'
             },
             {
@@ -69,6 +87,11 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Find alternative or replacement parts',
                 'keywords': ['cross reference', 'alternative', 'replacement', 'substitute', 'equivalent', 'crosses'],
                 'requires': ['part_number', 'manufacturer'],
+                'boosts': [
+                    {'all': ['cross reference'], 'score': 15.0},
+                    {'all': ['alternative'], 'score': 10.0},
+                    {'all': ['replacement'], 'score': 10.0}
+                ],
                 'api_method': 'get_cross_references'
             },
             {
@@ -76,6 +99,7 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Get litigation history and legal cases for a company',
                 'keywords': ['litigation', 'lawsuit', 'legal', 'court', 'case', 'litigations'],
                 'requires': ['company'],
+                'boosts': [{'all': ['litigation'], 'score': 10.0}],
                 'api_method': 'get_company_litigations'
             },
             {
@@ -83,6 +107,7 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Get company information, revenue, employees, and business details',
                 'keywords': ['company details', 'company info', 'business', 'revenue', 'employees'],
                 'requires': ['company'],
+                'boosts': [{'all': ['company', 'details'], 'score': 8.0}],
                 'api_method': 'get_company_details'
             },
             {
@@ -90,6 +115,7 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Get supply chain and factory locations for a company',
                 'keywords': ['supply chain', 'factory', 'location', 'manufacturing', 'facility'],
                 'requires': ['company'],
+                'boosts': [{'all': ['supply chain', 'location'], 'score': 8.0}],
                 'api_method': 'get_supply_chain_locations'
             },
             {
@@ -98,6 +124,8 @@ Return ONLY the JSON object, no explanation."""),
                 'keywords': ['supply chain event', 'disruption', 'shortage', 'supply news'],
                 'requires': [],
                 'optional': ['date_from', 'date_to'],
+                # A query naming locations is about Supply_Chain_Locations even if it mentions events
+                'boosts': [{'all': ['supply chain', 'event'], 'none': ['location'], 'score': 8.0}],
                 'api_method': 'get_supply_chain_events'
             },
             {
@@ -105,7 +133,9 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Get DigiKey specific stock and pricing information',
                 'keywords': ['digikey', 'digi-key', 'digikey stock', 'digikey price'],
                 'requires': ['part_number'],
+                'supersedes': ['Market_Availability'],
                 'optional': ['manufacturer'],
+                'boosts': [{'all': ['digikey'], 'score': 10.0}],
                 'api_method': 'get_digikey_stock'
             },
             {
@@ -113,176 +143,175 @@ Return ONLY the JSON object, no explanation."""),
                 'description': 'Get compliance information (RoHS, REACH, environmental)',
                 'keywords': ['rohs', 'reach', 'compliance', 'environmental', 'restriction', 'hazardous'],
                 'requires': ['part_number'],
+                # Compliance is a section of the part details response
+                'superseded_by': ['Part_Details'],
                 'optional': ['manufacturer'],
+                'boosts': [{'any': ['rohs', 'reach', 'compliance'], 'score': 8.0}],
                 'api_method': 'get_compliance_data'
             }
         ]
 
-    def analyze_query(self, query: str) -> Dict[str, Any]:
-        """Analyze query to determine the best tool and extract parameters using GPT-5 nano"""
-        query_lower = query.lower()
+    def _build_keyword_index(self):
+        """Compile every tool keyword and boost term into one automaton.
 
-        # Extract parameters using GPT-5 nano if available
-        parameters = self._extract_parameters(query)
+        Matching is plain substring matching on the lowercased query (the same
+        semantics as `keyword in query_lower`), so "litigations" still hits
+        "litigation".
+        """
+        self._automaton = KeywordAutomaton()
+        terms = set()
+        for tool in self.tools:
+            terms.update(tool['keywords'])
+            for boost in tool.get('boosts', []):
+                terms.update(boost.get('all', []))
+                terms.update(boost.get('any', []))
+                terms.update(boost.get('none', []))
+        for term in terms:
+            self._automaton.add(term, term)
+        self._automaton.build()
+
+    def _keyword_scores(self, query_lower: str) -> List[float]:
+        """Score every tool on keywords and boost rules from one pass over the query"""
+        matched = {term for _, _, term, _ in self._automaton.scan(query_lower)}
+
+        scores = []
+        for tool in self.tools:
+            score = 2.0 * sum(1 for keyword in tool['keywords'] if keyword in matched)
+            for boost in tool.get('boosts', []):
+                if all(term in matched for term in boost.get('all', [])) and (
+                    'any' not in boost or any(term in matched for term in boost['any'])
+                ) and not any(term in matched for term in boost.get('none', [])):
+                    score += boost['score']
+            scores.append(score)
+        return scores
+
+    async def analyze_query(self, query: str) -> Dict[str, Any]:
+        """Analyze query to determine the best tool and extract parameters.
+
+        Tools are ranked on keywords first. GPT-5 nano extraction only runs when
+        the top-ranked tool needs a parameter the cheap extractor did not find.
+        """
+        keyword_scores = self._keyword_scores(query.lower())
+        parameters = self._simple_extraction_fallback(query)
+
+        # The tool the query talks about, regardless of whether we have its parameters yet
+        top = max(range(len(self.tools)), key=lambda i: keyword_scores[i])
+        if keyword_scores[top] > 0 and self._missing_parameters(self.tools[top], parameters):
+            parameters = await self._llm_extraction(query, parameters)
+
+        best_tool, best_score = self._select_tool(keyword_scores, parameters)
+        plan = self._plan_tools(keyword_scores, parameters)
+
+        logger.debug("Query analysis: '%s' -> Tool: %s, Score: %s, Plan: %s", query,
+                     best_tool['name'] if best_tool else None, best_score, [tool['name'] for tool in plan],
+                     extra=PAYLOAD)
 
-        # Find the best matching tool
+        return {
+            'tool': best_tool,
+            'parameters': parameters,
+            'confidence': best_score,
+            'plan': plan
+        }
+
+    def _plan_tools(self, keyword_scores: List[float], params: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+        """Every tool a compound query asks for ("details, pricing and crosses for LM317 TI").
+
+        A tool joins the plan when one of its own keywords matched and its
+        required parameters are available. Tools another planned tool already
+        covers are dropped. Ordered by keyword score.
+        """
+        plan = [
+            (score, tool) for tool, score in zip(self.tools, keyword_scores)
+            if score > 0 and tool.get('compound', True) and not self._missing_parameters(tool, params)
+        ]
+        names = {tool['name'] for _, tool in plan}
+        covered = set()
+        for _, tool in plan:
+            covered.update(tool.get('supersedes', []))
+        plan = [
+            (score, tool) for score, tool in plan
+            if tool['name'] not in covered and not names.intersection(tool.get('superseded_by', []))
+        ]
+        plan.sort(key=lambda entry: -entry[0])
+        return [tool for _, tool in plan]
+
+    def _select_tool(self, keyword_scores: List[float], params: Dict[str, Optional[str]]):
+        """Pick the highest scoring tool whose required parameters are available"""
         best_tool = None
         best_score = 0
 
-        for tool in self.tools:
-            score = self._score_tool(tool, query_lower, parameters)
+        for tool, keyword_score in zip(self.tools, keyword_scores):
+            if self._missing_parameters(tool, params):
+                continue  # Can't use this tool without required params
+            score = keyword_score
+            for boost in tool.get('param_boosts', []):
+                if all(params.get(p) for p in boost.get('present', [])) and \
+                        not any(params.get(p) for p in boost.get('absent', [])):
+                    score += boost['score']
             if score > best_score:
                 best_score = score
                 best_tool = tool
 
-        logger.info(f"Query analysis: '{query}' -> Tool: {best_tool['name'] if best_tool else 'None'}, Score: {best_score}")
-
-        return {
-            'tool': best_tool,
-            'parameters': parameters,
-            'confidence': best_score
-        }
+        return best_tool, best_score
 
-    def _extract_parameters(self, query: str) -> Dict[str, Optional[str]]:
-        """Extract parameters from query using GPT-5 nano"""
-        parameters = {
-            'part_number': None,
-            'manufacturer': None,
-            'company': None
-        }
+    def _missing_parameters(self, tool: Dict[str, Any], params: Dict[str, Optional[str]]) -> List[str]:
+        """Required parameters of a tool that are not in params.
 
-        if self.llm:
-            try:
-                # Use GPT-5 nano for extraction
-                response = self.llm.invoke(self.extraction_prompt.format_messages(query=query))
-                import json
-                extracted = json.loads(response.content)
-
-                # Update parameters with extracted values
-                parameters['part_number'] = extracted.get('part_number')
-                parameters['manufacturer'] = extracted.get('manufacturer')
-                parameters['company'] = extracted.get('company')
-
-                logger.info(f"GPT-5 nano extraction: {parameters}")
-            except Exception as e:
-                logger.warning(f"GPT-5 nano extraction failed, using fallback: {e}")
-                # Fallback to simple extraction if LLM fails
-                parameters = self._simple_extraction_fallback(query)
-        else:
-            # No LLM available, use simple fallback
-            parameters = self._simple_extraction_fallback(query)
+        A tool's 'requires' list is the only source: a manufacturer is required
+        by the tools that list it (Part_Details and Cross_References) and is
+        optional everywhere else.
+        """
+        missing = []
+        for req in tool.get('requires', []):
+            # A company can also come from the manufacturer field
+            if req == 'company' and not (params['company'] or params.get('manufacturer')):
+                missing.append(req)
+            elif req in ('part_number', 'manufacturer') and not params[req]:
+                missing.append(req)
+        return missing
+
+    @traced("mcp.llm_extraction")
+    async def _llm_extraction(self, query: str, parameters: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """Fill parameters the cheap extractor missed using GPT-5 nano"""
+        if not self.llm:
+            return parameters
+
+        try:
+            # Use GPT-5 nano for extraction
+            with llm_latency.time(model=model_name(self.llm)):
+                response = await self.llm.ainvoke(self.extraction_prompt.format_messages(query=query))
+            extracted = json.loads(response.content)
+
+            # Only fill values the cheap extractor could not find
+            parameters = dict(parameters)
+            for key in ('part_number', 'manufacturer', 'company'):
+                parameters[key] = parameters[key] or extracted.get(key)
+
+            logger.debug("GPT-5 nano extraction: %s", parameters, extra=PAYLOAD)
+        except Exception as e:
+            logger.warning("GPT-5 nano extraction failed, using fallback: %s", e)
 
         return parameters
 
     def _simple_extraction_fallback(self, query: str) -> Dict[str, Optional[str]]:
-        """Simple fallback extraction when LLM is not available"""
-        import re
+        """Cheap extraction: shared MPN recognizer plus the shared manufacturer index"""
         parameters = {
-            'part_number': None,
+            'part_number': extract_mpn(query),
             'manufacturer': None,
             'company': None
         }
 
-        # Enhanced part number pattern to include suffixes like -W, -T, etc.
-        # Use non-greedy match to capture full part numbers with dashes
-        part_match = re.search(r'\b([A-Z]{2,}[0-9]+(?:[-][A-Z0-9]+)*)\b', query, re.IGNORECASE)
-        if part_match:
-            parameters['part_number'] = part_match.group(1).upper()
-
-        # Check for company keywords
-        query_lower = query.lower()
-
-        # For litigation/lawsuit/legal queries, set company field
-        if 'litigation' in query_lower or 'lawsuit' in query_lower or 'legal' in query_lower:
-            if 'toshiba' in query_lower:
-                parameters['company'] = 'Toshiba'
-            elif 'texas instruments' in query_lower:
-                parameters['company'] = 'Texas Instruments'
-            elif 'intel' in query_lower:
-                parameters['company'] = 'Intel'
-            elif 'nxp' in query_lower:
-                parameters['company'] = 'NXP'
-        # For part queries, set manufacturer field
-        else:
-            if 'toshiba' in query_lower:
-                parameters['manufacturer'] = 'Toshiba'
-            elif 'texas instruments' in query_lower or ' ti ' in query_lower or query_lower.endswith(' ti'):
-                parameters['manufacturer'] = 'Texas Instruments'
-            elif 'digikey' in query_lower:
-                # Keep part number but don't set manufacturer for DigiKey queries
-                pass
-            elif 'onsemi' in query_lower:
-                parameters['manufacturer'] = 'onsemi'
+        manufacturer = manufacturer_index.find(query)
+        if manufacturer:
+            query_lower = query.lower()
+            # Company-level queries use the company field, part queries the manufacturer field
+            if any(word in query_lower for word in COMPANY_QUERY_KEYWORDS):
+                parameters['company'] = manufacturer
+            else:
+                parameters['manufacturer'] = manufacturer
 
         return parameters
 
-    def _score_tool(self, tool: Dict[str, Any], query_lower: str, params: Dict[str, Optional[str]]) -> float:
-        """Score how well a tool matches the query"""
-        score = 0.0
-
-        # Check keyword matches
-        for keyword in tool['keywords']:
-            if keyword in query_lower:
-                score += 2.0
-
-        # Check if we have required parameters
-        has_required = True
-        for req in tool.get('requires', []):
-            if req == 'company' and not params['company']:
-                # Check if we have a company (could be from manufacturer field)
-                if not params.get('manufacturer'):
-                    has_required = False
-            elif req == 'part_number' and not params['part_number']:
-                has_required = False
-            elif req == 'manufacturer' and not params['manufacturer']:
-                # Some tools require manufacturer
-                if tool['name'] in ['Part_Details', 'Cross_References']:
-                    has_required = False
-
-        if not has_required:
-            return 0.0  # Can't use this tool without required params
-
-        # Special scoring for specific patterns
-        if 'cross reference' in query_lower and tool['name'] == 'Cross_References':
-            score += 15.0  # Very strong match for cross references
-
-        if 'alternative' in query_lower and tool['name'] == 'Cross_References':
-            score += 10.0  # Alternative parts are cross references
-
-        if 'replacement' in query_lower and tool['name'] == 'Cross_References':
-            score += 10.0  # Replacement parts are cross references
-
-        if 'litigation' in query_lower and tool['name'] == 'Company_Litigations':
-            score += 10.0  # Very strong match
-
-        if 'company' in query_lower and 'details' in query_lower and tool['name'] == 'Company_Details':
-            score += 8.0
-
-        if 'supply chain' in query_lower:
-            if 'location' in query_lower and tool['name'] == 'Supply_Chain_Locations':
-                score += 8.0
-            elif 'event' in query_lower and tool['name'] == 'Supply_Chain_Events':
-                score += 8.0
-
-        if 'digikey' in query_lower and tool['name'] == 'Digikey_Stock':
-            score += 10.0
-
-        if any(word in query_lower for word in ['rohs', 'reach', 'compliance']) and tool['name'] == 'Compliance_Data':
-            score += 8.0
-
-        # If we have both part and manufacturer, prefer Part_Details
-        if params['part_number'] and params['manufacturer'] and tool['name'] == 'Part_Details':
-            score += 3.0
-
-        # If only part number, prefer Part_Search
-        if params['part_number'] and not params['manufacturer'] and tool['name'] == 'Part_Search':
-            score += 2.0
-
-        return score
-
     def get_tool_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Get a specific tool by name"""
-        for tool in self.tools:
-            if tool['name'] == name:
-                return tool
-        return None
\ No newline at end of file
+        return self._tools_by_name.get(name)
\ No newline at end of file
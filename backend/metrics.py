@@ -0,0 +1,244 @@
+"""
+Prometheus-style metrics
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format for the /metrics endpoint. Updates are plain attribute increments on
+pre-created series, with no locks: the event loop is single-threaded, and an
+increment from a worker thread can at worst be lost, never corrupt a scrape.
+Gauges that mirror existing state (queue depth, resident memories) are read
+through callbacks at scrape time instead of being updated on the hot path.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Callable, Optional, Sequence
+
+NAMESPACE = "z2chat"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeSeries(_CounterSeries):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    """A named family of series, one per combination of label values"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._series[()] = self._new_series()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """The series for these label values (created on first use)"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(series.value)}"
+                for key, series in list(self._series.items())]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount: float = 1.0):
+        self._series[()].inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Any]] = None):
+        super().__init__(name, documentation, labelnames)
+        # Returns a number, or {label value(s): number} for labelled gauges
+        self.callback = callback
+
+    def _new_series(self):
+        return _GaugeSeries()
+
+    def set(self, value: float):
+        self._series[()].set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._series[()].inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._series[()].dec(amount)
+
+    def _samples(self) -> List[str]:
+        if self.callback is None:
+            return super()._samples()
+        value = self.callback()
+        if not isinstance(value, dict):
+            return [f"{self.name} {_format_value(value)}"]
+        return [f"{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} "
+                f"{_format_value(number)}" for key, number in value.items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds) in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value: float):
+        self._series[()].observe(value)
+
+    def time(self, **labels):
+        """Context manager observing the duration of the enclosed block"""
+        return self.labels(**labels).time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), list(series.counts)):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """All metrics exposed on /metrics"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, metric: _Metric):
+        self.metrics.pop(metric.name, None)
+
+    def render(self) -> str:
+        """The text exposition of every metric"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def model_name(llm) -> str:
+    """Model label for a LangChain chat model"""
+    return getattr(llm, 'model', None) or getattr(llm, 'model_name', None) or type(llm).__name__
+
+
+# Global metrics registry instance
+registry = MetricsRegistry()
+
+routing_latency = registry.register(Histogram(
+    "routing_latency_seconds", "Time to choose an agent for a message, by routing tier", ["tier"]))
+llm_latency = registry.register(Histogram(
+    "llm_request_seconds", "LLM call latency, by model", ["model"]))
+z2data_latency = registry.register(Histogram(
+    "z2data_request_seconds", "Z2Data gateway request latency, by endpoint and HTTP status", ["endpoint", "status"]))
+sandbox_execution_time = registry.register(Histogram(
+    "sandbox_execution_seconds", "Sandbox run time excluding cache hits, by worker mode", ["mode"]))
+db_query_time = registry.register(Histogram(
+    "db_query_seconds", "Database statement time, by statement type", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups, by cache and result (hit or miss)", ["cache", "result"]))
+coalesced_requests = registry.register(Counter(
+    "z2data_coalesced_requests_total", "Z2Data requests saved by sharing one part validation across a tool plan"))
+retries = registry.register(Counter(
+    "retries_total", "Operations retried after a failed first attempt, by operation", ["operation"]))
+
+active_websockets = registry.register(Gauge(
+    "active_websockets", "Open WebSocket connections"))
+websocket_frames_coalesced = registry.register(Counter(
+    "websocket_frames_coalesced_total", "Status frames replaced by a newer one before they were sent"))
+websocket_slow_disconnects = registry.register(Counter(
+    "websocket_slow_disconnects_total", "WebSocket clients disconnected for not keeping up with outbound frames"))
@@ -1,13 +1,16 @@
 """
 Simplified database models - Only essential tables
 """
-from sqlalchemy import Column, String, Text, DateTime, JSON, ForeignKey, create_engine
+from sqlalchemy import Column, String, Text, DateTime, JSON, ForeignKey, Integer, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from datetime import datetime
 import uuid
 import os
+import time
+from metrics import db_query_time
+from serialization import dumps, loads
 
 Base = declarative_base()
 
@@ -46,12 +49,74 @@ class SystemConfig(Base):
     value = Column(Text)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class EnrichmentJob(Base):
+    """A background BOM enrichment run over a stored upload"""
+    __tablename__ = "enrichment_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    upload_id = Column(String, nullable=False)
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed, cancelled
+    total_parts = Column(Integer)  # Distinct parts, known once the BOM is prepared
+    completed_parts = Column(Integer, default=0)
+    enriched_rows = Column(Integer)
+    error = Column(Text)
+    worker = Column(String)  # Process holding the job while it runs
+    heartbeat_at = Column(DateTime)  # Refreshed at every checkpoint; a stale one lets another worker resume
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Relationship
+    parts = relationship("EnrichmentJobPart", back_populates="job", cascade="all, delete-orphan")
+
+class EnrichmentJobPart(Base):
+    """Checkpointed enrichment of one distinct (mpn, manufacturer) in a job"""
+    __tablename__ = "enrichment_job_parts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, ForeignKey("enrichment_jobs.id"), index=True)
+    mpn = Column(String)
+    manufacturer = Column(String)
+    data = Column(JSON)  # Enrichment columns for the part
+
+    # Relationship
+    job = relationship("EnrichmentJob", back_populates="parts")
+
+class PartEnrichment(Base):
+    """Cached enrichment of one distinct part, shared by every BOM that contains it"""
+    __tablename__ = "part_enrichment"
+
+    mpn = Column(String, primary_key=True)  # Normalized MPN
+    manufacturer = Column(String, primary_key=True, default="")  # Canonical name, empty when unknown
+    fields = Column(JSON, default={})  # Enrichment column -> value
+    fetched_at = Column(JSON, default={})  # Enrichment column -> ISO time of the lookup that produced it
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # Database connection
 # Use SQLite for simpler local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./agentsimple.db")
 
-# Create async engine
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Create async engine; JSON columns use the same encoder as WebSocket frames
+engine = create_async_engine(DATABASE_URL, echo=False, json_serializer=dumps, json_deserializer=loads)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    db_query_time.labels(operation=operation).observe(elapsed)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _discard_query_timer(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
 
 # Create async session
 async_session = sessionmaker(
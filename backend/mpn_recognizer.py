@@ -0,0 +1,108 @@
+"""
+Manufacturer part number (MPN) recognizer
+Splits free text into candidate tokens with precompiled patterns and scores
+each one on character classes, known prefix families and length, so every
+call site agrees on what the part number in a query is.
+"""
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+import re
+
+# Candidate tokens: letters/digits plus the punctuation MPNs use (LM317-W, LT1763CS8-3.3#TRPBF)
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9\-./#+]*')
+TRAILING_PUNCTUATION = '-./'
+
+# Common part-number families; a token starting with one of these scores higher
+PREFIX_FAMILIES = [
+    '1N', '2N', '74HC', '74LV', 'AD', 'ADP', 'ADS', 'ATMEGA', 'ATSAM', 'ATTINY', 'BAS', 'BAT',
+    'BAV', 'BC', 'BQ', 'BSS', 'BZX', 'CD40', 'CRCW', 'DAC', 'DRV', 'ERJ', 'ESP32', 'FDN', 'FT',
+    'GRM', 'INA', 'IRF', 'IRL', 'LM', 'LMV', 'LP', 'LT', 'LTC', 'MAX', 'MC', 'MCP', 'MMBT', 'MSP430',
+    'NE', 'NRF', 'NTR', 'OPA', 'PESD', 'PIC', 'PMEG', 'RC0', 'SI', 'SN74', 'STM32', 'STM8',
+    'TL', 'TLV', 'TMS320', 'TPS', 'UA', 'UCC', 'XC',
+]
+PREFIX_PATTERN = re.compile(
+    r'^(?:' + '|'.join(sorted(PREFIX_FAMILIES, key=len, reverse=True)) + r')[A-Z]{0,3}\d'
+)
+
+# Letters followed by digits is the most common MPN shape (BAV99, TPS62840)
+MPN_SHAPE_PATTERN = re.compile(r'^[A-Z]{1,8}\d{2,}')
+
+# Tokens that mix letters and digits but are values, not parts (10uF, 3.3V, 100pcs, 2nd, v1.2)
+NON_PART_PATTERN = re.compile(
+    r'^(?:\d+(?:\.\d+)?(?:[PNUMK]?(?:F|H|V|A|W|HZ|OHMS?)|K|M|R|%|PCS|MM|CM|IN|ST|ND|RD|TH|X)'
+    r'|V\d+(?:\.\d+)*|Q[1-4]|H[12]|FY\d{2,4})$'
+)
+NON_PART_TOKENS = {'USB2', 'USB3', 'I2C', 'I2S', 'MP3', 'MP4', '4G', '5G', 'IOT', 'COVID19', 'GPT5'}
+
+DIGIT_PATTERN = re.compile(r'\d')
+LETTER_PATTERN = re.compile(r'[A-Z]')
+
+MIN_TOKEN_LENGTH = 3
+MAX_TOKEN_LENGTH = 40
+MIN_SCORE = 3.0
+
+
+def score_token(token: str) -> float:
+    """Score how likely a single token is to be a part number (0 = not a part)"""
+    return _score_normalized(token.upper().rstrip(TRAILING_PUNCTUATION))
+
+
+@lru_cache(maxsize=65536)
+def _score_normalized(token: str) -> float:
+    # Query logs repeat the same words and parts, so scores are memoized
+    length = len(token)
+    if length < MIN_TOKEN_LENGTH or length > MAX_TOKEN_LENGTH:
+        return 0.0
+    if token in NON_PART_TOKENS or NON_PART_PATTERN.match(token):
+        return 0.0
+
+    if not DIGIT_PATTERN.search(token):
+        return 0.0
+
+    if LETTER_PATTERN.search(token):
+        score = 2.0
+        if MPN_SHAPE_PATTERN.match(token):
+            score += 1.0
+        if PREFIX_PATTERN.match(token):
+            score += 2.0
+    else:
+        # Pure numbers are only parts when long (Molex 430450212), never years or quantities
+        score = 2.0 if length >= 8 else 0.0
+
+    if 4 <= length <= 25:
+        score += 1.0
+    return score
+
+
+def recognize(text: str) -> List[Dict[str, Any]]:
+    """Return every candidate part number in text, best score first.
+
+    Each candidate has the uppercased "mpn", its "score" and the "start"/"end"
+    offsets in the original text. Ties keep their order of appearance.
+    """
+    candidates = []
+    if not text:
+        return candidates
+
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group(0)
+        if token.isalpha():
+            continue
+        token = token.rstrip(TRAILING_PUNCTUATION)
+        score = _score_normalized(token.upper())
+        if score >= MIN_SCORE:
+            candidates.append({
+                "mpn": token.upper(),
+                "score": score,
+                "start": match.start(),
+                "end": match.start() + len(token)
+            })
+
+    candidates.sort(key=lambda c: -c["score"])
+    return candidates
+
+
+def extract_mpn(text: str) -> Optional[str]:
+    """The most likely part number in text, uppercased, or None"""
+    candidates = recognize(text)
+    return candidates[0]["mpn"] if candidates else None
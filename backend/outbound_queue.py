@@ -0,0 +1,158 @@
+"""
+Per-connection outbound WebSocket queue
+The endpoint and the agents hand frames to an OutboundQueue instead of
+awaiting the socket, and a dedicated sender task writes them out. A slow
+client then costs a bounded queue instead of stalling the agent coroutine on
+every send while the server buffers without limit.
+
+Status frames are coalesced: a newer status of the same turn replaces one
+still waiting, so a burst of progress updates reaches a lagging client as the
+latest one. Every other frame (partials, responses) is kept and sent in
+order. A client with more than WS_OUTBOUND_MAX_FRAMES frames waiting, or that
+takes longer than WS_SEND_TIMEOUT seconds to accept one, is disconnected.
+"""
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Deque, List, Optional
+
+from serialization import dumps
+from metrics import websocket_frames_coalesced, websocket_slow_disconnects
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAMES = int(os.getenv("WS_OUTBOUND_MAX_FRAMES", "256"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+COALESCED_TYPES = {"status"}  # Latest-wins frame types
+SLOW_CLIENT_CLOSE_CODE = 1013  # Try again later
+
+_SUPERSEDED = object()  # Slot of a status frame a newer one replaced
+_STOP = object()  # Tells the sender to finish once everything before it is sent
+
+
+class OutboundQueue:
+    """Bounded, coalescing send queue for one WebSocket, with the socket's send_json/send_text methods"""
+
+    def __init__(self, websocket, max_frames: int = MAX_FRAMES, send_timeout: float = SEND_TIMEOUT):
+        self.websocket = websocket
+        self.max_frames = max_frames
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._slots: Deque[List] = deque()  # One-item lists so a waiting status can be superseded in place
+        self._status: Dict[Any, List] = {}  # turn_id -> slot of that turn's status frame still waiting
+        self._pending = 0  # Frames waiting, superseded ones excluded
+        self._ready = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> "OutboundQueue":
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._run())
+        return self
+
+    async def send_json(self, data: Dict[str, Any]):
+        self.put(data)
+
+    async def send_text(self, text: str):
+        self.put(text)
+
+    def put(self, frame):
+        """Queue a frame (dict or encoded text) without waiting for the client"""
+        if self.closed:
+            return
+        if isinstance(frame, dict) and frame.get("type") in COALESCED_TYPES:
+            waiting = self._status.get(frame.get("turn_id"))
+            if waiting is not None:
+                waiting[0] = _SUPERSEDED
+                self._pending -= 1
+                websocket_frames_coalesced.inc()
+            self._status[frame.get("turn_id")] = slot = [frame]
+        else:
+            slot = [frame]
+        if self._pending >= self.max_frames:
+            self._disconnect_slow(f"{self._pending} frames waiting")
+            return
+        self._slots.append(slot)
+        self._pending += 1
+        self._ready.set()
+
+    async def _run(self):
+        while True:
+            while not self._slots:
+                self._ready.clear()
+                await self._ready.wait()
+            slot = self._slots.popleft()
+            frame = slot[0]
+            if isinstance(frame, dict) and self._status.get(frame.get("turn_id")) is slot:
+                del self._status[frame.get("turn_id")]
+            if frame is _SUPERSEDED:
+                continue
+            if frame is _STOP:
+                return
+            self._pending -= 1
+            try:
+                await asyncio.wait_for(self.websocket.send_text(frame if isinstance(frame, str) else dumps(frame)),
+                                       self.send_timeout)
+            except asyncio.TimeoutError:
+                self._disconnect_slow(f"send took over {self.send_timeout}s")
+                return
+            except Exception as e:
+                # The client went away; the receive loop notices and ends the connection
+                logger.debug("WebSocket send failed: %s", e)
+                self._discard()
+                return
+
+    def _discard(self):
+        self.closed = True
+        self._slots.clear()
+        self._status.clear()
+        self._pending = 0
+
+    def _disconnect_slow(self, reason: str):
+        logger.warning("Disconnecting slow WebSocket client: %s", reason)
+        websocket_slow_disconnects.inc()
+        self._discard()
+        if self._sender is not None and self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        self._closer = asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE, reason="Client too slow")
+        except Exception as e:
+            logger.debug("Closing slow WebSocket failed: %s", e)
+
+    async def close(self):
+        """Send what is still queued, giving up after send_timeout, then stop the sender"""
+        if self._sender is None:
+            self.closed = True
+            return
+        if not self.closed:
+            self._slots.append([_STOP])
+            self._ready.set()
+            self.closed = True
+            try:
+                await asyncio.wait_for(asyncio.shield(self._sender), self.send_timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._sender.cancel()
+        await asyncio.gather(self._sender, *([self._closer] if self._closer else []), return_exceptions=True)
+
+
+class TurnSender:
+    """One turn's view of the connection queue: its frames carry the turn's ID"""
+
+    def __init__(self, outbound: OutboundQueue, turn_id: str):
+        self.outbound = outbound
+        self.turn_id = turn_id
+
+    async def send_json(self, data: Dict[str, Any]):
+        self.outbound.put({**data, "turn_id": self.turn_id})
+
+    async def send_text(self, text: str):
+        self.outbound.put(text)
@@ -0,0 +1,299 @@
+"""
+Sandbox worker process
+Started by code_sandbox.SandboxPool with the safe modules already imported, so
+an execution costs an exec() instead of a fresh interpreter. Reads one JSON
+request per line and writes one JSON result per line.
+
+OS resource limits (address space, file size, process count, CPU seconds per
+execution) are applied with setrlimit where the platform supports it.
+
+When a request names a dataset (an Arrow IPC file written by the dataset
+store), it is memory-mapped read-only and exposed to the snippet as `df`.
+"""
+import io
+import os
+import sys
+import time
+import signal
+import traceback
+import contextlib
+from json import dumps, loads
+
+from code_analysis import restricted_builtins
+
+try:
+    import resource
+except ImportError:  # Windows has no setrlimit; only the wall-clock timeout applies
+    resource = None
+
+# Safe modules available to user code without importing them
+import math
+import random
+import datetime
+import json
+import statistics
+
+SAFE_MODULES = {
+    'math': math,
+    'random': random,
+    'datetime': datetime,
+    'json': json,
+    'statistics': statistics,
+}
+
+# Data analysis libraries, imported at startup when the worker is asked to preload them
+numpy = pandas = pyarrow = None
+DATA_MODULES = ('np', 'pd')
+
+DEFAULT_LIMITS = {
+    'cpu_seconds': 5,
+    'memory_mb': 1024,
+    'file_size_mb': 1,
+    'max_processes': 0,
+    'preload_data': True,
+}
+
+# User code never sees the builtins module itself, only the allowlisted names
+SAFE_BUILTINS = restricted_builtins()
+
+MAX_OPEN_DATASETS = 4
+_datasets = {}  # path -> ((mtime, size), memory-mapped pyarrow Table)
+
+
+class ExecutionLimitExceeded(BaseException):
+    """Raised inside user code when a limit is hit; BaseException so `except Exception` cannot swallow it"""
+
+    def __init__(self, violation: str, message: str):
+        super().__init__(message)
+        self.violation = violation
+
+
+class CappedStream(io.StringIO):
+    """Captures output and stops the execution once it exceeds its character budget"""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self.remaining = limit
+
+    def write(self, text: str) -> int:
+        if len(text) > self.remaining:
+            super().write(text[:self.remaining])
+            self.remaining = 0
+            raise ExecutionLimitExceeded(
+                "output_limit", f"Output limit of {self.limit} characters exceeded; execution stopped"
+            )
+        self.remaining -= len(text)
+        return super().write(text)
+
+
+def _address_space_bytes() -> int:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmSize:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def apply_limits(limits: dict):
+    """Set the process-wide rlimits that hold for the worker's whole life"""
+    if resource is None:
+        return
+    caps = [
+        # memory_mb is headroom on top of what the preloaded libraries already map
+        ('RLIMIT_AS', _address_space_bytes() + limits['memory_mb'] * 1024 * 1024),
+        ('RLIMIT_FSIZE', limits['file_size_mb'] * 1024 * 1024),
+        ('RLIMIT_NPROC', limits['max_processes']),
+    ]
+    for name, value in caps:
+        if value is None or not hasattr(resource, name):
+            continue
+        try:
+            resource.setrlimit(getattr(resource, name), (value, value))
+        except (ValueError, OSError):
+            pass  # Already lower than requested, or not permitted here
+
+
+def _on_cpu_limit(signum, frame):
+    raise ExecutionLimitExceeded("cpu_limit", "CPU time limit exceeded")
+
+
+def _set_cpu_budget(seconds: int):
+    """RLIMIT_CPU counts the worker's whole life, so move the soft limit per execution"""
+    if resource is None or not hasattr(resource, 'RLIMIT_CPU'):
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+    except (ValueError, OSError):
+        pass
+
+
+def _reset_peak_rss():
+    # Linux resets VmHWM when "5" is written to clear_refs
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        return peak // 1024 if sys.platform == 'darwin' else peak
+    return None
+
+
+def _load_dataset(path: str):
+    """Fresh DataFrame over a memory-mapped Arrow IPC file; the mapping is reused across runs"""
+    if pyarrow is None:
+        raise RuntimeError("Datasets require pandas and pyarrow in the sandbox")
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _datasets.get(path)
+    if cached is None or cached[0] != version:
+        if len(_datasets) >= MAX_OPEN_DATASETS:
+            _datasets.pop(next(iter(_datasets)))
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path, 'r')).read_all()
+        cached = _datasets[path] = (version, table)
+    # Arrow-backed columns wrap the mapped buffers without copying them; a new
+    # frame per run keeps one snippet's column edits from reaching the next
+    return cached[1].to_pandas(types_mapper=pandas.ArrowDtype, use_threads=False)
+
+
+def _preload_data_libraries():
+    """Import numpy, pandas and pyarrow (when installed) and expose them as np and pd"""
+    global numpy, pandas, pyarrow
+    try:
+        import numpy
+        import pandas
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:  # Data analysis libraries are optional
+        numpy = pandas = pyarrow = None
+        return
+    SAFE_MODULES.update({'np': numpy, 'pd': pandas})
+
+
+def _fingerprint():
+    """Identity of every attribute of the safe modules, to detect tampering"""
+    return {name: {key: id(value) for key, value in vars(module).items()}
+            for name, module in SAFE_MODULES.items()}
+
+
+def _tampered(before: dict, after: dict) -> bool:
+    """Whether a snippet rebound or removed module attributes.
+
+    numpy and pandas add attributes lazily as features are first used, so only
+    changes to existing attributes count for them; the stdlib modules must not
+    change at all.
+    """
+    for name, attributes in before.items():
+        current = after[name]
+        if name not in DATA_MODULES and len(current) != len(attributes):
+            return True
+        if any(current.get(key) != value for key, value in attributes.items()):
+            return True
+    return False
+
+
+def run(code: str, max_output: int, limits: dict, dataset: str = None) -> dict:
+    """Execute one snippet as __main__ and capture what it prints"""
+    stdout, stderr = CappedStream(max_output), CappedStream(max_output)
+    namespace = {'__name__': '__main__', '__builtins__': dict(SAFE_BUILTINS), **SAFE_MODULES}
+    violation = None
+
+    if dataset:
+        try:
+            namespace['df'] = _load_dataset(dataset)
+        except Exception as e:
+            return {"output": "", "error": f"Could not open dataset: {e}", "violation": None,
+                    "usage": {"cpu_time_ms": 0.0, "peak_rss_kb": None}}
+
+    # A fresh interpreter would start from an unpredictable seed too
+    random.seed()
+    before = _fingerprint()
+    _reset_peak_rss()
+    _set_cpu_budget(limits['cpu_seconds'])
+    cpu_start = time.process_time()
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(code, '<sandbox>', 'exec'), namespace)
+        except ExecutionLimitExceeded as e:
+            violation = e.violation
+            error = f"{e}"
+        except SystemExit as e:
+            error = f"{e.code}\n" if e.code not in (None, 0) else ""
+        except MemoryError:
+            violation = "memory_limit"
+            error = f"Memory limit of {limits['memory_mb']} MB exceeded"
+        except BaseException:
+            exc_type, exc, tb = sys.exc_info()
+            # Skip this frame so the traceback starts at the user's code
+            error = ''.join(traceback.format_exception(exc_type, exc, tb.tb_next))
+        else:
+            error = ""
+
+    cpu_time = time.process_time() - cpu_start
+    if violation is None and _tampered(before, _fingerprint()):
+        # Mutated shared modules would leak into the next execution
+        violation = "module_tampering"
+
+    errors = stderr.getvalue()
+    if error:
+        errors += error[:max_output]
+
+    return {
+        "output": stdout.getvalue(),
+        "error": errors,
+        "violation": violation,
+        "usage": {
+            "cpu_time_ms": round(cpu_time * 1000, 2),
+            "peak_rss_kb": _peak_rss_kb()
+        }
+    }
+
+
+def main():
+    limits = {**DEFAULT_LIMITS, **(loads(sys.argv[1]) if len(sys.argv) > 1 else {})}
+    if limits['preload_data']:
+        _preload_data_libraries()
+    apply_limits(limits)
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # Keep private handles to the pipes and point fds 0/1 at /dev/null, so
+    # nothing user code writes can corrupt the line protocol
+    requests = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    responses = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdin = open(os.devnull)
+
+    responses.write(dumps({"ready": True}) + "\n")
+    responses.flush()
+
+    for line in requests:
+        request = loads(line)
+        result = run(request["code"], request.get("max_output", 10000), limits, request.get("dataset"))
+        responses.write(dumps(result) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+JSON encoding for WebSocket frames and persisted messages
+Uses orjson when it is installed and the standard library otherwise. A
+ResponseFrame encodes a turn's content once: the same text is stored as the
+message content and spliced into the frame sent over the socket, so a
+thousand-row enrichment table is serialized a single time per turn.
+"""
+import json
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; the stdlib encoder produces the same documents
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _encode_stdlib(obj: Any) -> str:
+    # Same compact, non-ASCII-escaping output Starlette's send_json produces
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON text; values JSON has no type for are written as strings"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            pass  # Integers beyond 64 bits and other values orjson refuses
+    return _encode_stdlib(obj)
+
+
+def loads(text: str) -> Any:
+    """Parse JSON text, including NaN/Infinity written by older stdlib-encoded rows"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+class ResponseFrame:
+    """The final response of a turn, encoded once for the socket and the database"""
+
+    __slots__ = ("content", "agent_type", "metadata", "_content_json")
+
+    def __init__(self, content: Any, agent_type: Optional[str], metadata: Optional[Dict[str, Any]] = None):
+        self.content = content
+        self.agent_type = agent_type
+        self.metadata = metadata or {}
+        self._content_json: Optional[str] = None
+
+    @property
+    def content_json(self) -> str:
+        if self._content_json is None:
+            self._content_json = dumps(self.content)
+        return self._content_json
+
+    @property
+    def stored_content(self) -> str:
+        """Message.content: text as-is, structured content as its JSON encoding"""
+        return self.content if isinstance(self.content, str) else self.content_json
+
+    def encode(self) -> str:
+        """The WebSocket frame, reusing the encoded content"""
+        return (f'{{"type":"response","content":{self.content_json},'
+                f'"agent_type":{dumps(self.agent_type)},"metadata":{dumps(self.metadata)}}}')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": "response", "content": self.content, "agent_type": self.agent_type, "metadata": self.metadata}
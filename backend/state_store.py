@@ -0,0 +1,253 @@
+"""
+Shared state for conversation memory, caches and single-flight locks
+InProcessStore keeps state in this process, which is enough for a single
+worker. RedisStore keeps it in any Redis-protocol server, so several uvicorn
+workers or pods see the same conversation memory and tool cache, and a
+WebSocket can reconnect to any of them.
+
+Values are JSON documents; both stores encode them, so callers always get a
+fresh copy back. STATE_BACKEND selects memory or redis, with STATE_REDIS_URL
+(redis://[:password@]host:port/db) for the latter.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")  # memory or redis
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+MAX_LOCAL_KEYS = int(os.getenv("STATE_MAX_LOCAL_KEYS", "10000"))
+LOCK_TTL = 30.0  # Seconds before an abandoned lock expires
+LOCK_WAIT = 10.0  # Seconds to wait for a lock before going ahead without it
+LOCK_POLL = 0.05
+MAX_IDLE_CONNECTIONS = 16
+# Deletes a lock only while it still holds our token, in one atomic step
+RELEASE_LOCK_SCRIPT = 'if redis.call("get",KEYS[1])==ARGV[1] then return redis.call("del",KEYS[1]) end return 0'
+
+
+class StateStoreError(Exception):
+    """The shared store rejected a command or could not be reached"""
+
+
+class InProcessStore:
+    """State in this process; keys are evicted oldest-first past max_keys"""
+
+    backend = "memory"
+
+    def __init__(self, max_keys: int = MAX_LOCAL_KEYS):
+        self.max_keys = max_keys
+        # key -> (expiry on the monotonic clock or None, encoded value or list of encoded items)
+        self._data: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._locks: Dict[str, List] = {}  # key -> [asyncio.Lock, holders and waiters]
+
+    def _read(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _write(self, key: str, value, ttl: Optional[float]):
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """Live keys with a prefix, for gauges and admin views"""
+        return [key for key in list(self._data) if key.startswith(prefix) and self._read(key) is not None]
+
+    async def get(self, key: str) -> Any:
+        value = self._read(key)
+        return loads(value) if isinstance(value, str) else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._write(key, dumps(value), ttl)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def append(self, key: str, values: List[Any], max_len: Optional[int] = None, ttl: Optional[float] = None):
+        """Add to the end of a list, keep its newest max_len items and refresh its expiry"""
+        items = self._read(key)
+        items = (items if isinstance(items, list) else []) + [dumps(value) for value in values]
+        self._write(key, items[-max_len:] if max_len else items, ttl)
+
+    async def get_list(self, key: str) -> List[Any]:
+        items = self._read(key)
+        return [loads(item) for item in items] if isinstance(items, list) else []
+
+    @asynccontextmanager
+    async def lock(self, key: str, ttl: float = LOCK_TTL, wait: float = LOCK_WAIT):
+        """Hold a per-key lock; yields False if it could not be had within wait seconds"""
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), wait)
+                acquired = True
+            except asyncio.TimeoutError:
+                acquired = False
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._locks.pop(key, None)
+
+    async def close(self):
+        pass
+
+
+class RedisStore:
+    """State in a Redis-protocol server (RESP2), shared by every worker and node"""
+
+    backend = "redis"
+
+    def __init__(self, url: str = STATE_REDIS_URL, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    @staticmethod
+    def _encode(command: Tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise StateStoreError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return StateStoreError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            return None if length < 0 else (await reader.readexactly(length + 2))[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [await self._read_reply(reader) for _ in range(length)]
+        raise StateStoreError(f"Unexpected reply: {line[:40]!r}")
+
+    async def _connect(self):
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise StateStoreError(f"Cannot connect to Redis at {self.host}:{self.port}: {e}") from e
+        setup = ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.db)] if self.db else [])
+        if setup:
+            writer.write(b"".join(self._encode(command) for command in setup))
+            for _ in setup:
+                reply = await self._read_reply(reader)
+                if isinstance(reply, StateStoreError):
+                    writer.close()
+                    raise reply
+        return reader, writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader, count: int) -> List[Any]:
+        return [await self._read_reply(reader) for _ in range(count)]
+
+    async def execute(self, *commands: Tuple) -> List[Any]:
+        """Send commands in one pipeline on a pooled connection and return their replies"""
+        reader, writer = self._idle.pop() if self._idle else await self._connect()
+        try:
+            writer.write(b"".join(self._encode(command) for command in commands))
+            await writer.drain()
+            replies = await asyncio.wait_for(self._read_replies(reader, len(commands)), self.timeout)
+        except BaseException as e:
+            # A connection with unread replies cannot be reused
+            writer.close()
+            if isinstance(e, (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError)):
+                raise StateStoreError(f"Redis connection failed: {e}") from e
+            raise
+        if len(self._idle) < MAX_IDLE_CONNECTIONS:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        for reply in replies:
+            if isinstance(reply, StateStoreError):
+                raise reply
+        return replies
+
+    async def get(self, key: str) -> Any:
+        value = (await self.execute(("GET", key)))[0]
+        return loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        command = ("SET", key, dumps(value)) + (("PX", int(ttl * 1000)) if ttl else ())
+        await self.execute(command)
+
+    async def delete(self, key: str):
+        await self.execute(("DEL", key))
+
+    async def append(self, key: str, values: List[Any], max_len: Optional[int] = None, ttl: Optional[float] = None):
+        """Add to the end of a list, keep its newest max_len items and refresh its expiry"""
+        commands = [("RPUSH", key, *(dumps(value) for value in values))]
+        if max_len:
+            commands.append(("LTRIM", key, -max_len, -1))
+        if ttl:
+            commands.append(("PEXPIRE", key, int(ttl * 1000)))
+        await self.execute(*commands)
+
+    async def get_list(self, key: str) -> List[Any]:
+        items = (await self.execute(("LRANGE", key, 0, -1)))[0]
+        return [loads(item) for item in items or []]
+
+    @asynccontextmanager
+    async def lock(self, key: str, ttl: float = LOCK_TTL, wait: float = LOCK_WAIT):
+        """Hold a lock across all workers; yields False if it could not be had within wait seconds"""
+        lock_key, token = f"lock:{key}", uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        acquired = False
+        while True:
+            acquired = (await self.execute(("SET", lock_key, token, "NX", "PX", int(ttl * 1000))))[0] == "OK"
+            if acquired or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(LOCK_POLL)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                # Only release our own lock; it may have expired and been taken by another worker
+                await self.execute(("EVAL", RELEASE_LOCK_SCRIPT, 1, lock_key, token))
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+def create_store(backend: str = STATE_BACKEND, url: str = STATE_REDIS_URL):
+    if backend == "redis":
+        logger.info("Using shared Redis state store at %s:%s", urlparse(url).hostname, urlparse(url).port or 6379)
+        return RedisStore(url)
+    return InProcessStore()
+
+
+# Global state store instance
+state_store = create_store()
@@ -0,0 +1,197 @@
+"""
+Declarative dispatch table for MCP tools
+Each registry tool's api_method maps to one handler spec: the coroutine to
+call, how registry parameters bind to its arguments, the DataAgent formatter
+for its result and its cache policy.
+"""
+from typing import Dict, Any, Optional, Tuple
+import logging
+from metrics import cache_requests
+from serialization import dumps
+from state_store import state_store, StateStoreError
+
+logger = logging.getLogger(__name__)
+
+_cache_hits = cache_requests.labels(cache="tool", result="hit")
+_cache_misses = cache_requests.labels(cache="tool", result="miss")
+
+# Handler spec fields:
+#   method     - coroutine name, looked up on the Z2DataClient (or the DataAgent when owner is 'agent')
+#   args       - registry parameters passed positionally, in order
+#   requires   - parameters that must be present, with the message returned when one is missing
+#   formatter  - DataAgent method applied to successful results
+#   format_all - apply the formatter to failed results too
+#   format_params - also pass the registry parameters to the formatter
+#   fallback   - DataAgent coroutine called with the same args when the call fails
+#   error      - prefix for failure messages when there is no fallback
+#   cache_ttl  - seconds a successful result is reused (0 disables caching)
+#   part_id    - the coroutine accepts a pre-resolved part_id and skips part validation
+TOOL_HANDLERS: Dict[str, Dict[str, Any]] = {
+    'get_part_details': {
+        'method': '_get_part_details',
+        'owner': 'agent',
+        'args': ['part_number', 'manufacturer'],
+        'requires': (['part_number', 'manufacturer'], "Both part number and manufacturer are required for part details"),
+        'formatter': '_format_part_details_result',
+        'format_all': True,
+        'format_params': True,
+        'cache_ttl': 3600,
+        'part_id': True
+    },
+    'search_parts': {
+        'method': '_search_parts',
+        'owner': 'agent',
+        'args': ['part_number'],
+        'requires': (['part_number'], "Part number is required for part search"),
+        'format_all': True,
+        'cache_ttl': 3600
+    },
+    'get_market_availability': {
+        'method': 'get_market_availability',
+        'args': ['part_number'],
+        'requires': (['part_number'], "Part number is required for market availability"),
+        'formatter': '_format_market_response',
+        'fallback': '_get_market_data',
+        'cache_ttl': 300,
+        'part_id': True
+    },
+    'get_digikey_stock': {
+        # DigiKey stock is the market availability data filtered to DigiKey sellers
+        'method': 'get_market_availability',
+        'args': ['part_number', 'manufacturer'],
+        'requires': (['part_number'], "Part number is required for DigiKey stock check"),
+        'formatter': '_format_digikey_response',
+        'error': "Failed to get DigiKey stock",
+        'cache_ttl': 300,
+        'part_id': True
+    },
+    'get_cross_references': {
+        'method': 'get_cross_references',
+        'args': ['part_number', 'manufacturer'],
+        'requires': (['part_number', 'manufacturer'], "Both part number and manufacturer are required for cross references"),
+        'formatter': '_format_cross_reference_response',
+        'error': "Failed to get cross references",
+        'cache_ttl': 3600,
+        'part_id': True
+    },
+    'get_compliance_data': {
+        'method': 'get_compliance_data',
+        'args': ['part_number'],
+        'requires': (['part_number'], "Part number is required for compliance data"),
+        'formatter': '_format_compliance_response',
+        'format_all': True,
+        'cache_ttl': 3600,
+        'part_id': True
+    },
+    'get_company_litigations': {
+        'method': 'get_company_litigations',
+        'args': ['company'],
+        'requires': (['company'], "Company name is required for litigation search"),
+        'formatter': '_format_litigation_response',
+        'error': "Failed to get litigation data",
+        'cache_ttl': 3600
+    },
+    'get_company_details': {
+        'method': 'get_company_details',
+        'args': ['company'],
+        'requires': (['company'], "Company name is required for company details"),
+        'formatter': '_format_company_details_response',
+        'error': "Failed to get company details",
+        'cache_ttl': 3600
+    },
+    'get_supply_chain_locations': {
+        'method': 'get_company_supply_chain',
+        'args': ['company'],
+        'requires': (['company'], "Company name is required for supply chain locations"),
+        'formatter': '_format_supply_chain_response',
+        'error': "Failed to get supply chain locations",
+        'cache_ttl': 3600
+    },
+    'get_supply_chain_events': {
+        'method': 'get_supply_chain_events',
+        'args': [],
+        'requires': ([], None),
+        'formatter': '_format_events_response',
+        'error': "Failed to get supply chain events",
+        'cache_ttl': 300
+    },
+}
+
+
+class ToolDispatcher:
+    """Runs MCP tools for a DataAgent through the TOOL_HANDLERS table"""
+
+    def __init__(self, agent, handlers: Dict[str, Dict[str, Any]] = None, store=None):
+        self.agent = agent
+        self.handlers = handlers if handlers is not None else TOOL_HANDLERS
+        # Cached results are shared by every worker using the same state store
+        self.store = store or state_store
+
+    def get_handler(self, api_method: str) -> Optional[Dict[str, Any]]:
+        """Handler spec for an api_method, or None"""
+        return self.handlers.get(api_method)
+
+    def uses_part_id(self, tool: Dict[str, Any]) -> bool:
+        """Whether a tool can reuse a part ID resolved once for the whole plan"""
+        handler = self.handlers.get(tool.get('api_method'))
+        return bool(handler and handler.get('part_id'))
+
+    async def dispatch(self, tool: Dict[str, Any], params: Dict[str, Any]):
+        """Call the tool's coroutine with bound parameters and format the result"""
+        api_method = tool.get('api_method')
+        if not api_method:
+            return f"Tool {tool['name']} does not have an API method configured"
+
+        handler = self.handlers.get(api_method)
+        if handler is None:
+            return f"Unknown API method: {api_method}"
+
+        required, missing_message = handler['requires']
+        if any(not params.get(name) for name in required):
+            return missing_message
+
+        args = tuple(params.get(name) or "" for name in handler['args'])
+        kwargs = {'part_id': params['part_id']} if handler.get('part_id') and params.get('part_id') else {}
+        result = await self._call(api_method, handler, args, kwargs)
+
+        succeeded = isinstance(result, dict) and result.get('success')
+        if not succeeded and not handler.get('format_all'):
+            if handler.get('fallback'):
+                return await getattr(self.agent, handler['fallback'])(*args)
+            error = result.get('error', 'Unknown error') if isinstance(result, dict) else result
+            return f"{handler['error']}: {error}"
+
+        if handler.get('formatter'):
+            formatter = getattr(self.agent, handler['formatter'])
+            return formatter(result, params) if handler.get('format_params') else formatter(result)
+        return result
+
+    async def _call(self, api_method: str, handler: Dict[str, Any], args: Tuple, kwargs: Dict[str, Any]):
+        """Invoke the handler coroutine, reusing a cached successful result when allowed"""
+        owner = self.agent if handler.get('owner') == 'agent' else self.agent.z2_client
+        call = getattr(owner, handler['method'])
+        ttl = handler.get('cache_ttl', 0)
+        if not ttl:
+            return await call(*args, **kwargs)
+
+        key = f"tool:{handler['method']}:{dumps(args)}"
+        result = None
+        try:
+            cached = await self.store.get(key)
+            if cached is None:
+                # Single flight: concurrent misses for the same call, in any worker, wait for one lookup
+                async with self.store.lock(key):
+                    cached = await self.store.get(key)
+                    if cached is None:
+                        _cache_misses.inc()
+                        result = await call(*args, **kwargs)
+                        if isinstance(result, dict) and result.get('success'):
+                            await self.store.set(key, result, ttl)
+                        return result
+        except StateStoreError as e:
+            logger.warning("Tool cache unavailable for %s: %s", api_method, e)
+            return result if result is not None else await call(*args, **kwargs)
+
+        logger.debug("Tool cache hit for %s%s", api_method, args)
+        _cache_hits.inc()
+        return cached
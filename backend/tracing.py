@@ -0,0 +1,271 @@
+"""
+Span-based request tracing
+Records nested, timed spans for each chat turn (routing, parameter extraction,
+Z2Data calls, sandbox runs, database writes) and exports finished traces in
+OTLP/JSON form, either to an in-memory ring buffer served by the admin API or
+to a JSON-lines file an OpenTelemetry collector can ingest.
+"""
+import os
+import json
+import time
+import random
+import queue
+import atexit
+import asyncio
+import logging
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "z2-chat-backend")
+DEFAULT_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")  # memory, file or none
+DEFAULT_TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+DEFAULT_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))  # Spans kept in memory
+# Attach a timing breakdown to every response; clients can also ask per message
+RESPONSE_TIMINGS = os.getenv("TRACE_RESPONSE_TIMINGS", "false").lower() == "true"
+
+_STOP_WRITER = object()  # Tells a FileExporter's writer to exit once everything before it is written
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _attribute_value(value) -> Dict[str, Any]:
+    """OTLP AnyValue for a plain Python value"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation; spans of a trace share the trace's list of finished spans"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "_finished", "_wall_start_ns")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+        self._finished: List["Span"] = parent._finished if parent else []
+        self._wall_start_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Timings of this span and every finished span below it, in start order"""
+        spans = sorted((s for s in self._finished if s is not self), key=lambda s: s.start_ns)
+        depths = {self.span_id: 0}
+        entries = []
+        for span in spans:
+            if span.parent_id not in depths:
+                continue  # Belongs to another branch of the trace
+            depths[span.span_id] = depths[span.parent_id] + 1
+            entry = {
+                "name": span.name,
+                "depth": depths[span.span_id],
+                "offset_ms": round((span.start_ns - self.start_ns) / 1e6, 2),
+                "duration_ms": round(span.duration_ms, 2)
+            }
+            if span.error:
+                entry["error"] = span.error
+            entries.append(entry)
+        return {"trace_id": self.trace_id, "total_ms": round(self.duration_ms, 2), "spans": entries}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in OTLP/JSON form"""
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self._wall_start_ns),
+            "endTimeUnixNano": str(self._wall_start_ns + end_ns - self.start_ns),
+            "attributes": [{"key": k, "value": _attribute_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    """An OTLP ExportTraceServiceRequest body for a batch of spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}]
+        }]
+    }
+
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory"""
+
+    def __init__(self, max_spans: int = DEFAULT_BUFFER_SIZE):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent traces first, each as an OTLP request body"""
+        by_trace: Dict[str, List[Span]] = {}
+        for span in reversed(self.spans):
+            if span.trace_id not in by_trace and len(by_trace) >= limit:
+                continue
+            by_trace.setdefault(span.trace_id, []).append(span)
+        return [otlp_request(list(reversed(spans))) for spans in by_trace.values()]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter:
+    """
+    Appends one OTLP/JSON line per finished trace (the collector's otlpjsonfile
+    format). export() only queues the spans; a writer thread encodes and
+    appends them, so the event loop never waits on the file.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_FILE):
+        self.path = path
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # Guards starting and stopping the writer
+
+    def export(self, spans: List[Span]):
+        self._queue.put(spans)
+        if self._writer is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, name="trace-file-exporter", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _write(self):
+        while True:
+            batches = [self._queue.get()]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(spans is _STOP_WRITER for spans in batches)
+            lines = [json.dumps(otlp_request(spans)) + "\n" for spans in batches if spans is not _STOP_WRITER]
+            try:
+                with open(self.path, 'a') as f:
+                    f.writelines(lines)
+            except Exception as e:
+                logger.warning("Writing %d traces to %s failed: %s", len(lines), self.path, e)
+            if stop:
+                return
+
+    def flush(self):
+        """Write every trace queued so far; the writer restarts on the next export"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                atexit.unregister(self.flush)
+                self._queue.put(_STOP_WRITER)
+                writer.join()
+
+
+class Tracer:
+    """
+    Creates spans under the current one and exports each trace when its root
+    span ends. Without an exporter spans are still timed, so responses can
+    carry a breakdown, but nothing is kept.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block as a child of the current span (or as a new trace)"""
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            _current_span.reset(token)
+            span._finished.append(span)
+            if parent is None:
+                self._export(span)
+
+    def traced(self, name: str):
+        """Decorator recording each call of a sync or async function as a span"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _export(self, root: Span):
+        if not self.exporter:
+            return
+        try:
+            self.exporter.export(sorted(root._finished, key=lambda s: s.start_ns))
+        except Exception as e:
+            logger.warning("Trace export failed: %s", e)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost open span in this task, if any"""
+    return _current_span.get()
+
+
+def timings_requested(context: Dict = None) -> bool:
+    """Whether a response should carry its turn's timing breakdown"""
+    return RESPONSE_TIMINGS or bool((context or {}).get('trace'))
+
+
+def _default_exporter():
+    if DEFAULT_EXPORTER == "file":
+        return FileExporter(DEFAULT_TRACE_FILE)
+    if DEFAULT_EXPORTER == "memory":
+        return RingBufferExporter(DEFAULT_BUFFER_SIZE)
+    return None
+
+
+# Global tracer instance
+tracer = Tracer(_default_exporter())
+traced = tracer.traced
@@ -2,24 +2,48 @@
 Z2Data API Client - Comprehensive implementation for all Z2Data endpoints
 """
 import os
+import time
 import httpx
 import json
 from typing import Dict, Any, List, Optional
 from urllib.parse import quote
 import logging
 from datetime import datetime, timedelta
+from manufacturer_index import manufacturer_index
+from mpn_recognizer import extract_mpn
+from tracing import traced
+from metrics import z2data_latency
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_GATEWAY_URL = "https://gateway.z2data.com"
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Records gateway latency per endpoint and status (error when no response arrived)"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await super().handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            z2data_latency.labels(endpoint=request.url.path, status=status).observe(time.perf_counter() - started)
+
+
 class Z2DataClient:
     """Comprehensive client for all Z2Data API operations"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None):
         self.api_key = api_key or os.getenv("Z2_API_KEY", "AyxfLYocWpE5HNG")
-        self.base_url = "https://gateway.z2data.com"
+        # Point Z2_GATEWAY_URL at a mock gateway for load tests
+        self.base_url = (base_url or os.getenv("Z2_GATEWAY_URL", DEFAULT_GATEWAY_URL)).rstrip('/')
 
     # ==================== PART OPERATIONS ====================
 
+    @traced("z2data.validate_part")
     async def validate_part(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
         """Validate a part and get its part ID using GetValidationPart endpoint"""
         if not part_number:
@@ -36,7 +60,7 @@ class Z2DataClient:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.post(
                     f"{self.base_url}/GetValidationPart?ApiKey={self.api_key}",
                     json=validation_payload,
@@ -52,11 +76,14 @@ class Z2DataClient:
 
                     # Check if we actually found a valid part
                     if part_id and part_id > 0:
+                        validated_manufacturer = part_info.get("z2PartData", {}).get("companyName")
+                        if manufacturer:
+                            manufacturer_index.learn(manufacturer, validated_manufacturer)
                         return {
                             "success": True,
                             "part_id": part_id,
                             "validated_mpn": part_info.get("mpn"),
-                            "validated_manufacturer": part_info.get("z2PartData", {}).get("companyName"),
+                            "validated_manufacturer": validated_manufacturer,
                             "raw_data": part_info
                         }
                     else:
@@ -74,26 +101,28 @@ class Z2DataClient:
                     return {"success": False, "error": f"Part {part_number} not found"}
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error validating part: {e}")
+            logger.error("HTTP error validating part: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error validating part: {e}")
+            logger.error("Error validating part: %s", e)
             return {"success": False, "error": str(e)}
 
-    async def get_part_details(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
-        """Get comprehensive part details using two-step process"""
-        # Step 1: Validate and get part ID
-        validation_result = await self.validate_part(part_number, manufacturer)
-        if not validation_result.get("success"):
-            return validation_result
+    @traced("z2data.get_part_details")
+    async def get_part_details(self, part_number: str, manufacturer: str = "", part_id: int = None) -> Dict[str, Any]:
+        """Get comprehensive part details using two-step process (pass part_id to skip step 1)"""
+        # Step 1: Validate and get part ID (skipped when the caller already resolved it)
+        if part_id is None:
+            validation_result = await self.validate_part(part_number, manufacturer)
+            if not validation_result.get("success"):
+                return validation_result
 
-        part_id = validation_result.get("part_id")
-        if not part_id:
-            return {"success": False, "error": "Could not obtain part ID"}
+            part_id = validation_result.get("part_id")
+            if not part_id:
+                return {"success": False, "error": "Could not obtain part ID"}
 
         # Step 2: Get full details
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetPartDetailsBypartID?ApiKey={self.api_key}&partId={part_id}",
                     timeout=30.0
@@ -101,7 +130,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got part details for {part_number} with sections: {list(data.get('results', {}).keys())}")
+                logger.debug("Got part details for %s with sections: %s", part_number, list(data.get('results', {}).keys()))
 
                 return {
                     "type": "part_details",
@@ -112,30 +141,20 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting part details: {e}")
+            logger.error("HTTP error getting part details: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting part details: {e}")
+            logger.error("Error getting part details: %s", e)
             return {"success": False, "error": str(e)}
 
+    @traced("z2data.search_parts")
     async def search_parts(self, query: str, manufacturer: str = None) -> Dict[str, Any]:
         """Search for parts using appropriate method based on whether manufacturer is provided"""
-        import re
-        from urllib.parse import quote
-
         # Extract part number from query (handle various formats)
         # Examples: "search BAV99", "BAV99", "search for LM317"
-        cleaned_query = re.sub(r'(search|for|find)\s+', '', query, flags=re.IGNORECASE)
-        cleaned_query = cleaned_query.strip()
-
-        # Try to extract a part number (alphanumeric with optional dashes/dots)
-        part_match = re.search(r'([A-Z0-9][A-Z0-9\-\.]+)', cleaned_query, re.IGNORECASE)
-        if part_match:
-            part_number = part_match.group(1)
-        else:
-            part_number = cleaned_query
+        part_number = extract_mpn(query) or query.strip()
 
-        logger.info(f"Searching for part: {part_number} from query: {query}, manufacturer: {manufacturer}")
+        logger.debug("Searching for part: %s from query: %s, manufacturer: %s", part_number, query, manufacturer)
 
         # If we have a manufacturer, use the two-step process
         if manufacturer:
@@ -157,10 +176,10 @@ class Z2DataClient:
                 }
 
         # No manufacturer - use GetPartDetailsBySearch for broader search
-        logger.info(f"No manufacturer provided, using GetPartDetailsBySearch for {part_number}")
+        logger.debug("No manufacturer provided, using GetPartDetailsBySearch for %s", part_number)
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetPartDetailsBySearch?ApiKey={self.api_key}&Z2MPN={quote(part_number)}",
                     timeout=30.0
@@ -199,31 +218,33 @@ class Z2DataClient:
                     }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error searching parts: {e}")
+            logger.error("HTTP error searching parts: %s", e)
             return {"type": "search_results", "success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error searching parts: {e}")
+            logger.error("Error searching parts: %s", e)
             return {"type": "search_results", "success": False, "error": str(e)}
 
     # ==================== MARKET AVAILABILITY ====================
 
-    async def get_market_availability(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
-        """Get market availability and pricing data"""
-        # First validate the part
-        validation_result = await self.validate_part(part_number, manufacturer)
-        if not validation_result.get("success"):
-            return validation_result
+    @traced("z2data.get_market_availability")
+    async def get_market_availability(self, part_number: str, manufacturer: str = "", part_id: int = None) -> Dict[str, Any]:
+        """Get market availability and pricing data (pass part_id to skip validation)"""
+        if part_id is None:
+            # First validate the part
+            validation_result = await self.validate_part(part_number, manufacturer)
+            if not validation_result.get("success"):
+                return validation_result
 
-        # Get the part ID from validation result
-        part_id = validation_result.get("part_id")
-        if not part_id:
-            return {"success": False, "error": "Could not obtain part ID"}
+            # Get the part ID from validation result
+            part_id = validation_result.get("part_id")
+            if not part_id:
+                return {"success": False, "error": "Could not obtain part ID"}
 
         # MarketAvailability API expects just an array of part IDs
         part_ids = [part_id]
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.post(
                     f"{self.base_url}/MarketAvailability?ApiKey={self.api_key}",
                     json=part_ids,  # Send just the array of part IDs
@@ -233,7 +254,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got market availability for {part_number}")
+                logger.debug("Got market availability for %s", part_number)
 
                 # MarketAvailability API returns an array directly
                 market_data = data if isinstance(data, list) else data.get("results", [])
@@ -247,27 +268,29 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting market availability: {e}")
+            logger.error("HTTP error getting market availability: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting market availability: {e}")
+            logger.error("Error getting market availability: %s", e)
             return {"success": False, "error": str(e)}
 
     # ==================== CROSS REFERENCES ====================
 
-    async def get_cross_references(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
-        """Get cross reference parts"""
-        # First validate and get part ID
-        validation_result = await self.validate_part(part_number, manufacturer)
-        if not validation_result.get("success"):
-            return validation_result
+    @traced("z2data.get_cross_references")
+    async def get_cross_references(self, part_number: str, manufacturer: str = "", part_id: int = None) -> Dict[str, Any]:
+        """Get cross reference parts (pass part_id to skip validation)"""
+        if part_id is None:
+            # First validate and get part ID
+            validation_result = await self.validate_part(part_number, manufacturer)
+            if not validation_result.get("success"):
+                return validation_result
 
-        part_id = validation_result.get("part_id")
-        if not part_id:
-            return {"success": False, "error": "Could not obtain part ID"}
+            part_id = validation_result.get("part_id")
+            if not part_id:
+                return {"success": False, "error": "Could not obtain part ID"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetCrossDataByPartId?ApiKey={self.api_key}&PartID={part_id}",
                     timeout=30.0
@@ -275,7 +298,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got cross references for {part_number}")
+                logger.debug("Got cross references for %s", part_number)
 
                 return {
                     "type": "cross_references",
@@ -286,21 +309,22 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting cross references: {e}")
+            logger.error("HTTP error getting cross references: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting cross references: {e}")
+            logger.error("Error getting cross references: %s", e)
             return {"success": False, "error": str(e)}
 
     # ==================== COMPANY OPERATIONS ====================
 
+    @traced("z2data.validate_company")
     async def validate_company(self, company_name: str) -> Dict[str, Any]:
         """Validate a company and get its company ID"""
         if not company_name:
             return {"success": False, "error": "Company name is required"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/CompanyValidation?APIkey={self.api_key}&CompanySearch={quote(company_name)}",
                     timeout=30.0
@@ -310,6 +334,7 @@ class Z2DataClient:
 
                 if data.get("results") and len(data["results"]) > 0:
                     company_info = data["results"][0]
+                    manufacturer_index.learn(company_name, company_info.get("CompanyName"))
                     return {
                         "success": True,
                         "company_id": company_info.get("CompanyID"),
@@ -320,12 +345,13 @@ class Z2DataClient:
                     return {"success": False, "error": f"Company {company_name} not found"}
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error validating company: {e}")
+            logger.error("HTTP error validating company: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error validating company: {e}")
+            logger.error("Error validating company: %s", e)
             return {"success": False, "error": str(e)}
 
+    @traced("z2data.get_company_details")
     async def get_company_details(self, company_name: str) -> Dict[str, Any]:
         """Get detailed company information"""
         # First validate and get company ID
@@ -338,7 +364,7 @@ class Z2DataClient:
             return {"success": False, "error": "Could not obtain company ID"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetCompanyDataDetailsByCompanyID?ApiKey={self.api_key}&CompanyID={company_id}",
                     timeout=30.0
@@ -346,7 +372,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got company details for {company_name}")
+                logger.debug("Got company details for %s", company_name)
 
                 return {
                     "type": "company_details",
@@ -356,12 +382,13 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting company details: {e}")
+            logger.error("HTTP error getting company details: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting company details: {e}")
+            logger.error("Error getting company details: %s", e)
             return {"success": False, "error": str(e)}
 
+    @traced("z2data.get_company_litigations")
     async def get_company_litigations(self, company_name: str) -> Dict[str, Any]:
         """Get company litigation information"""
         # First validate and get company ID
@@ -374,7 +401,7 @@ class Z2DataClient:
             return {"success": False, "error": "Could not obtain company ID"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetCompanyLitigationsByCompanyID?ApiKey={self.api_key}&CompanyID={company_id}",
                     timeout=30.0
@@ -382,7 +409,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got litigation data for {company_name}")
+                logger.debug("Got litigation data for %s", company_name)
 
                 return {
                     "type": "company_litigations",
@@ -392,12 +419,13 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting company litigations: {e}")
+            logger.error("HTTP error getting company litigations: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting company litigations: {e}")
+            logger.error("Error getting company litigations: %s", e)
             return {"success": False, "error": str(e)}
 
+    @traced("z2data.get_company_supply_chain")
     async def get_company_supply_chain(self, company_name: str) -> Dict[str, Any]:
         """Get company supply chain information"""
         # First validate and get company ID
@@ -410,7 +438,7 @@ class Z2DataClient:
             return {"success": False, "error": "Could not obtain company ID"}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetCompanySupplyChainByCompanyID?ApiKey={self.api_key}&CompanyID={company_id}",
                     timeout=30.0
@@ -418,7 +446,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got supply chain data for {company_name}")
+                logger.debug("Got supply chain data for %s", company_name)
 
                 return {
                     "type": "supply_chain",
@@ -428,21 +456,22 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting supply chain: {e}")
+            logger.error("HTTP error getting supply chain: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting supply chain: {e}")
+            logger.error("Error getting supply chain: %s", e)
             return {"success": False, "error": str(e)}
 
     # ==================== SUPPLY CHAIN EVENTS ====================
 
+    @traced("z2data.get_supply_chain_events")
     async def get_supply_chain_events(self, days_back: int = 30) -> Dict[str, Any]:
         """Get recent supply chain events"""
         event_date_to = datetime.now().strftime("%Y-%m-%d")
         event_date_from = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%d")
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
                 response = await client.get(
                     f"{self.base_url}/GetAllEventsGrouped?ApiKey={self.api_key}&EventDateFrom={quote(event_date_from)}&EventDateTo={quote(event_date_to)}&From=0&Size=10",
                     timeout=30.0
@@ -450,7 +479,7 @@ class Z2DataClient:
                 response.raise_for_status()
                 data = response.json()
 
-                logger.info(f"Got supply chain events from {event_date_from} to {event_date_to}")
+                logger.debug("Got supply chain events from %s to %s", event_date_from, event_date_to)
 
                 return {
                     "type": "supply_chain_events",
@@ -461,17 +490,18 @@ class Z2DataClient:
                 }
 
         except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error getting supply chain events: {e}")
+            logger.error("HTTP error getting supply chain events: %s", e)
             return {"success": False, "error": f"API error: {e.response.status_code}"}
         except Exception as e:
-            logger.error(f"Error getting supply chain events: {e}")
+            logger.error("Error getting supply chain events: %s", e)
             return {"success": False, "error": str(e)}
 
     # ==================== COMPLIANCE OPERATIONS ====================
 
-    async def get_compliance_data(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
+    @traced("z2data.get_compliance_data")
+    async def get_compliance_data(self, part_number: str, manufacturer: str = "", part_id: int = None) -> Dict[str, Any]:
         """Get compliance data from part details"""
-        result = await self.get_part_details(part_number, manufacturer)
+        result = await self.get_part_details(part_number, manufacturer, part_id=part_id)
 
         if result.get("success") and result.get("data"):
             compliance_data = result["data"].get("ComplianceDetails", {})
@@ -486,6 +516,7 @@ class Z2DataClient:
 
         return result
 
+    @traced("z2data.check_rohs_compliance")
     async def check_rohs_compliance(self, part_number: str, manufacturer: str = "") -> Dict[str, Any]:
         """Check RoHS compliance status"""
         result = await self.get_compliance_data(part_number, manufacturer)
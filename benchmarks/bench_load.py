@@ -0,0 +1,296 @@
+"""
+End-to-end WebSocket load test against a local mock Z2Data gateway
+
+Starts benchmarks/mock_gateway.py and the backend (benchmarks/serve_app.py,
+with deterministic fake LLMs) as subprocesses, then drives chat, data and
+BOM-enrichment workloads over WebSockets from concurrent clients. For each
+scenario it reports throughput, p50/p95/p99 turn latency (send to final
+response frame) and the backend's peak RSS during the scenario.
+
+--record saves the results as a baseline; --compare checks a run against one
+and exits non-zero when p95/p99 latency or peak memory grow, or throughput
+drops, by more than --tolerance.
+
+Usage: python benchmarks/bench_load.py [--scenarios chat,data,bom] [--clients 8] [--turns 10]
+                                       [--gateway-latency-ms 50] [--llm-latency-ms 20] [--error-rate 0]
+                                       [--record baseline.json | --compare baseline.json]
+"""
+import sys
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import platform
+import subprocess
+from typing import Dict, Any, List
+
+import httpx
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TURN_TIMEOUT = 120  # Seconds before a turn counts as failed
+TERMINAL_FRAMES = {"response", "error", "cancelled"}  # Frame types that end a turn
+
+SCENARIOS = {
+    "chat": [
+        "hello, how are you?",
+        "explain how a buck converter works",
+        "thanks, that helps",
+    ],
+    "data": [
+        "search for LM317",
+        "market availability for BAV99",
+        "lifecycle status of TPS62840 Texas Instruments",
+        "cross references for LM317 Texas Instruments",
+        "toshiba litigations",
+    ],
+    "bom": [
+        "enrich this BOM with lifecycle status and market availability",
+    ],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of unsorted values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, duration: float, peak_rss_kb: int) -> Dict[str, Any]:
+    """Scenario result from per-turn latencies in seconds"""
+    turns = len(latencies) + errors
+    return {
+        "turns": turns,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+    }
+
+
+# Metric, and whether a higher value is a regression
+COMPARED_METRICS = (("throughput", False), ("p95_ms", True), ("p99_ms", True), ("peak_rss_mb", True))
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print each metric against the baseline and return the regressions"""
+    regressions = []
+    for scenario, current in results.items():
+        recorded = baseline.get("results", {}).get(scenario)
+        if not recorded:
+            print(f"{scenario}: no baseline")
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            before, after = recorded[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"{scenario:<6} {metric:<12} {before:>10} -> {after:>10} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f"{scenario} {metric} {change:+.1%}")
+    return regressions
+
+
+def read_peak_rss_kb(pid: int) -> int:
+    """Peak RSS of a process since the last reset (VmHWM)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak_rss(pid: int):
+    """Start a new VmHWM window; unsupported kernels keep the lifetime peak"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def write_bom(path: str, rows: int, distinct_parts: int):
+    """Synthetic BOM with repeated parts, a few unknown to the gateway"""
+    with open(path, 'w') as f:
+        f.write("Part Number,Manufacturer,Quantity\n")
+        for i in range(rows):
+            part = i % distinct_parts
+            mpn = f"UNKNOWN{part}" if part % 20 == 19 else f"BENCH{part:05d}"
+            f.write(f"{mpn},Texas Instruments,{i % 10 + 1}\n")
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+async def run_client(url: str, payloads: List[Dict[str, Any]], turns: int, latencies: List[float], failures: List[str]):
+    """One conversation sending turns sequentially, each timed until the frame that ends it"""
+    async with websockets.connect(url, max_size=None) as ws:
+        for turn in range(turns):
+            payload = {**payloads[turn % len(payloads)], "turn_id": str(turn)}
+            started = time.perf_counter()
+            try:
+                await ws.send(json.dumps(payload))
+                while True:
+                    frame = json.loads(await asyncio.wait_for(ws.recv(), TURN_TIMEOUT))
+                    # A turn ends with its response, or with an error or cancelled frame
+                    turn_id = frame.get("turn_id", frame.get("metadata", {}).get("turn_id"))
+                    if frame.get("type") in TERMINAL_FRAMES and turn_id == payload["turn_id"]:
+                        break
+            except (asyncio.TimeoutError, websockets.ConnectionClosed) as e:
+                failures.append(f"{type(e).__name__}")
+                return
+            if frame.get("type") != "response":
+                failures.append(f"{frame['type']}: {str(frame.get('content'))[:200]}")
+            elif frame.get("agent_type") == "error":
+                failures.append(str(frame.get("content"))[:200])
+            else:
+                latencies.append(time.perf_counter() - started)
+
+
+async def run_scenario(name: str, base_url: str, app_pid: int, args, context: Dict[str, Any]) -> Dict[str, Any]:
+    payloads = [{"content": content, "context": dict(context)} for content in SCENARIOS[name]]
+    ws_url = base_url.replace("http://", "ws://")
+    latencies: List[float] = []
+    failures: List[str] = []
+
+    reset_peak_rss(app_pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(f"{ws_url}/ws/bench-{name}-{client}", payloads, args.turns, latencies, failures)
+        for client in range(args.clients)
+    ))
+    duration = time.perf_counter() - started
+
+    result = summarize(latencies, len(failures), duration, read_peak_rss_kb(app_pid))
+    if failures:
+        result["sample_errors"] = sorted(set(failures))[:3]
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    gateway_port, app_port = free_port(), free_port()
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    env = {
+        **os.environ,
+        "Z2_GATEWAY_URL": f"http://127.0.0.1:{gateway_port}",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_STORE_DIR": os.path.join(workdir, "uploads"),
+        "TRACE_EXPORTER": "memory",
+    }
+    for key in ("ANTHROPIC_API_KEY", "OPENAI_API_KEY"):
+        env.pop(key, None)
+
+    gateway = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "mock_gateway.py"), "--port", str(gateway_port),
+        "--latency-ms", str(args.gateway_latency_ms), "--jitter-ms", str(args.gateway_jitter_ms),
+        "--error-rate", str(args.error_rate), "--seed", str(args.seed)
+    ], env=env)
+    backend = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "serve_app.py"), "--port", str(app_port),
+        "--llm-latency-ms", str(args.llm_latency_ms)
+    ], env=env, cwd=workdir)
+
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{gateway_port}/_stats", gateway)
+        await wait_until_ready(f"{base_url}/", backend)
+
+        results = {}
+        for name in args.scenarios:
+            context = {}
+            if name == "bom":
+                bom_path = os.path.join(workdir, "bom.csv")
+                write_bom(bom_path, args.bom_rows, args.bom_parts)
+                async with httpx.AsyncClient() as client:
+                    with open(bom_path, 'rb') as f:
+                        upload = (await client.post(f"{base_url}/api/upload",
+                                                    files={"file": ("bom.csv", f, "text/csv")}, timeout=60)).json()
+                context = {"upload_id": upload["upload_id"]}
+            results[name] = await run_scenario(name, base_url, backend.pid, args, context)
+            print(f"{name:<6} {json.dumps(results[name])}")
+
+        async with httpx.AsyncClient() as client:
+            gateway_stats = (await client.get(f"http://127.0.0.1:{gateway_port}/_stats")).json()
+        return {"results": results, "gateway": gateway_stats}
+    finally:
+        for process in (backend, gateway):
+            process.terminate()
+        for process in (backend, gateway):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default="chat,data,bom")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent WebSocket conversations")
+    parser.add_argument("--turns", type=int, default=10, help="messages per conversation")
+    parser.add_argument("--gateway-latency-ms", type=float, default=50.0)
+    parser.add_argument("--gateway-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=20.0)
+    parser.add_argument("--bom-rows", type=int, default=500)
+    parser.add_argument("--bom-parts", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--record", help="save the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = {key: value for key, value in vars(args).items() if key not in ("record", "compare", "tolerance")}
+    report = {
+        "config": config,
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        **asyncio.run(run(args)),
+    }
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.record}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with different settings")
+        regressions = compare(report["results"], baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {'; '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
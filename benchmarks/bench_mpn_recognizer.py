@@ -0,0 +1,77 @@
+"""
+Throughput benchmark for the shared MPN recognizer
+
+Compares extract_mpn against the per-call-site inline regexes it replaced,
+on a synthetic mix of part queries and queries without a part number.
+
+Usage: python benchmarks/bench_mpn_recognizer.py [queries]
+"""
+import sys
+import os
+import time
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mpn_recognizer import extract_mpn
+
+PARTS = ["LM317", "LM317-W", "BAV99", "TPS62840", "STM32F103C8T6", "1N4148", "GRM188R71H104KA93D",
+         "LT1763CS8-3.3#TRPBF", "ATMEGA328P-PU", "SN74HC595N", "2N2222"]
+TEMPLATES = ["{part}", "search for {part}", "{part} ti", "cross references for {part} Texas Instruments",
+             "What is the lifecycle of {part}?", "{part} market availability", "price of {part} 10000 pcs"]
+NO_PART = ["toshiba litigations", "Intel company details", "top 5 suppliers in 2024",
+           "10uF 0805 capacitor 16V", "supply chain locations for NXP"]
+
+
+def make_queries(count: int, seed: int = 42):
+    """Build a synthetic query log, one in five without a part number"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            queries.append(rng.choice(NO_PART))
+        else:
+            queries.append(rng.choice(TEMPLATES).format(part=rng.choice(PARTS)))
+    return queries
+
+
+def legacy_registry(query):
+    """The MCPRegistry fallback regex, compiled on every call"""
+    import re
+    match = re.search(r'\b([A-Z]{2,}[0-9]+(?:[-][A-Z0-9]+)*)\b', query, re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+
+def legacy_client(query):
+    """The Z2DataClient.search_parts regex, compiled on every call"""
+    import re
+    cleaned = re.sub(r'(search|for|find)\s+', '', query, flags=re.IGNORECASE).strip()
+    match = re.search(r'([A-Z0-9][A-Z0-9\-\.]+)', cleaned, re.IGNORECASE)
+    return match.group(1) if match else cleaned
+
+
+def throughput(func, queries, repeat: int = 3) -> float:
+    """Best-of-N queries per second"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            func(query)
+        best = min(best, time.perf_counter() - start)
+    return len(queries) / best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    queries = make_queries(count)
+
+    print(f"queries:                   {count}")
+    print(f"extract_mpn:               {throughput(extract_mpn, queries):,.0f} queries/s")
+    print(f"legacy registry regex:     {throughput(legacy_registry, queries):,.0f} queries/s")
+    print(f"legacy client regex:       {throughput(legacy_client, queries):,.0f} queries/s")
+
+    disagreements = sum(1 for q in queries if legacy_registry(q) != legacy_client(q))
+    print(f"legacy call sites disagree on {disagreements / count:.0%} of queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-execution latency of the code sandbox
+
+Compares the warm worker pool against starting a fresh interpreter for
+every snippet (SANDBOX_POOL_SIZE=0 behaviour), and against re-running a
+deterministic snippet whose result is memoized. Also times a pandas
+aggregation over a memory-mapped 100k-row BOM dataset.
+
+Usage: python benchmarks/bench_sandbox.py [executions]
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import statistics
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from code_sandbox import SimpleSandbox
+from dataset_store import DatasetStore
+
+SNIPPET = "print(statistics.mean(random.random() for _ in range(1000)))"
+DETERMINISTIC_SNIPPET = "print(statistics.mean(i * i for i in range(1000)))"
+DATASET_SNIPPET = "print(df.groupby('Manufacturer')['MPN'].nunique().sort_values().tail(3))"
+DATASET_ROWS = 100000
+
+
+def build_dataset(root: str) -> str:
+    """Store a synthetic BOM and return its Arrow IPC path"""
+    store = DatasetStore(root=root)
+    source = os.path.join(root, "bom.csv")
+    with open(source, 'w') as f:
+        f.write("MPN,Manufacturer,Qty\n")
+        for i in range(DATASET_ROWS):
+            f.write(f"PART-{i % 20000},MFR-{i % 37},{i}\n")
+    store.ingest_file("b" * 32, source, "bom.csv")
+    return store.export_arrow("b" * 32)
+
+
+async def measure(sandbox: SimpleSandbox, executions: int, code: str = SNIPPET, **options):
+    """Latencies in milliseconds for sequential executions"""
+    latencies = []
+    for _ in range(executions):
+        start = time.perf_counter()
+        result = await sandbox.execute(code, **options)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert result["success"], result
+    return latencies
+
+
+def report(name: str, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<22} median {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+async def main():
+    executions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    pooled = SimpleSandbox(pool_size=2)
+    await pooled.execute("pass")  # Let the pool warm up
+    report("warm worker pool", await measure(pooled, executions))
+    report("memoized re-run", await measure(pooled, executions, DETERMINISTIC_SNIPPET))
+    with tempfile.TemporaryDirectory() as root:
+        dataset = build_dataset(root)
+        report(f"{DATASET_ROWS // 1000}k-row dataset", await measure(
+            pooled, max(10, executions // 10), DATASET_SNIPPET, use_cache=False, dataset=dataset
+        ))
+    await pooled.pool.close()
+
+    fresh = SimpleSandbox(pool_size=0)
+    report("fresh interpreter", await measure(fresh, max(10, executions // 10)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Benchmark for per-turn JSON encoding of large enrichment tables
+
+Times each stage a table response goes through: the WebSocket frame, the
+Message.content column, the meta_data column and the history decode on the
+next turn. The previous path encodes the table once for the socket and again
+for the database with the stdlib; ResponseFrame encodes it once, with orjson
+when installed.
+
+Usage: python benchmarks/bench_serialization.py [rows]
+"""
+import sys
+import os
+import json
+import time
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import serialization
+from serialization import ResponseFrame
+
+
+def make_response(rows: int, seed: int = 42):
+    """An enrichment table the shape DataAgent returns"""
+    rng = random.Random(seed)
+    data = [{
+        "Part Number": f"PN{rng.randint(10000, 99999)}",
+        "Manufacturer": rng.choice(["Texas Instruments", "Murata", "Vishay", "Analog Devices"]),
+        "Quantity": rng.randint(1, 100),
+        "Lifecycle Status": rng.choice(["Active", "NRND", "Obsolete"]),
+        "RoHS Status": "RoHS Compliant",
+        "Stock": f"{rng.randint(0, 50000):,} in stock",
+        "Price": f"${rng.random() * 10:.2f}",
+        "Lead Time": f"{rng.randint(1, 26)} weeks",
+        "Description": "Ceramic capacitor 10uF ±10% 25V X5R 0805",
+    } for _ in range(rows)]
+    content = {"type": "table", "title": f"Enriched Data ({rows}/{rows} parts enriched)", "data": data}
+    metadata = {"intent": "bom_enrichment", "rows": rows, "timings": {"spans": [{"name": "agent.data"}] * 20}}
+    return content, metadata
+
+
+def legacy_turn(content, metadata):
+    """send_json, json.dumps for Message.content, JSON column, history json.loads"""
+    frame = json.dumps({"type": "response", "content": content, "agent_type": "data", "metadata": metadata},
+                       separators=(",", ":"), ensure_ascii=False)
+    stored = json.dumps(content)
+    meta = json.dumps(metadata)
+    history = json.loads(stored)
+    return frame, meta, history
+
+
+def frame_turn(content, metadata):
+    response = ResponseFrame(content, "data", metadata)
+    stored = response.stored_content
+    meta = serialization.dumps(response.metadata)
+    frame = response.encode()
+    history = serialization.loads(stored)
+    return frame, meta, history
+
+
+def stage_times(content, metadata, repeat: int = 5):
+    """Best-of-N milliseconds per stage for both paths"""
+    def best(func, *args):
+        elapsed = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        return elapsed * 1000
+
+    legacy_frame = {"type": "response", "content": content, "agent_type": "data", "metadata": metadata}
+    stored = json.dumps(content)
+    return [
+        ("socket frame", best(lambda: json.dumps(legacy_frame, separators=(",", ":"), ensure_ascii=False)),
+         best(lambda: ResponseFrame(content, "data", metadata).encode())),
+        ("message content", best(json.dumps, content), 0.0),  # Reused from the frame encoding
+        ("meta_data column", best(json.dumps, metadata), best(serialization.dumps, metadata)),
+        ("history decode", best(json.loads, stored), best(serialization.loads, stored)),
+        ("whole turn", best(legacy_turn, content, metadata), best(frame_turn, content, metadata)),
+    ]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    content, metadata = make_response(rows)
+
+    legacy, current = legacy_turn(content, metadata), frame_turn(content, metadata)
+    assert json.loads(legacy[0]) == json.loads(current[0]), "frames differ"
+    assert legacy[2] == current[2], "decoded history differs"
+
+    print(f"{rows} row table, {len(legacy[0]) / 1024:.0f} KB frame, encoder: {serialization.BACKEND}")
+    print(f"{'stage':<18}{'stdlib x2':>12}{'encode once':>14}")
+    for stage, before, after in stage_times(content, metadata):
+        print(f"{stage:<18}{before:>10.2f}ms{after:>12.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Microbenchmark for MCP tool selection
+
+Replays a query log through MCPRegistry.analyze_query and through the
+previous linear _score_tool cascade, and counts how often each one would
+call the GPT-5 nano extractor. No network or LLM calls are made.
+
+Usage: python benchmarks/bench_tool_selection.py [query_log] [repeat]
+"""
+import sys
+import os
+import time
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mcp_registry import MCPRegistry
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), 'data', 'query_log.txt')
+
+
+class CountingLLM:
+    """Stands in for GPT-5 nano: counts calls and extracts nothing"""
+
+    class Response:
+        content = "{}"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return self.Response()
+
+
+def load_queries(path: str):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def legacy_score_tool(tool, query_lower, params):
+    """The per-tool substring cascade analyze_query used before the keyword index"""
+    score = 0.0
+    for keyword in tool['keywords']:
+        if keyword in query_lower:
+            score += 2.0
+
+    has_required = True
+    for req in tool.get('requires', []):
+        if req == 'company' and not params['company']:
+            if not params.get('manufacturer'):
+                has_required = False
+        elif req == 'part_number' and not params['part_number']:
+            has_required = False
+        elif req == 'manufacturer' and not params['manufacturer']:
+            if tool['name'] in ['Part_Details', 'Cross_References']:
+                has_required = False
+    if not has_required:
+        return 0.0
+
+    name = tool['name']
+    if 'cross reference' in query_lower and name == 'Cross_References':
+        score += 15.0
+    if 'alternative' in query_lower and name == 'Cross_References':
+        score += 10.0
+    if 'replacement' in query_lower and name == 'Cross_References':
+        score += 10.0
+    if 'litigation' in query_lower and name == 'Company_Litigations':
+        score += 10.0
+    if 'company' in query_lower and 'details' in query_lower and name == 'Company_Details':
+        score += 8.0
+    if 'supply chain' in query_lower:
+        if 'location' in query_lower and name == 'Supply_Chain_Locations':
+            score += 8.0
+        elif 'event' in query_lower and name == 'Supply_Chain_Events':
+            score += 8.0
+    if 'digikey' in query_lower and name == 'Digikey_Stock':
+        score += 10.0
+    if any(word in query_lower for word in ['rohs', 'reach', 'compliance']) and name == 'Compliance_Data':
+        score += 8.0
+    if params['part_number'] and params['manufacturer'] and name == 'Part_Details':
+        score += 3.0
+    if params['part_number'] and not params['manufacturer'] and name == 'Part_Search':
+        score += 2.0
+    return score
+
+
+async def legacy_analyze(registry, query):
+    """Previous flow: always extract with the LLM, then score every tool"""
+    query_lower = query.lower()
+    parameters = await registry._llm_extraction(query, registry._simple_extraction_fallback(query))
+    best_tool, best_score = None, 0
+    for tool in registry.tools:
+        score = legacy_score_tool(tool, query_lower, parameters)
+        if score > best_score:
+            best_tool, best_score = tool, score
+    return best_tool, best_score
+
+
+async def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LOG
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    queries = load_queries(path)
+
+    import logging
+    logging.disable(logging.INFO)
+
+    registry = MCPRegistry()
+
+    registry.llm = CountingLLM()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            await registry.analyze_query(query)
+    indexed = time.perf_counter() - start
+    indexed_calls = registry.llm.calls // repeat
+
+    registry.llm = CountingLLM()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            await legacy_analyze(registry, query)
+    legacy = time.perf_counter() - start
+    legacy_calls = registry.llm.calls // repeat
+
+    registry.llm = None
+    changed = []
+    for query in queries:
+        analysis = await registry.analyze_query(query)
+        old_tool, old_score = await legacy_analyze(registry, query)
+        if (analysis['tool'] and analysis['tool']['name']) != (old_tool and old_tool['name']):
+            changed.append(query)
+
+    total = len(queries) * repeat
+    print(f"queries:                   {len(queries)} x {repeat}")
+    print(f"indexed selection:         {indexed / total * 1e6:.1f} us/query (excluding LLM latency)")
+    print(f"legacy linear scoring:     {legacy / total * 1e6:.1f} us/query (excluding LLM latency)")
+    print(f"LLM extractions, indexed:  {indexed_calls}")
+    print(f"LLM extractions, legacy:   {legacy_calls}")
+    print(f"tool choice changed for:   {changed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Deterministic stand-ins for the agents' LangChain chat models
+
+Each fake answers from fixed rules for one role (routing, parameter
+extraction, query analysis, code generation, chat), so a load test exercises
+the same agent paths on every run without API keys. invoke() sleeps
+synchronously like a blocking SDK call; ainvoke() awaits the same delay.
+
+install(orchestrator, latency_ms) swaps them into a SimpleAgentOrchestrator.
+"""
+import sys
+import os
+import re
+import json
+import time
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mpn_recognizer import extract_mpn
+from manufacturer_index import manufacturer_index
+
+DATA_WORDS = ('part', 'bom', 'enrich', 'lifecycle', 'market', 'availability', 'manufacturer',
+              'litigation', 'company', 'supply chain', 'compliance', 'rohs', 'cross reference')
+CODE_WORDS = ('code', 'python', 'script', 'function', 'calculate', 'write', 'generate')
+QUERY_PATTERN = re.compile(r'^Query: "(.*)"$', re.MULTILINE)
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+
+
+def _last_message(messages) -> str:
+    """The user's text, from a string, LangChain messages or role dicts"""
+    if isinstance(messages, str):
+        return messages
+    last = messages[-1]
+    return str(last.get("content") if isinstance(last, dict) else getattr(last, "content", last))
+
+
+def route(message: str) -> str:
+    lowered = message.lower()
+    if any(word in lowered for word in DATA_WORDS) or extract_mpn(message) or manufacturer_index.find(message):
+        return "data"
+    if any(word in lowered for word in CODE_WORDS):
+        return "code"
+    return "chat"
+
+
+def extract_parameters(message: str) -> str:
+    return json.dumps({
+        "part_number": extract_mpn(message),
+        "manufacturer": manufacturer_index.find(message),
+        "company": None
+    })
+
+
+def analyze_query(message: str) -> str:
+    lowered = message.lower()
+    return json.dumps({
+        "part_number": extract_mpn(message),
+        "manufacturer": manufacturer_index.find(message),
+        "company_name": None,
+        "has_manufacturer": bool(manufacturer_index.find(message)),
+        "is_part_search": bool(extract_mpn(message)),
+        "is_market_query": any(word in lowered for word in ("market", "availability", "price")),
+        "is_bom_query": "bom" in lowered,
+        "is_enrichment_query": "enrich" in lowered,
+        "is_litigation_query": "litigation" in lowered,
+        "is_company_query": "company" in lowered,
+        "is_cross_reference_query": "cross" in lowered
+    })
+
+
+def generate_code(message: str) -> str:
+    size = sum(ord(c) for c in message) % 50 + 10
+    return f"Here is the code:\n```python\nvalues = [i * i for i in range({size})]\nprint(sum(values))\n```"
+
+
+def chat(message: str) -> str:
+    return f"Thanks for your message. You said: {message[:200]}"
+
+
+RESPONDERS = {
+    "router": route,
+    "extraction": extract_parameters,
+    "analysis": analyze_query,
+    "code": generate_code,
+    "chat": chat,
+}
+
+
+class FakeChatModel:
+    """Rule-based chat model for one role with a fixed response delay"""
+
+    def __init__(self, role: str, latency_ms: float = 0.0):
+        self.role = role
+        self.model = f"fake-{role}"
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._respond = RESPONDERS[role]
+
+    def _answer(self, messages) -> FakeResponse:
+        self.calls += 1
+        message = _last_message(messages)
+        if self.role == "analysis":
+            # The analysis prompt embeds the query in a template full of example part numbers
+            match = QUERY_PATTERN.search(message)
+            message = match.group(1) if match else message
+        return FakeResponse(self._respond(message))
+
+    def invoke(self, messages, **kwargs) -> FakeResponse:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return self._answer(messages)
+
+    async def ainvoke(self, messages, **kwargs) -> FakeResponse:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._answer(messages)
+
+
+def install(orchestrator, latency_ms: float = 0.0):
+    """Replace every agent's LLM with a fake for its role"""
+    orchestrator.router.llm = FakeChatModel("router", latency_ms)
+    orchestrator.data_agent.llm = FakeChatModel("analysis", latency_ms)
+    orchestrator.data_agent.mcp_registry.llm = FakeChatModel("extraction", latency_ms)
+    orchestrator.code_agent.llm = FakeChatModel("code", latency_ms)
+    orchestrator.chat_agent.llm = FakeChatModel("chat", latency_ms)
@@ -0,0 +1,191 @@
+"""
+Local mock of the Z2Data gateway for load tests
+
+Implements every endpoint z2data_client.py calls, with response shapes the
+client and the DataAgent formatters understand. Latency and error rate are
+configurable, and all randomness comes from one seeded generator, so a run
+with the same settings and request order is reproducible. Part numbers
+starting with UNKNOWN validate as "No Match".
+
+Usage: python benchmarks/mock_gateway.py [--port 8090] [--latency-ms 50]
+                                         [--jitter-ms 10] [--error-rate 0.01] [--seed 42]
+Then start the backend with Z2_GATEWAY_URL=http://127.0.0.1:8090
+"""
+import sys
+import zlib
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+MANUFACTURERS = ["Texas Instruments", "NXP Semiconductors", "Vishay", "Murata", "Analog Devices"]
+LIFECYCLES = ["Active", "Active", "Active", "NRND", "Obsolete"]
+
+
+def stable_id(text: str) -> int:
+    """Positive ID derived from a name, identical across runs and processes"""
+    return zlib.crc32(text.upper().encode()) % 9_000_000 + 1_000_000
+
+
+class MockGateway:
+    """Per-process gateway state: settings, the seeded generator and request counts"""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.errors = Counter()
+
+    async def respond(self, endpoint: str, body: Any):
+        """Simulated gateway delay, then either the body or an injected 503"""
+        self.requests[endpoint] += 1
+        delay = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            return JSONResponse({"error": "Service temporarily unavailable"}, status_code=503)
+        return JSONResponse(body)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "settings": {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+        }
+
+
+def part_record(mpn: str, manufacturer: str = "") -> Dict[str, Any]:
+    """One part with the fields the enrichment extractors look for"""
+    part_id = stable_id(mpn)
+    return {
+        "partID": part_id,
+        "MPN": mpn,
+        "Manufacturer": manufacturer or MANUFACTURERS[part_id % len(MANUFACTURERS)],
+        "LifecycleStatus": LIFECYCLES[part_id % len(LIFECYCLES)],
+        "RoHS": "RoHS Compliant" if part_id % 7 else "RoHS: No",
+        "Stock": f"{part_id % 50000:,} in stock",
+        "Price": f"${(part_id % 500) / 100 + 0.05:.2f}",
+        "LeadTime": f"{part_id % 26 + 1} weeks",
+    }
+
+
+def create_app(gateway: MockGateway) -> FastAPI:
+    app = FastAPI(title="Mock Z2Data gateway")
+
+    @app.post("/GetValidationPart")
+    async def validate_part(request: Request):
+        rows = (await request.json()).get("rows", [])
+        results = []
+        for row in rows:
+            mpn = row.get("mpn", "")
+            if not mpn or mpn.upper().startswith("UNKNOWN"):
+                results.append({"mpn": mpn, "z2PartData": {"partID": 0}, "matchStatus": "No Match",
+                                "matchReason": "MPN not found"})
+                continue
+            record = part_record(mpn, row.get("man", ""))
+            results.append({"mpn": mpn, "matchStatus": "Exact",
+                            "z2PartData": {"partID": record["partID"], "companyName": record["Manufacturer"]}})
+        return await gateway.respond("GetValidationPart", {"results": results})
+
+    @app.get("/GetPartDetailsBypartID")
+    async def part_details(partId: int):
+        mpn = f"Z2-{partId}"
+        record = part_record(mpn)
+        return await gateway.respond("GetPartDetailsBypartID", {"results": {
+            "MPNSummary": {"MPN": mpn, "Manufacturer": record["Manufacturer"],
+                           "Lifecycle": record["LifecycleStatus"], "Description": "Mock part"},
+            "ComplianceDetails": {"RoHSStatus": record["RoHS"], "REACHStatus": "Compliant"},
+            "MarketAvailabilitySummary": {"Stock": record["Stock"], "AveragePrice": record["Price"],
+                                          "LeadTime": record["LeadTime"]},
+        }})
+
+    @app.get("/GetPartDetailsBySearch")
+    async def part_search(Z2MPN: str):
+        results = [] if Z2MPN.upper().startswith("UNKNOWN") else [part_record(Z2MPN)]
+        return await gateway.respond("GetPartDetailsBySearch", {"results": results})
+
+    @app.post("/MarketAvailability")
+    async def market_availability(request: Request):
+        part_ids: List[int] = await request.json()
+        sellers = ["DigiKey", "Mouser", "Arrow"]
+        return await gateway.respond("MarketAvailability", [
+            {"PartID": part_id, "NumberOfSeller": len(sellers), "Sellers": [
+                {"SellerName": name, "Stock": (part_id * (i + 3)) % 40000,
+                 "Price": round((part_id % 300) / 100 + i * 0.1, 2)}
+                for i, name in enumerate(sellers)
+            ]} for part_id in part_ids
+        ])
+
+    @app.get("/GetCrossDataByPartId")
+    async def cross_references(PartID: int):
+        crosses = [
+            {"partNumber": f"ALT-{PartID}-{i}", "companyName": MANUFACTURERS[(PartID + i) % len(MANUFACTURERS)],
+             "partLifecycle": "Active", "roHsFlag": "Yes", "crossType": "Form Fit Function"} for i in range(3)
+        ]
+        return await gateway.respond("GetCrossDataByPartId", {"results": {
+            "partNumber": f"Z2-{PartID}", "companyName": MANUFACTURERS[PartID % len(MANUFACTURERS)],
+            "partLifecycle": LIFECYCLES[PartID % len(LIFECYCLES)], "roHsFlag": "Yes", "package": "SOT-23",
+            "crossesDetails": {"crosses": crosses, "Total_Crosses_Found": len(crosses)}
+        }})
+
+    @app.get("/CompanyValidation")
+    async def company_validation(CompanySearch: str):
+        results = [{"CompanyID": stable_id(CompanySearch), "CompanyName": CompanySearch.title()}]
+        return await gateway.respond("CompanyValidation", {"results": results})
+
+    @app.get("/GetCompanyDataDetailsByCompanyID")
+    async def company_details(CompanyID: int):
+        return await gateway.respond("GetCompanyDataDetailsByCompanyID", {"results": {
+            "CompanyID": CompanyID, "Employees": CompanyID % 100000, "Headquarters": "Dallas, TX",
+            "Revenue": f"${CompanyID % 900 + 100}M"
+        }})
+
+    @app.get("/GetCompanyLitigationsByCompanyID")
+    async def company_litigations(CompanyID: int):
+        return await gateway.respond("GetCompanyLitigationsByCompanyID", {"results": {"Lawsuits": [
+            {"CaseTitle": f"Case {CompanyID}-{i}", "Status": "Closed" if i else "Open"} for i in range(CompanyID % 4 + 1)
+        ]}})
+
+    @app.get("/GetCompanySupplyChainByCompanyID")
+    async def company_supply_chain(CompanyID: int):
+        return await gateway.respond("GetCompanySupplyChainByCompanyID", {"results": {
+            "Locations": [{"Country": country, "Type": "Fab"} for country in ["US", "TW", "MY"][:CompanyID % 3 + 1]]
+        }})
+
+    @app.get("/GetAllEventsGrouped")
+    async def supply_chain_events(Size: int = 10):
+        return await gateway.respond("GetAllEventsGrouped", {"results": [
+            {"EventType": "Weather", "Title": f"Mock event {i}", "AffectedSites": i + 1} for i in range(Size)
+        ]})
+
+    @app.get("/_stats")
+    async def stats():
+        """Request and injected-error counts, for the load-test report"""
+        return gateway.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import uvicorn
+    gateway = MockGateway(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    uvicorn.run(create_app(gateway), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
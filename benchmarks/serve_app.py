@@ -0,0 +1,33 @@
+"""
+Run the backend with deterministic fake LLMs, for load tests
+
+bench_load.py starts this in a subprocess; run it by hand to poke at the
+backend without API keys. Z2Data calls go wherever Z2_GATEWAY_URL points,
+normally benchmarks/mock_gateway.py.
+
+Usage: Z2_GATEWAY_URL=http://127.0.0.1:8090 python benchmarks/serve_app.py [--port 8000] [--llm-latency-ms 0]
+"""
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import fake_llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    from app import app
+    from agents_simple import agent_orchestrator
+
+    fake_llm.install(agent_orchestrator, args.llm_latency_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,8 +15,12 @@ interface Message {
   timestamp?: string
   isLoading?: boolean
   statusMessage?: string
+  partials?: any[]  // Tool results streamed before the final composite response
+  turnId?: string  // Turn a loading message belongs to; several turns can run at once
 }
 
+const newTurnId = () => `turn-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`
+
 function ChatInterface() {
   const [messages, setMessages] = useState<Message[]>([])
   const [input, setInput] = useState('')
@@ -25,6 +29,7 @@ function ChatInterface() {
   const [conversationId, setConversationId] = useState(() => `conv-${Date.now()}`)
 
   const wsRef = useRef<WebSocket | null>(null)
+  const pendingTurnsRef = useRef<Set<string>>(new Set())
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   // Auto-scroll to bottom
@@ -36,6 +41,24 @@ function ChatInterface() {
     scrollToBottom()
   }, [messages])
 
+  // Send a message as a new turn; its frames are matched back to it by turn_id
+  const startTurn = (payload: Record<string, any>) => {
+    const turnId = newTurnId()
+    pendingTurnsRef.current.add(turnId)
+    wsRef.current?.send(JSON.stringify({ ...payload, turn_id: turnId }))
+  }
+
+  const finishTurn = (turnId: string) => {
+    pendingTurnsRef.current.delete(turnId)
+    setIsLoading(pendingTurnsRef.current.size > 0)
+  }
+
+  // Replace a turn's loading message with its final message
+  const endTurn = (turnId: string, message: Message) => {
+    setMessages(prev => [...prev.filter(m => !(m.isLoading && m.turnId === turnId)), message])
+    finishTurn(turnId)
+  }
+
   // WebSocket connection
   useEffect(() => {
     let reconnectTimeout: NodeJS.Timeout;
@@ -54,16 +77,15 @@ function ChatInterface() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data)
+          // Responses carry their turn in metadata, every other frame at the top level
+          const turnId = data.turn_id ?? data.metadata?.turn_id
           if (data.type === 'status') {
-            // Update the loading message with status
+            // Update the turn's loading message with status
             setMessages(prev => {
-              const lastMessage = prev[prev.length - 1]
-              if (lastMessage && lastMessage.isLoading) {
+              const index = prev.findIndex(m => m.isLoading && m.turnId === turnId)
+              if (index >= 0) {
                 // Update the existing loading message
-                return [...prev.slice(0, -1), {
-                  ...lastMessage,
-                  statusMessage: data.message
-                }]
+                return prev.map((m, i) => i === index ? { ...m, statusMessage: data.message } : m)
               } else {
                 // Create a new loading message
                 return [...prev, {
@@ -71,22 +93,38 @@ function ChatInterface() {
                   content: '',
                   isLoading: true,
                   statusMessage: data.message,
+                  turnId: turnId,
                   timestamp: new Date().toISOString()
                 }]
               }
             })
+          } else if (data.type === 'partial') {
+            // Show each tool result of a multi-tool answer as soon as it arrives
+            setMessages(prev => prev.map(m => m.isLoading && m.turnId === turnId
+              ? { ...m, partials: [...(m.partials || []), data] }
+              : m))
           } else if (data.type === 'response') {
             // Replace the loading message with actual response
-            setMessages(prev => {
-              const filtered = prev.filter(m => !m.isLoading)
-              return [...filtered, {
-                role: 'assistant',
-                content: data.content,
-                agent_type: data.agent_type,
-                timestamp: new Date().toISOString()
-              }]
+            endTurn(turnId, {
+              role: 'assistant',
+              content: data.content,
+              agent_type: data.agent_type,
+              timestamp: new Date().toISOString()
+            })
+          } else if (data.type === 'error') {
+            // The turn failed or was refused (too many requests in progress)
+            endTurn(turnId, {
+              role: 'assistant',
+              content: data.content,
+              agent_type: 'error',
+              timestamp: new Date().toISOString()
+            })
+          } else if (data.type === 'cancelled') {
+            endTurn(turnId, {
+              role: 'assistant',
+              content: 'Request cancelled.',
+              timestamp: new Date().toISOString()
             })
-            setIsLoading(false)
           }
         } catch (e) {
           console.error('Error parsing message:', e)
@@ -101,6 +139,10 @@ function ChatInterface() {
       }
 
       ws.onclose = () => {
+        // The server cancels a connection's turns when it closes
+        pendingTurnsRef.current.clear()
+        setIsLoading(false)
+        setMessages(prev => prev.filter(m => !m.isLoading))
         if (!isCleaningUp) {
           console.log('WebSocket disconnected - reconnecting in 3s...')
           setIsConnected(false)
@@ -124,6 +166,73 @@ function ChatInterface() {
     }
   }, [conversationId])
 
+  // Render an assistant message body; composite responses render each tool result the same way
+  const renderAssistantContent = (content: any): React.ReactNode => (
+    typeof content === 'object' && content?.type === 'part_details' ? (
+      // Use the PartDetailsDisplay component for rich part details
+      <PartDetailsDisplay
+        data={content.data || content}
+        userQuery={content.query}
+      />
+    ) : typeof content === 'object' && content?.type === 'market_availability' ? (
+      // Display market availability with seller cards and info table
+      <MarketAvailabilityDisplay
+        data={content.data}
+        part_number={content.part_number}
+        manufacturer={content.manufacturer}
+      />
+    ) : typeof content === 'object' && content?.type === 'search_results' ? (
+      // Display search results in a TanStack table
+      content.success ? (
+        <div>
+          {content.message && (
+            <div style={{ marginBottom: '10px', fontSize: '14px', color: '#4b5563' }}>
+              {content.message}
+            </div>
+          )}
+          <TanStackDataTable
+            data={content.data}
+            title={`Search Results: ${content.query || 'Parts'}`}
+            toolName="part_search"
+          />
+        </div>
+      ) : (
+        <div style={{ color: '#374151', padding: '12px', backgroundColor: '#f9fafb', borderRadius: '6px', border: '1px solid #e5e7eb' }}>
+          <div style={{ fontSize: '14px', marginBottom: '4px', fontWeight: '500' }}>Search Results</div>
+          <div style={{ fontSize: '13px', color: '#6b7280' }}>
+            {content.error || 'No results found'}
+          </div>
+        </div>
+      )
+    ) : typeof content === 'object' && content?.type === 'table' ? (
+      <TanStackDataTable
+        data={content.data}
+        title={content.title}
+        toolName={content.toolName}
+      />
+    ) : typeof content === 'object' && content?.type === 'error' ? (
+      <div style={{ color: '#374151', padding: '12px', backgroundColor: '#f9fafb', borderRadius: '6px', border: '1px solid #e5e7eb' }}>
+        <div style={{ fontSize: '14px', marginBottom: '4px', fontWeight: '500' }}>Unable to find part information</div>
+        <div style={{ fontSize: '13px', color: '#6b7280' }}>
+          {content.content.replace('Error: ', '').replace('Part not found: ', 'Part "').replace(' by ', '" from manufacturer "') + '" was not found in our database.'}
+        </div>
+      </div>
+    ) : typeof content === 'object' && content?.type === 'composite' ? (
+      <div className="composite-results">
+        {content.results.map((result: any, i: number) => (
+          <div key={i} className="composite-section">
+            <div className="composite-title">{result.title}</div>
+            {renderAssistantContent(result.content)}
+          </div>
+        ))}
+      </div>
+    ) : typeof content === 'string' ? (
+      <ReactMarkdown>{content}</ReactMarkdown>
+    ) : (
+      <pre>{JSON.stringify(content, null, 2)}</pre>
+    )
+  )
+
   const startFreshChat = () => {
     // Clear messages and generate new conversation ID
     setMessages([])
@@ -147,9 +256,7 @@ function ChatInterface() {
     setIsLoading(true)
 
     // Send via WebSocket
-    wsRef.current.send(JSON.stringify({
-      content: textToSend
-    }))
+    startTurn({ content: textToSend })
 
     setInput('')
   }
@@ -206,9 +313,10 @@ function ChatInterface() {
 
         // Send enrichment request via WebSocket
         if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-          wsRef.current.send(JSON.stringify({
-            content: 'Enrich this data with digikey pricing'
-          }))
+          startTurn({
+            content: 'Enrich this data with digikey pricing',
+            context: { upload_id: uploadResponse.data.upload_id }
+          })
         }
       }
     } catch (error) {
@@ -268,8 +376,9 @@ function ChatInterface() {
         if (hasPartNumbers) {
           // Automatically enrich the data
           setTimeout(async () => {
+            // The parsed file stays on the server; enrichment references it by ID
             const enrichRequest = {
-              file_content: JSON.stringify(response.data.preview)
+              upload_id: response.data.upload_id
             }
 
             try {
@@ -440,6 +549,12 @@ function ChatInterface() {
                     {msg.statusMessage && (
                       <div className="status-text">{msg.statusMessage}</div>
                     )}
+                    {msg.partials?.map((partial, i) => (
+                      <div key={i} className="composite-section">
+                        <div className="composite-title">{partial.title}</div>
+                        {renderAssistantContent(partial.content)}
+                      </div>
+                    ))}
                     <div className="loading-dots">
                       <span></span>
                       <span></span>
@@ -447,63 +562,9 @@ function ChatInterface() {
                     </div>
                   </div>
                 ) : (
-                  <div className={`message-content ${msg.role === 'assistant' && typeof msg.content === 'object' && (msg.content?.type === 'table' || msg.content?.type === 'part_details' || msg.content?.type === 'search_results' || msg.content?.type === 'market_availability') ? 'with-table' : ''}`}>
+                  <div className={`message-content ${msg.role === 'assistant' && typeof msg.content === 'object' && (msg.content?.type === 'table' || msg.content?.type === 'part_details' || msg.content?.type === 'search_results' || msg.content?.type === 'market_availability' || msg.content?.type === 'composite') ? 'with-table' : ''}`}>
                     {msg.role === 'assistant' ? (
-                    // Check if content is structured data
-                    typeof msg.content === 'object' && msg.content?.type === 'part_details' ? (
-                      // Use the PartDetailsDisplay component for rich part details
-                      <PartDetailsDisplay
-                        data={msg.content.data || msg.content}
-                        userQuery={msg.content.query}
-                      />
-                    ) : typeof msg.content === 'object' && msg.content?.type === 'market_availability' ? (
-                      // Display market availability with seller cards and info table
-                      <MarketAvailabilityDisplay
-                        data={msg.content.data}
-                        part_number={msg.content.part_number}
-                        manufacturer={msg.content.manufacturer}
-                      />
-                    ) : typeof msg.content === 'object' && msg.content?.type === 'search_results' ? (
-                      // Display search results in a TanStack table
-                      msg.content.success ? (
-                        <div>
-                          {msg.content.message && (
-                            <div style={{ marginBottom: '10px', fontSize: '14px', color: '#4b5563' }}>
-                              {msg.content.message}
-                            </div>
-                          )}
-                          <TanStackDataTable
-                            data={msg.content.data}
-                            title={`Search Results: ${msg.content.query || 'Parts'}`}
-                            toolName="part_search"
-                          />
-                        </div>
-                      ) : (
-                        <div style={{ color: '#374151', padding: '12px', backgroundColor: '#f9fafb', borderRadius: '6px', border: '1px solid #e5e7eb' }}>
-                          <div style={{ fontSize: '14px', marginBottom: '4px', fontWeight: '500' }}>Search Results</div>
-                          <div style={{ fontSize: '13px', color: '#6b7280' }}>
-                            {msg.content.error || 'No results found'}
-                          </div>
-                        </div>
-                      )
-                    ) : typeof msg.content === 'object' && msg.content?.type === 'table' ? (
-                      <TanStackDataTable
-                        data={msg.content.data}
-                        title={msg.content.title}
-                        toolName={msg.content.toolName}
-                      />
-                    ) : typeof msg.content === 'object' && msg.content?.type === 'error' ? (
-                      <div style={{ color: '#374151', padding: '12px', backgroundColor: '#f9fafb', borderRadius: '6px', border: '1px solid #e5e7eb' }}>
-                        <div style={{ fontSize: '14px', marginBottom: '4px', fontWeight: '500' }}>Unable to find part information</div>
-                        <div style={{ fontSize: '13px', color: '#6b7280' }}>
-                          {msg.content.content.replace('Error: ', '').replace('Part not found: ', 'Part "').replace(' by ', '" from manufacturer "') + '" was not found in our database.'}
-                        </div>
-                      </div>
-                    ) : typeof msg.content === 'string' ? (
-                      <ReactMarkdown>{msg.content}</ReactMarkdown>
-                    ) : (
-                      <pre>{JSON.stringify(msg.content, null, 2)}</pre>
-                    )
+                    renderAssistantContent(msg.content)
                   ) : (
                     <p>{msg.content}</p>
                   )}
@@ -41,7 +41,7 @@ const FileUpload: React.FC<FileUploadProps> = ({ onFileProcessed }) => {
     setIsEnriching(true)
     try {
       const response = await axios.post('http://localhost:8002/api/enrich', {
-        file_content: JSON.stringify(uploadedFile.preview),
+        upload_id: uploadedFile.upload_id,
         enrichment_type: 'auto'
       })
 
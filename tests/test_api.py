@@ -111,4 +111,22 @@ def test_routing_logic():
         "content": "what is the meaning of life",
         "conversation_id": "routing-test-3"
     })
-    assert response.json()["agent_type"] == "chat"
\ No newline at end of file
+    assert response.json()["agent_type"] == "chat"
+
+
+def test_upload_pagination(tmp_path, monkeypatch):
+    """Test that uploads are stored server-side and paged by upload ID"""
+    import dataset_store as store_module
+    monkeypatch.setattr(store_module.dataset_store, "root", str(tmp_path))
+
+    content = "MPN,Manufacturer\n" + "".join(f"P{i},TI\n" for i in range(30))
+    response = client.post("/api/upload", files={"file": ("bom.csv", content.encode())})
+    assert response.status_code == 200
+    upload_id = response.json()["upload_id"]
+
+    page = client.get(f"/api/uploads/{upload_id}/rows", params={"offset": 10, "limit": 5}).json()
+    assert page["total_rows"] == 30
+    assert [row["MPN"] for row in page["rows"]] == ["P10", "P11", "P12", "P13", "P14"]
+
+    assert client.delete(f"/api/uploads/{upload_id}").status_code == 200
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
@@ -0,0 +1,137 @@
+"""
+Test suite for vectorized BOM pre-processing
+"""
+import pytest
+import pytest_asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import pandas as pd
+
+from bom_normalizer import (
+    detect_columns,
+    normalize_mpn,
+    canonicalize_manufacturer,
+    prepare_bom,
+)
+
+
+class TestColumnDetection:
+    """Test header matching for part number and manufacturer columns"""
+
+    def test_exact_spellings(self):
+        assert detect_columns(["MPN", "Manufacturer", "Qty"]) == {
+            "mpn_column": "MPN",
+            "manufacturer_column": "Manufacturer"
+        }
+        assert detect_columns(["part_number", "mfg"])["manufacturer_column"] == "mfg"
+
+    def test_spacing_and_case_variants(self):
+        detected = detect_columns(["Qty", "MFR. NAME", "Part  number"])
+        assert detected == {"mpn_column": "Part  number", "manufacturer_column": "MFR. NAME"}
+
+    def test_manufacturer_part_number_is_not_manufacturer(self):
+        detected = detect_columns(["Manufacturer Part Number", "Manufacturer"])
+        assert detected["mpn_column"] == "Manufacturer Part Number"
+        assert detected["manufacturer_column"] == "Manufacturer"
+
+    def test_fuzzy_match(self):
+        detected = detect_columns(["Manufacturers", "Part Numbers", "Description"])
+        assert detected == {"mpn_column": "Part Numbers", "manufacturer_column": "Manufacturers"}
+
+    def test_no_match(self):
+        assert detect_columns(["Description", "Qty"]) == {
+            "mpn_column": None,
+            "manufacturer_column": None
+        }
+
+
+class TestNormalization:
+    """Test bulk MPN and manufacturer normalization"""
+
+    def test_normalize_mpn(self):
+        mpns = pd.Series([" lm317t ", "LT1763CS8-3.3#TRPBF", "BAV99,215", "TPS 62840", "", None])
+        assert normalize_mpn(mpns).tolist() == ["LM317T", "LT1763CS8-3.3", "BAV99", "TPS62840", pd.NA, pd.NA]
+
+    def test_canonicalize_manufacturer(self):
+        names = pd.Series(["TI", "Texas Instruments Incorporated", "ON Semiconductor",
+                           "EVVO Semi", " Vishay ", None])
+        assert canonicalize_manufacturer(names).tolist() == [
+            "Texas Instruments", "Texas Instruments", "onsemi", "EVVO Semi", "Vishay", pd.NA
+        ]
+
+
+class TestPrepareBom:
+    """Test unique-key computation for enrichment"""
+
+    def test_unique_keys_and_row_codes(self):
+        frame = pd.DataFrame({
+            "MPN": ["LM317", "lm317 ", "BAV99", None, "LM317"],
+            "Manufacturer": ["TI", "Texas Instruments", "Nexperia", "TI", None],
+        })
+
+        prepared = prepare_bom(frame)
+
+        assert prepared["unique_keys"] == [
+            ("LM317", "Texas Instruments"),
+            ("BAV99", "Nexperia"),
+            ("LM317", None),
+        ]
+        assert prepared["row_codes"] == [0, 0, 1, -1, 2]
+
+    def test_without_part_number_column(self):
+        prepared = prepare_bom(pd.DataFrame({"Description": ["resistor"]}))
+
+        assert prepared["unique_keys"] == []
+        assert prepared["row_codes"] == [-1]
+
+
+@pytest_asyncio.fixture
+async def enrichment_cache(tmp_path):
+    """An empty enrichment cache, so lookups are not served from earlier runs"""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import Base
+    from enrichment_cache import EnrichmentCache
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield EnrichmentCache(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+class TestEnrichmentDedup:
+    """Test that enrichment issues one lookup per unique part"""
+
+    async def test_one_call_per_unique_part(self, enrichment_cache):
+        from agents_simple import DataAgent
+
+        class MockZ2Client:
+            def __init__(self):
+                self.calls = []
+
+            async def search_parts(self, query, manufacturer=None):
+                self.calls.append((query, manufacturer))
+                return {"success": True, "data": {"Lifecycle": "Active"}}
+
+        agent = DataAgent()
+        agent.z2_client = MockZ2Client()
+        agent.enrichment_cache = enrichment_cache
+        rows = [
+            {"MPN": "LM317", "Manufacturer": "TI"},
+            {"MPN": "LM317 ", "Manufacturer": "Texas Instruments"},
+            {"MPN": "BAV99", "Manufacturer": "Nexperia"},
+            {"MPN": None, "Manufacturer": "TI"},
+        ]
+
+        result = await agent._enrich_file_data(rows)
+
+        assert agent.z2_client.calls == [("LM317", "Texas Instruments"), ("BAV99", "Nexperia")]
+        table = result["response"]
+        assert table["title"] == "Enriched Data (3/4 parts enriched)"
+        assert [row["lifecycle_status"] for row in table["data"]] == ["Active", "Active", "Active", None]
+        # Original column values are preserved
+        assert table["data"][1]["MPN"] == "LM317 "
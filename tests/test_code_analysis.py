@@ -0,0 +1,192 @@
+"""
+Test suite for AST-based sandbox safety analysis
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from code_analysis import (analyze_code, inspect_code, normalized_code, format_diagnostics, parse_code,
+                           restricted_builtins)
+
+
+class TestAllowedCode:
+    """Test that ordinary snippets pass without false rejections"""
+
+    @pytest.mark.parametrize("code", [
+        "print(type(3).__name__)",
+        "print(dir([]))",
+        "import collections\nprint(collections.Counter('aab').most_common(1))",
+        "from itertools import combinations\nprint(list(combinations([1, 2, 3], 2)))",
+        "import json.decoder as decoder\nprint(decoder.JSONDecodeError)",
+        "from statistics import mean, median\nprint(mean([1, 2]), median([1, 2]))",
+        "class Point:\n    def __init__(self, x):\n        self.x = x\n    def __repr__(self):\n        return f'P({self.x})'",
+        "try:\n    1 / 0\nexcept ZeroDivisionError as e:\n    print(e)",
+        "if __name__ == '__main__':\n    print(math.sqrt(2), datetime.date.today().year)",
+        "typed = 'opened'  # mentions of open( in strings and comments are fine",
+        "print('eval(')",
+        "print(df.groupby('Manufacturer').size().sort_values().tail(3))",
+        "import numpy as np\nprint(np.arange(10).reshape(2, 5).sum(axis=1))",
+        "from pandas import DataFrame\nprint(DataFrame({'a': [1]}).to_string())",
+        "print(df.head().to_string(index=False, max_rows=5))",
+    ])
+    def test_allowed(self, code):
+        assert analyze_code(code) == ()
+
+
+class TestRejectedCode:
+    """Test that each escape route is reported precisely"""
+
+    @pytest.mark.parametrize("code,rule,message", [
+        ("import os", "import", "import of 'os' is not allowed"),
+        ("import subprocess as sp", "import", "import of 'subprocess' is not allowed"),
+        ("from os import path", "import", "import from 'os' is not allowed"),
+        ("from . import secrets", "import", "import from '.' is not allowed"),
+        ("from json import codecs", "import", "import of module 'codecs' is not allowed"),
+        ("from random import _os", "import", "import of private name 'random._os' is not allowed"),
+        ("__import__('os')", "name", "name '__import__' is not allowed"),
+        ("eval('1 + 1')", "name", "builtin 'eval' is not allowed"),
+        ("f = open('/etc/passwd')", "name", "builtin 'open' is not allowed"),
+        ("getattr(math, 'pi')", "name", "builtin 'getattr' is not allowed"),
+        ("print(().__class__.__bases__)", "attribute", "attribute '__class__' is not allowed"),
+        ("random._os.system('ls')", "attribute", "private attribute 'random._os' is not allowed"),
+        ("datetime.sys.modules", "attribute", "module 'sys' is not allowed"),
+        ("import statistics as s\ns.sys.exit()", "attribute", "module 'sys' is not allowed"),
+        ("g = (x for x in [])\ng.gi_frame.f_back", "attribute", "attribute 'gi_frame' is not allowed"),
+        ("pd.read_csv('/etc/passwd')", "attribute", "'pandas.read_csv' is not allowed"),
+        ("from pandas import read_csv", "import", "import of 'pandas.read_csv' is not allowed"),
+        ("np.load('data.npy')", "attribute", "'numpy.load' is not allowed"),
+        ("df.to_csv('out.csv')", "attribute", "attribute 'to_csv' is not allowed"),
+        ("pd.io.common", "attribute", "module 'pandas.io' is not allowed"),
+        ("import numpy.ctypeslib", "import", "import of 'numpy.ctypeslib' is not allowed"),
+        ("r = random\nr._os.getcwd()", "attribute", "private attribute '_os' is not allowed"),
+        ("j = json\nj.codecs.open('/etc/passwd')", "attribute", "module 'codecs' is not allowed"),
+        ("(lambda m: m._os.getpid())(random)", "attribute", "private attribute '_os' is not allowed"),
+        ("d = datetime\nd.sys.modules['os'].popen('id')", "attribute", "module 'sys' is not allowed"),
+        ("class A:\n    pass\nA()._secret", "attribute", "private attribute '_secret' is not allowed"),
+        ("n = np\nn.lib.format.open_memmap('x.npy')", "attribute", "'open_memmap' is not allowed"),
+        ("p = pd\np.read_csv('/etc/passwd')", "attribute", "'read_csv' is not allowed"),
+        ("df.head().to_string('/tmp/x')", "attribute", "'to_string' may only be called with keyword options"),
+        ("write = df.to_string\nwrite('/tmp/x')", "attribute", "'to_string' may only be called with keyword options"),
+        ("df.to_string(**{'buf': '/tmp/x'})", "attribute", "'to_string' may only be called with keyword options"),
+        ("df.to_string(buf='/tmp/x')", "argument", "argument 'buf' is not allowed"),
+        ("df.info(buf='/tmp/x')", "argument", "argument 'buf' is not allowed"),
+        ("df.to_markdown('/tmp/x')", "attribute", "attribute 'to_markdown' is not allowed"),
+        ("s = df.style\ns.to_html('/tmp/x')", "attribute", "attribute 'to_html' is not allowed"),
+        ("import operator", "import", "import of 'operator' is not allowed"),
+        ("from string import Formatter", "import", "import from 'string' is not allowed"),
+        ("print('{0.__class__}'.format(()))", "string", "strings containing '__' are not allowed"),
+        ("print(f'{\"__class__\"}')", "string", "strings containing '__' are not allowed"),
+    ])
+    def test_rejected(self, code, rule, message):
+        diagnostics = analyze_code(code)
+
+        assert diagnostics[0].rule == rule
+        assert diagnostics[0].message == message
+
+    def test_positions_and_order(self):
+        diagnostics = analyze_code("x = 1\nimport os\ny = eval('x')")
+
+        assert [(d.line, d.col, d.rule) for d in diagnostics] == [(2, 0, "import"), (3, 4, "name")]
+        assert format_diagnostics(diagnostics) == (
+            "Code contains potentially unsafe operations:\n"
+            "line 2, col 0: import of 'os' is not allowed\n"
+            "line 3, col 4: builtin 'eval' is not allowed"
+        )
+
+    def test_alias_reports_every_escape(self):
+        diagnostics = analyze_code("d = datetime\nd.sys.modules['os'].popen('id')")
+
+        assert [d.message for d in diagnostics] == ["module 'sys' is not allowed", "'popen' is not allowed"]
+
+    @pytest.mark.parametrize("code", [
+        "import operator\nsubclasses = operator.attrgetter('__class__.__base__.__subclasses__')(())()",
+        "import string\nsubclasses = string.Formatter().get_field('0.__class__.__base__.__subclasses__', [()], {})[0]()",
+    ])
+    def test_string_attribute_paths(self, code):
+        diagnostics = analyze_code(code)
+
+        assert diagnostics
+        assert "strings containing '__' are not allowed" in [d.message for d in diagnostics]
+
+    def test_syntax_error(self):
+        diagnostics = analyze_code("print('unclosed'")
+
+        assert [d.rule for d in diagnostics] == ["syntax"]
+        assert format_diagnostics(diagnostics).startswith("Code has a syntax error:")
+
+
+class TestRestrictedBuiltins:
+    """Test the builtins sandbox code executes with"""
+
+    def test_only_allowed_names(self):
+        allowed = restricted_builtins()
+
+        assert 'print' in allowed and 'ValueError' in allowed
+        assert not {'open', 'eval', 'exec', 'getattr', 'globals', 'vars'} & set(allowed)
+
+    def test_import_limited_to_allowed_modules(self):
+        namespace = {'__name__': '__main__', '__builtins__': restricted_builtins()}
+        exec("import collections\nclass A:\n    pass", namespace)
+        assert namespace['collections'].Counter
+
+        for code in ("import os", "from subprocess import run"):
+            with pytest.raises(ImportError, match="is not allowed"):
+                exec(code, {'__builtins__': restricted_builtins()})
+
+
+class TestCaching:
+    """Test that repeated snippets are parsed and analyzed once"""
+
+    def test_repeated_snippet_hits_cache(self):
+        code = "print(sum(range(10)))  # caching"
+        parse_code.cache_clear()
+        inspect_code.cache_clear()
+
+        for _ in range(3):
+            analyze_code(code)
+
+        assert inspect_code.cache_info().hits == 2
+        assert parse_code.cache_info().misses == 1
+
+
+class TestDeterminism:
+    """Test which snippets may have their results memoized"""
+
+    @pytest.mark.parametrize("code,deterministic", [
+        ("print(sum(range(10)))", True),
+        ("print(statistics.mean([1, 2, 3]))", True),
+        ("from datetime import date\nprint(date(2024, 1, 1).isoformat())", True),
+        ("print(random.randint(1, 6))", False),
+        ("import random as r\nprint(r.random())", False),
+        ("from random import choice\nprint(choice([1, 2]))", False),
+        ("print(datetime.datetime.now())", False),
+        ("from datetime import date\nprint(date.today())", False),
+        ("print(id(object()))", False),
+        ("print(np.random.rand(3))", False),
+        ("print(df.sample(5))", False),
+        ("print(df.describe())", True),
+        ("print(pd.Timestamp('now'))", False),
+        ("print(np.datetime64('today'))", False),
+        ("print(pd.to_datetime(['2024-01-01', 'NOW']))", False),
+        ("print(pd.Timestamp('2024-01-01'))", True),
+        ("print(hash(object()))", False),
+        ("d = datetime\nprint(d.datetime.now())", False),
+        ("m = pd.core.tools.datetimes\nprint(m.time.time())", False),
+        ("print('unclosed'", False),
+    ])
+    def test_deterministic(self, code, deterministic):
+        assert inspect_code(code).deterministic is deterministic
+
+    def test_normalization_ignores_formatting(self):
+        assert normalized_code("x = 1  # one\nprint( x )") == normalized_code("x=1\n\nprint(x)")
+        assert normalized_code("print(1)") != normalized_code("print(2)")
+
+    @pytest.mark.parametrize("code,data_libraries", [
+        ("print(1)", False),
+        ("print(pd.Series([1]).sum())", True),
+        ("import numpy\nprint(numpy.zeros(2))", True),
+        ("from pandas import DataFrame", True),
+    ])
+    def test_data_libraries(self, code, data_libraries):
+        assert inspect_code(code).data_libraries is data_libraries
@@ -0,0 +1,185 @@
+"""
+Test suite for extracting runnable code from LLM responses
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from code_extraction import extract_code, extract_code_blocks, check_syntax, ExtractionStats
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    """Returns canned responses in order and records the prompts it was given"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return FakeResponse(self.responses.pop(0))
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+class FakeSandbox:
+    """Counts executions instead of starting workers"""
+
+    def __init__(self):
+        self.executed = []
+        self.lookups = 0
+        self.cache_reads = []
+
+    def cached_result(self, code, dataset=None):
+        self.lookups += 1
+        return None
+
+    async def execute(self, code, use_cache=True, dataset=None):
+        self.executed.append(code)
+        self.cache_reads.append(use_cache)
+        return {"success": True, "output": "ok\n", "error": None}
+
+
+class TestExtraction:
+    """Test that a single runnable block is picked out of mixed responses"""
+
+    def test_fenced_block_with_prose(self):
+        text = "Here is the solution:\n\n```python\nprint(sum(range(10)))\n```\n\nThis prints 45."
+        assert extract_code(text) == "print(sum(range(10)))"
+
+    def test_other_languages_are_skipped(self):
+        text = "Install with:\n```bash\npip install numpy\n```\nThen:\n```py\nimport math\nprint(math.pi)\n```"
+        assert extract_code(text) == "import math\nprint(math.pi)"
+
+    def test_prefers_block_that_compiles(self):
+        text = ("```python\ndef broken(:\n    pass\n    return 1\n```\n"
+                "```python\nprint(1)\n```")
+        assert extract_code(text) == "print(1)"
+
+    def test_prefers_longest_block(self):
+        text = "```python\nx = 1\n```\nFull version:\n```python\ndef f(x):\n    return x * 2\n\nprint(f(2))\n```"
+        assert extract_code(text).startswith("def f(x):")
+
+    def test_unterminated_and_indented_fences(self):
+        assert extract_code("Sure:\n```python\nprint('cut off')") == "print('cut off')"
+        assert extract_code("1. Run this:\n   ```\n   print(2)\n   ```") == "print(2)"
+
+    def test_tilde_fence(self):
+        assert extract_code("~~~python\nprint(3)\n~~~") == "print(3)"
+
+    def test_unfenced_code_after_prose(self):
+        text = "Here is the code:\nimport statistics\nprint(statistics.mean([1, 2]))\nHope this helps!"
+        assert extract_code(text) == "import statistics\nprint(statistics.mean([1, 2]))"
+
+    def test_plain_code(self):
+        assert extract_code("x = 5\nprint(x * 2)") == "x = 5\nprint(x * 2)"
+
+    @pytest.mark.parametrize("text", [
+        "",
+        "I can't help with that request.",
+        "# Error generating code: timeout",
+        "```python\n# nothing here\n```",
+        "```json\n{\"a\": 1}\n```",
+    ])
+    def test_no_code(self, text):
+        assert extract_code(text) is None
+
+    def test_blocks_keep_language(self):
+        blocks = extract_code_blocks("```Python\nprint(1)\n```\n```text\n1\n```")
+        assert blocks == [{"language": "python", "code": "print(1)"}, {"language": "text", "code": "1"}]
+
+
+class TestSyntaxCheck:
+    """Test the parent-side compile check"""
+
+    def test_valid(self):
+        assert check_syntax("def f():\n    return 1") is None
+
+    def test_syntax_error(self):
+        assert check_syntax("print('unclosed'").startswith("SyntaxError:")
+
+    def test_compile_stage_error(self):
+        # Parses fine, but only compile() rejects it
+        assert "outside function" in check_syntax("return 1")
+
+    def test_stats(self):
+        stats = ExtractionStats()
+        for outcome in ["executed", "no_code", "syntax_error", "repaired", "repair_failed"]:
+            stats.record(outcome)
+
+        assert stats.stats() == {
+            "executed": 1, "no_code": 1, "syntax_errors": 1,
+            "repairs_attempted": 2, "repairs_succeeded": 1, "executions_avoided": 2
+        }
+
+
+@pytest.mark.asyncio
+class TestCodeAgent:
+    """Test that only code that compiles reaches the sandbox"""
+
+    @pytest.fixture
+    def agent(self, monkeypatch):
+        import agents_simple
+        monkeypatch.setattr(agents_simple, "extraction_stats", ExtractionStats())
+        agent = agents_simple.CodeAgent()
+        agent.sandbox = FakeSandbox()
+        return agent
+
+    async def test_runs_extracted_block(self, agent):
+        agent.llm = FakeLLM("Sure!\n```python\nprint(1)\n```\nThat prints 1.")
+
+        result = await agent.process("write code to print 1")
+
+        assert agent.sandbox.executed == ["print(1)"]
+        assert "**Execution Result:**" in result["response"]
+
+    async def test_prose_is_not_executed(self, agent):
+        import agents_simple
+        agent.llm = FakeLLM("That depends on which distributor you mean.")
+
+        result = await agent.process("write code for the best distributor")
+
+        assert agent.sandbox.executed == []
+        assert result["response"] == "That depends on which distributor you mean."
+        assert agents_simple.extraction_stats.stats()["no_code"] == 1
+
+    async def test_single_repair_round(self, agent):
+        import agents_simple
+        agent.llm = FakeLLM("```python\nprint('a'\n```", "```python\nprint('a')\n```")
+
+        await agent.process("generate code printing a")
+
+        assert agent.sandbox.executed == ["print('a')"]
+        assert "SyntaxError" in agent.llm.prompts[1]
+        assert agents_simple.extraction_stats.stats()["repairs_succeeded"] == 1
+
+    async def test_failed_repair_skips_execution(self, agent):
+        import agents_simple
+        agent.llm = FakeLLM("```python\nprint('a'\n```", "```python\nprint('b'\n```", "unused")
+
+        result = await agent.process("generate code printing a")
+
+        assert agent.sandbox.executed == []
+        assert len(agent.llm.prompts) == 2
+        assert "**Syntax Error:**" in result["response"]
+        assert agents_simple.extraction_stats.stats()["executions_avoided"] == 1
+
+    async def test_direct_execution_of_fenced_code(self, agent):
+        await agent.process("Please run:\n```python\nprint(2)\n```")
+        result = await agent.process("run print(2")
+
+        assert agent.sandbox.executed == ["print(2)"]
+        assert result["response"] == "No Python code found to execute."
+
+    async def test_cache_is_looked_up_once(self, agent):
+        await agent.process("Please run:\n```python\nprint(3)\n```")
+
+        assert agent.sandbox.lookups == 1
+        assert agent.sandbox.cache_reads == [False]
@@ -0,0 +1,344 @@
+"""
+Test suite for the code execution sandbox, its warm worker pool and resource limits
+"""
+import pytest
+import pytest_asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import asyncio
+import code_sandbox
+from code_sandbox import SimpleSandbox, ExecutionCache, SandboxPool, SandboxWorker, PoolUnavailable
+
+
+@pytest_asyncio.fixture
+async def sandbox():
+    sandbox = SimpleSandbox(pool_size=1, max_executions=3, limits={"cpu_seconds": 1, "memory_mb": 256})
+    yield sandbox
+    await sandbox.pool.close()
+
+
+@pytest.mark.asyncio
+class TestWorkerPool:
+    """Test execution in pre-warmed workers"""
+
+    async def test_safe_modules_are_preloaded(self, sandbox):
+        result = await sandbox.execute("print(math.sqrt(16), json.dumps([1]))")
+        assert result["success"] is True
+        assert result["output"] == "4.0 [1]\n"
+        assert result["error"] == ""
+
+    async def test_runs_as_main(self, sandbox):
+        result = await sandbox.execute("if __name__ == '__main__':\n    print('main')")
+        assert result["output"] == "main\n"
+
+    async def test_exception_traceback(self, sandbox):
+        result = await sandbox.execute("x = 1 / 0")
+        assert result["success"] is False
+        assert "ZeroDivisionError" in result["error"]
+        assert "sandbox_worker" not in result["error"]
+
+    async def test_state_does_not_leak(self, sandbox):
+        await sandbox.execute("leaked = 42")
+        result = await sandbox.execute("print(leaked)")
+        assert "NameError" in result["error"]
+
+    async def test_worker_reused_then_recycled(self, sandbox):
+        pids = []
+        for _ in range(4):
+            worker = await sandbox.pool.acquire()
+            pids.append(worker.process.pid)
+            sandbox.pool.release(worker)
+            await sandbox.execute("pass", use_cache=False)
+
+        # max_executions=3: the first worker serves three runs, then a new one takes over
+        assert pids[0] == pids[1] == pids[2]
+        assert pids[3] != pids[0]
+
+    async def test_tampering_recycles_worker(self, sandbox):
+        await sandbox.execute("math.pi = 3")
+        result = await sandbox.execute("print(math.pi)")
+        assert result["output"] == "3.141592653589793\n"
+
+    async def test_timeout_recycles_worker(self, sandbox):
+        sandbox.timeout = 0.5
+        result = await sandbox.execute("while True:\n    pass")
+        assert result == {
+            "success": False,
+            "error": "Code execution timed out after 0.5 seconds",
+            "output": ""
+        }
+
+        result = await sandbox.execute("print('recovered')")
+        assert result["output"] == "recovered\n"
+
+    async def test_unsafe_code_is_rejected(self, sandbox):
+        result = await sandbox.execute("import os")
+        assert result["success"] is False
+        assert "unsafe operation" in result["error"]
+
+    @pytest.mark.parametrize("code", [
+        "import operator\nattr = operator.attrgetter\nfor cls in attr('__class__.__base__.__subclasses__')(())():\n"
+        "    if cls.__name__ == '_wrap_close':\n        print(attr('__init__.__globals__')(cls)['popen']('echo escaped').read())",
+        "import string\nget = string.Formatter().get_field\nfor cls in get('0.__class__.__base__.__subclasses__', [()], {})[0]():\n"
+        "    if cls.__name__ == '_wrap_close':\n        print(get('0.__init__.__globals__', [cls], {})[0]['popen']('echo escaped').read())",
+    ])
+    async def test_attribute_paths_in_strings_are_rejected(self, sandbox, code):
+        result = await sandbox.execute(code)
+        assert result["success"] is False
+        assert "escaped" not in result["output"]
+
+
+@pytest.mark.asyncio
+class TestFreshInterpreter:
+    """Test the per-execution subprocess path used when the pool is disabled"""
+
+    async def test_execute(self):
+        sandbox = SimpleSandbox(pool_size=0)
+        assert sandbox.pool is None
+
+        result = await sandbox.execute("print(statistics.mean([1, 2, 3]))")
+        assert result["success"] is True
+        assert result["output"] == "2\n"
+        assert result["error"] == ""
+
+    async def test_limits_apply(self):
+        sandbox = SimpleSandbox(pool_size=0, limits={"memory_mb": 256})
+
+        result = await sandbox.execute("x = bytearray(512 * 1024 * 1024)")
+        assert result["success"] is False
+        assert "Memory limit of 256 MB exceeded" in result["error"]
+
+
+@pytest.mark.asyncio
+class TestResourceLimits:
+    """Test setrlimit caps, streaming output caps and usage accounting"""
+
+    async def test_usage_accounting(self, sandbox):
+        result = await sandbox.execute("total = sum(range(200000))\nprint(total)")
+        usage = result["usage"]
+
+        assert usage["cpu_time_ms"] >= 0
+        assert usage["wall_time_ms"] >= usage["cpu_time_ms"] * 0.5
+        assert usage["peak_rss_kb"] > 0
+
+    async def test_memory_limit(self, sandbox):
+        result = await sandbox.execute("x = bytearray(512 * 1024 * 1024)")
+        assert result["success"] is False
+        assert result["error"] == "Memory limit of 256 MB exceeded"
+
+        result = await sandbox.execute("print('recovered')")
+        assert result["output"] == "recovered\n"
+
+    async def test_cpu_limit(self, sandbox):
+        result = await sandbox.execute("while True:\n    pass")
+        assert result["success"] is False
+        assert result["error"] == "CPU time limit exceeded"
+        assert result["usage"]["cpu_time_ms"] < 3000
+
+    async def test_output_limit_stops_execution(self, sandbox):
+        sandbox.max_output_size = 100
+        result = await sandbox.execute("while True:\n    print('spam')")
+
+        assert result["success"] is False
+        assert result["output"] == ("spam\n" * 20) + "\n... (output truncated)"
+        assert result["error"] == "Output limit of 100 characters exceeded; execution stopped"
+
+    async def test_output_limit_survives_broad_except(self, sandbox):
+        sandbox.max_output_size = 100
+        sandbox.timeout = 2
+        result = await sandbox.execute(
+            "for i in range(1000):\n    try:\n        print('x' * 50)\n    except Exception:\n        pass"
+        )
+
+        assert result["error"] == "Output limit of 100 characters exceeded; execution stopped"
+
+    async def test_violation_recycles_worker(self, sandbox):
+        first = await sandbox.pool.acquire()
+        sandbox.pool.release(first)
+
+        result = await sandbox.execute("x = bytearray(512 * 1024 * 1024)")
+        assert result["violation"] == "memory_limit"
+        second = await sandbox.pool.acquire()
+        sandbox.pool.release(second)
+
+        assert first.process.pid != second.process.pid
+
+
+@pytest.mark.asyncio
+class TestPoolRecovery:
+    """Test that failed spawns neither shrink the pool nor block callers"""
+
+    @pytest.fixture
+    def failing_spawns(self, monkeypatch):
+        """Makes the next `left` worker spawns fail"""
+        original = SandboxWorker.start
+        failures = {"left": 0}
+
+        async def flaky_start(limits=None, preload_data=True):
+            if failures["left"]:
+                failures["left"] -= 1
+                raise OSError("spawn failed")
+            return await original(limits, preload_data)
+
+        monkeypatch.setattr(code_sandbox, "SPAWN_RETRY_DELAY", 0.05)
+        monkeypatch.setattr(SandboxWorker, "start", staticmethod(flaky_start))
+        return failures
+
+    async def test_failed_spawn_falls_back_then_recovers(self, failing_spawns):
+        failing_spawns["left"] = 1
+        sandbox = SimpleSandbox(pool_size=1)
+        try:
+            result = await sandbox.execute("print('one-shot')")
+            assert result["output"] == "one-shot\n"
+
+            # The pool keeps retrying in the background and is usable again once a spawn succeeds
+            for _ in range(100):
+                try:
+                    worker = await sandbox.pool.acquire(timeout=5)
+                    break
+                except PoolUnavailable:
+                    await asyncio.sleep(0.05)
+            assert worker.alive
+            sandbox.pool.release(worker)
+        finally:
+            await sandbox.pool.close()
+
+    async def test_no_startable_workers(self, failing_spawns):
+        failing_spawns["left"] = 1000
+        pool = SandboxPool(size=1)
+
+        with pytest.raises(PoolUnavailable, match="could be started"):
+            await asyncio.wait_for(pool.acquire(), 5)
+        await asyncio.wait_for(pool.close(), 5)
+
+    async def test_acquire_times_out_when_busy(self, sandbox):
+        worker = await sandbox.pool.acquire()
+        with pytest.raises(PoolUnavailable, match="busy"):
+            await sandbox.pool.acquire(timeout=0.1)
+        sandbox.pool.release(worker)
+
+        assert (await sandbox.pool.acquire(timeout=1)) is worker
+        sandbox.pool.release(worker)
+
+
+@pytest.mark.asyncio
+class TestResultCache:
+    """Test memoization of deterministic snippets"""
+
+    async def test_deterministic_result_is_reused(self, sandbox):
+        first = await sandbox.execute("print(sum(range(10)))")
+        second = await sandbox.execute("print(sum(range(10)))  # same code, new comment")
+
+        assert "cached" not in first
+        assert second["cached"] is True
+        assert second["output"] == first["output"] == "45\n"
+        assert sandbox.cached_result("print(sum(range(10)))")["output"] == "45\n"
+
+    async def test_bypass(self, sandbox):
+        await sandbox.execute("print(1)")
+        result = await sandbox.execute("print(1)", use_cache=False)
+        assert "cached" not in result
+
+    async def test_nondeterministic_code_is_not_cached(self, sandbox):
+        await sandbox.execute("print(random.random())")
+        result = await sandbox.execute("print(random.random())")
+        assert "cached" not in result
+
+    async def test_limit_violations_are_not_cached(self, sandbox):
+        sandbox.max_output_size = 100
+        await sandbox.execute("while True:\n    print('spam')")
+        result = await sandbox.execute("while True:\n    print('spam')")
+        assert "cached" not in result
+
+    async def test_object_addresses_are_not_cached(self, sandbox):
+        code = "class A:\n    pass\nprint(A())"
+        await sandbox.execute(code)
+        assert sandbox.cached_result(code) is None
+
+    async def test_errors_are_cached(self, sandbox):
+        await sandbox.execute("x = 1 / 0")
+        result = await sandbox.execute("x = 1 / 0")
+        assert result["cached"] is True
+        assert "ZeroDivisionError" in result["error"]
+
+
+class TestExecutionCache:
+    """Test LRU eviction and the byte bound"""
+
+    def test_lru_eviction(self):
+        cache = ExecutionCache(max_entries=2, max_bytes=1000)
+        cache.put("a", {"output": "1", "error": ""})
+        cache.put("b", {"output": "2", "error": ""})
+        cache.get("a")
+        cache.put("c", {"output": "3", "error": ""})
+
+        assert cache.get("b") is None
+        assert cache.get("a")["output"] == "1"
+        assert cache.stats()["entries"] == 2
+
+    def test_byte_bound(self):
+        cache = ExecutionCache(max_entries=10, max_bytes=10)
+        cache.put("a", {"output": "x" * 6, "error": ""})
+        cache.put("b", {"output": "y" * 6, "error": ""})
+        cache.put("huge", {"output": "z" * 11, "error": ""})
+
+        assert cache.get("a") is None
+        assert cache.get("huge") is None
+        assert cache.size_bytes == 6
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    from dataset_store import DatasetStore
+    store = DatasetStore(root=str(tmp_path / "store"), chunk_rows=1000)
+    source = tmp_path / "bom.csv"
+    with open(source, 'w') as f:
+        f.write("MPN,Manufacturer,Qty\n")
+        for i in range(5000):
+            f.write(f"PART-{i},{'Vishay' if i % 2 else 'Murata'},{i}\n")
+    store.ingest_file("d" * 32, str(source), "bom.csv")
+    return store.export_arrow("d" * 32)
+
+
+@pytest.mark.asyncio
+class TestDatasets:
+    """Test the memory-mapped dataset exposed to snippets as df"""
+
+    async def test_df_is_preloaded(self, sandbox, dataset):
+        result = await sandbox.execute(
+            "print(len(df), df['Manufacturer'].value_counts()['Vishay'])", dataset=dataset
+        )
+        assert result["output"] == "5000 2500\n"
+
+    async def test_edits_do_not_leak(self, sandbox, dataset):
+        await sandbox.execute("df['Qty'] = 'x'\ndf.drop(columns=['MPN'], inplace=True)", dataset=dataset)
+        result = await sandbox.execute("print(list(df.columns), df['Qty'].iloc[1])", dataset=dataset)
+        assert result["output"] == "['MPN', 'Manufacturer', 'Qty'] 1\n"
+
+    async def test_no_dataset_means_no_df(self, sandbox):
+        result = await sandbox.execute("print(df)")
+        assert "NameError" in result["error"]
+
+    async def test_cache_key_includes_dataset(self, sandbox, dataset):
+        code = "print(len(df))"
+        await sandbox.execute(code, dataset=dataset)
+
+        assert sandbox.cached_result(code, dataset)["output"] == "5000\n"
+        assert sandbox.cached_result(code) is None
+
+    async def test_missing_dataset(self, sandbox, tmp_path):
+        result = await sandbox.execute("print(len(df))", dataset=str(tmp_path / "missing.arrow"))
+        assert result["success"] is False
+        assert "Could not open dataset" in result["error"]
+
+    async def test_lazy_attributes_do_not_recycle(self, sandbox, dataset):
+        first = await sandbox.pool.acquire()
+        sandbox.pool.release(first)
+
+        await sandbox.execute("print(df.groupby('Manufacturer')['Qty'].count().max())", dataset=dataset)
+        second = await sandbox.pool.acquire()
+        sandbox.pool.release(second)
+
+        assert first.process.pid == second.process.pid
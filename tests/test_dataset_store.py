@@ -0,0 +1,196 @@
+"""
+Test suite for chunked upload ingestion
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from dataset_store import DatasetStore, detect_format, is_supported_filename
+
+
+class FakeUpload:
+    """Minimal stand-in for FastAPI's UploadFile"""
+
+    def __init__(self, filename, content):
+        self.filename = filename
+        self._content = content
+        self._offset = 0
+
+    async def read(self, size=-1):
+        if size < 0:
+            size = len(self._content) - self._offset
+        block = self._content[self._offset:self._offset + size]
+        self._offset += len(block)
+        return block
+
+
+def _write_csv(path, rows):
+    with open(path, 'w') as f:
+        f.write("MPN,Manufacturer,Qty\n")
+        for i in range(rows):
+            f.write(f"0805-{i},Vishay,{i}\n")
+
+
+class TestFormatDetection:
+    """Test format sniffing and extension checks"""
+
+    def test_magic_bytes(self):
+        assert detect_format(b'PK\x03\x04rest') == 'xlsx'
+        assert detect_format(b'\xd0\xcf\x11\xe0\xa1\xb1') == 'xls'
+        assert detect_format(b'MPN,Manu') == 'csv'
+
+    def test_supported_filenames(self):
+        assert is_supported_filename("bom.CSV")
+        assert is_supported_filename("bom.xlsx")
+        assert not is_supported_filename("bom.pdf")
+        assert not is_supported_filename(None)
+
+
+class TestDatasetStore:
+    """Test chunked parsing into the Parquet store"""
+
+    def test_csv_counts_rows_across_chunks(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"), chunk_rows=7)
+        source = tmp_path / "source"
+        _write_csv(source, 25)
+
+        meta = store.ingest_file("a" * 32, str(source), "bom.csv")
+
+        assert meta["rows"] == 25
+        assert meta["columns"] == ["MPN", "Manufacturer", "Qty"]
+        assert len(meta["preview"]) == 5
+        # Text columns keep leading zeros instead of being coerced to numbers
+        assert meta["preview"][0]["MPN"] == "0805-0"
+
+        parquet = pq.ParquetFile(store.dataset_path("a" * 32))
+        assert parquet.metadata.num_rows == 25
+        assert parquet.metadata.num_row_groups == 4
+        assert not source.exists()
+        assert store.get_metadata("a" * 32)["rows"] == 25
+
+    def test_missing_values_in_preview_are_none(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"))
+        source = tmp_path / "source"
+        source.write_text("MPN,Manufacturer\nLM317,\n")
+
+        meta = store.ingest_file("b" * 32, str(source), "bom.csv")
+
+        assert meta["preview"] == [{"MPN": "LM317", "Manufacturer": None}]
+
+    def test_xlsx_streaming(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"), chunk_rows=2)
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Part Number", "Manufacturer", None])
+        sheet.append(["BAV99", "Nexperia"])
+        sheet.append([None, None])
+        sheet.append(["LM317", "TI"])
+        sheet.append([1234, "Murata"])
+        # Mislabelled extension: detection goes by content
+        source = tmp_path / "source"
+        workbook.save(source)
+
+        meta = store.ingest_file("c" * 32, str(source), "bom.xls")
+
+        assert meta["format"] == "xlsx"
+        assert meta["columns"] == ["Part Number", "Manufacturer"]
+        assert meta["rows"] == 3
+        # Preview comes from the first chunk only
+        assert len(meta["preview"]) == 2
+        table = pq.read_table(store.dataset_path("c" * 32))
+        assert table.to_pylist()[2] == {"Part Number": "1234", "Manufacturer": "Murata"}
+
+    def test_header_only_file(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"))
+        source = tmp_path / "source"
+        source.write_text("MPN,Manufacturer\n")
+
+        meta = store.ingest_file("d" * 32, str(source), "bom.csv")
+
+        assert meta["rows"] == 0
+        assert meta["columns"] == ["MPN", "Manufacturer"]
+        assert meta["preview"] == []
+
+    def test_invalid_upload_id(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"))
+
+        with pytest.raises(ValueError):
+            store.dataset_path("../../etc")
+        assert store.get_metadata("missing") is None
+        assert store.delete("../x") is False
+
+    @pytest.mark.asyncio
+    async def test_ingest_upload_spools_in_blocks(self, tmp_path):
+        store = DatasetStore(root=str(tmp_path / "store"), chunk_rows=10)
+        content = "MPN,Manufacturer\n" + "".join(f"P{i},TI\n" for i in range(50))
+
+        meta = await store.ingest_upload(FakeUpload("bom.csv", content.encode()))
+
+        assert meta["rows"] == 50
+        assert meta["filename"] == "bom.csv"
+        assert store.get_metadata(meta["upload_id"])["rows"] == 50
+        assert store.delete(meta["upload_id"])
+        assert store.get_metadata(meta["upload_id"]) is None
+
+    @pytest.mark.asyncio
+    async def test_failed_ingest_cleans_up(self, tmp_path):
+        root = tmp_path / "store"
+        store = DatasetStore(root=str(root))
+
+        with pytest.raises(Exception):
+            await store.ingest_upload(FakeUpload("bom.csv", b""))
+
+        assert list(root.iterdir()) == []
+
+
+class TestDatasetAccess:
+    """Test reading stored datasets back by upload ID"""
+
+    def _store(self, tmp_path, rows=25, chunk_rows=7):
+        store = DatasetStore(root=str(tmp_path / "store"), chunk_rows=chunk_rows)
+        source = tmp_path / "source"
+        _write_csv(source, rows)
+        store.ingest_file("e" * 32, str(source), "bom.csv")
+        return store
+
+    def test_read_rows_across_row_groups(self, tmp_path):
+        store = self._store(tmp_path)
+
+        page = store.read_rows("e" * 32, offset=5, limit=10)
+
+        assert [row["Qty"] for row in page] == [str(i) for i in range(5, 15)]
+
+    def test_read_rows_past_end(self, tmp_path):
+        store = self._store(tmp_path)
+
+        assert len(store.read_rows("e" * 32, offset=20, limit=10)) == 5
+        assert store.read_rows("e" * 32, offset=100, limit=10) == []
+
+    def test_read_records_and_frame(self, tmp_path):
+        store = self._store(tmp_path)
+
+        records = store.read_records("e" * 32)
+        frame = store.read_frame("e" * 32, columns=["MPN"])
+
+        assert len(records) == 25
+        assert records[-1] == {"MPN": "0805-24", "Manufacturer": "Vishay", "Qty": "24"}
+        assert list(frame.columns) == ["MPN"]
+        assert len(frame) == 25
+
+    def test_export_arrow(self, tmp_path):
+        import pyarrow as pa
+        store = self._store(tmp_path)
+
+        path = store.export_arrow("e" * 32)
+        mtime = os.stat(path).st_mtime_ns
+
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        assert table.num_rows == 25
+        assert table.column_names == ["MPN", "Manufacturer", "Qty"]
+        # Written once; later calls reuse the file
+        assert store.export_arrow("e" * 32) == path
+        assert os.stat(path).st_mtime_ns == mtime
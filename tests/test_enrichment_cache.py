@@ -0,0 +1,140 @@
+"""
+Test suite for the per-part enrichment cache and incremental re-enrichment
+"""
+import pytest
+import pytest_asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from enrichment_cache import EnrichmentCache, ENRICHMENT_FIELDS, check_fields
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+ENRICHMENT = {
+    'lifecycle_status': "Active",
+    'rohs_status': "Compliant",
+    'market_availability': "1,200",
+    'avg_price': "$0.42",
+    'lead_time': "6 weeks",
+    'alternatives': "Available"
+}
+
+
+class MockZ2Client:
+    """Records part searches"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def search_parts(self, query, manufacturer=None):
+        self.calls.append((query, manufacturer))
+        return {"success": True, "data": {"Lifecycle": "Active", "Price": "$0.42"}}
+
+
+@pytest_asyncio.fixture
+async def cache(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield EnrichmentCache(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+class TestFreshness:
+    """Test per-field max ages"""
+
+    async def test_fresh_parts_need_no_lookup(self, cache):
+        await cache.store({("LM317", "Texas Instruments"): ENRICHMENT}, now=NOW)
+        plan = await cache.plan([("LM317", "Texas Instruments"), ("BAV99", None)], now=NOW + timedelta(minutes=30))
+
+        assert plan["cached"] == {("LM317", "Texas Instruments"): ENRICHMENT}
+        assert plan["lookups"] == [("BAV99", None)]
+        assert plan["api_calls"] == 1
+
+    async def test_market_fields_expire_hourly(self, cache):
+        await cache.store({("LM317", "Texas Instruments"): ENRICHMENT}, now=NOW)
+        plan = await cache.plan([("LM317", "Texas Instruments")], now=NOW + timedelta(hours=2))
+
+        assert plan["lookups"] == [("LM317", "Texas Instruments")]
+        assert plan["api_calls"] == 2
+        assert plan["stale_fields"] == {
+            'lifecycle_status': 0, 'rohs_status': 0, 'alternatives': 0,
+            'market_availability': 1, 'avg_price': 1, 'lead_time': 1
+        }
+
+    async def test_static_fields_last_a_month(self, cache):
+        await cache.store({("LM317", "Texas Instruments"): ENRICHMENT}, now=NOW)
+        fields = ['lifecycle_status', 'rohs_status']
+
+        plan = await cache.plan([("LM317", "Texas Instruments")], fields, now=NOW + timedelta(days=20))
+        assert plan["cached"] == {("LM317", "Texas Instruments"): {'lifecycle_status': "Active", 'rohs_status': "Compliant"}}
+
+        plan = await cache.plan([("LM317", "Texas Instruments")], fields, now=NOW + timedelta(days=31))
+        assert plan["lookups"] == [("LM317", "Texas Instruments")]
+
+    async def test_failed_lookups_not_cached(self, cache):
+        await cache.store({("BAD1", None): {'enrichment_error': "timeout"}}, now=NOW)
+        assert (await cache.plan([("BAD1", None)], now=NOW))["lookups"] == [("BAD1", None)]
+
+    async def test_unknown_fields_rejected(self):
+        assert check_fields(None) == ENRICHMENT_FIELDS
+        with pytest.raises(ValueError, match="price"):
+            check_fields(['lifecycle_status', 'price'])
+
+    async def test_unavailable_cache_looks_up_everything(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}")  # No tables
+        cache = EnrichmentCache(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+
+        await cache.store({("LM317", None): ENRICHMENT})
+        assert (await cache.plan([("LM317", None)]))["lookups"] == [("LM317", None)]
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+class TestReEnrichment:
+    """Test that re-enriching a BOM only calls Z2Data for stale parts"""
+
+    ROWS = [
+        {"MPN": "LM317", "Manufacturer": "TI"},
+        {"MPN": "BAV99", "Manufacturer": "Nexperia"},
+        {"MPN": "LM317", "Manufacturer": "Texas Instruments"},
+    ]
+
+    @pytest.fixture
+    def agent(self, cache):
+        from agents_simple import DataAgent
+        agent = DataAgent()
+        agent.z2_client = MockZ2Client()
+        agent.enrichment_cache = cache
+        return agent
+
+    async def test_second_run_is_served_from_cache(self, agent):
+        first = await agent._enrich_file_data(self.ROWS)
+        second = await agent._enrich_file_data(self.ROWS)
+
+        assert len(agent.z2_client.calls) == 2
+        assert second["response"] == first["response"]
+
+    async def test_requested_fields_only(self, agent):
+        result = await agent._enrich_file_data(self.ROWS, fields=['lifecycle_status'])
+
+        row = result["response"]["data"][0]
+        assert row["lifecycle_status"] == "Active"
+        assert "avg_price" not in row
+
+    async def test_dry_run_counts_calls(self, agent, cache):
+        await cache.store({("BAV99", "Nexperia"): ENRICHMENT})
+        plan = await agent.plan_enrichment(self.ROWS)
+
+        assert agent.z2_client.calls == []
+        assert plan["total_rows"] == 3
+        assert plan["unique_parts"] == 2
+        assert plan["cached_parts"] == 1
+        assert plan["parts_to_look_up"] == 1
+        assert plan["api_calls"] == 2
@@ -0,0 +1,279 @@
+"""
+Test suite for background enrichment jobs: checkpoints, resume, cancellation and results
+"""
+import pytest
+import pytest_asyncio
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, EnrichmentJobPart
+from dataset_store import DatasetStore
+from enrichment_jobs import EnrichmentJobManager, JobStateError
+from enrichment_cache import EnrichmentCache
+
+TERMINAL = ("completed", "failed", "cancelled")
+
+
+class MockZ2Client:
+    """Counts part searches; an optional gate holds lookups until released"""
+
+    def __init__(self):
+        self.searches = []
+        self.gate = None
+
+    async def search_parts(self, part_number, manufacturer=None):
+        if self.gate:
+            await self.gate.wait()
+        self.searches.append(part_number)
+        if part_number.startswith("BAD"):
+            raise RuntimeError("gateway timeout")
+        return {"success": True, "data": [{"MPN": part_number, "Lifecycle": "Active", "Stock": "1,200 in stock"}]}
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def datasets(tmp_path):
+    store = DatasetStore(root=str(tmp_path / "uploads"))
+    path = tmp_path / "bom.csv"
+    # 12 rows, 6 distinct parts, one of which fails to enrich
+    rows = ["Part Number,Manufacturer,Quantity"]
+    for i in range(12):
+        part = f"BAD{i % 6}" if i % 6 == 5 else f"LM{i % 6}"
+        rows.append(f"{part},Texas Instruments,{i + 1}")
+    path.write_text("\n".join(rows) + "\n")
+    store.ingest_file("a" * 32, str(path), "bom.csv")
+    return store
+
+
+@pytest.fixture
+def agent(session_factory):
+    from agents_simple import DataAgent
+    agent = DataAgent()
+    agent.z2_client = MockZ2Client()
+    agent.enrichment_cache = EnrichmentCache(session_factory)
+    return agent
+
+
+def make_manager(agent, session_factory, datasets, **kwargs):
+    settings = {"workers": 1, "batch_size": 2, "lease_seconds": 60, "poll_seconds": 0.05, **kwargs}
+    return EnrichmentJobManager(agent, session_factory=session_factory, datasets=datasets, **settings)
+
+
+async def wait_for(manager, job_id, statuses=TERMINAL, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await manager.get(job_id)
+        if job["status"] in statuses or asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(0.02)
+
+
+async def checkpointed(session_factory, job_id):
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).where(EnrichmentJobPart.job_id == job_id))
+
+
+@pytest.mark.asyncio
+class TestJobLifecycle:
+    """Test submission, progress and results"""
+
+    async def test_job_completes(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            job = await manager.submit("a" * 32)
+            assert job["status"] == "queued"
+            job = await wait_for(manager, job["job_id"])
+        finally:
+            await manager.stop()
+
+        assert job["status"] == "completed"
+        assert job["progress"] == {"completed_parts": 6, "total_parts": 6, "percent": 100.0}
+        assert job["enriched_rows"] == 10
+        assert len(agent.z2_client.searches) == 6
+
+    async def test_result_pages(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            job = await wait_for(manager, (await manager.submit("a" * 32))["job_id"])
+            result = await manager.result(job["job_id"], offset=4, limit=3)
+        finally:
+            await manager.stop()
+
+        assert result["title"] == "Enriched Data (10/12 parts enriched)"
+        assert result["total_rows"] == 12
+        assert [row["Part Number"] for row in result["rows"]] == ["LM4", "BAD5", "LM0"]
+        assert result["rows"][0]["lifecycle_status"] == "Active"
+        assert result["rows"][1]["enrichment_error"] == "gateway timeout"
+
+    async def test_result_pages_are_read_from_the_stored_copy(self, agent, session_factory, datasets, monkeypatch):
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            job = await wait_for(manager, (await manager.submit("a" * 32))["job_id"])
+        finally:
+            await manager.stop()
+
+        def no_reread(*args, **kwargs):
+            raise AssertionError("the upload was read again")
+
+        monkeypatch.setattr(datasets, "read_frame", no_reread)
+        monkeypatch.setattr(agent, "_apply_enrichment", no_reread)
+        result = await manager.result(job["job_id"], offset=10, limit=5)
+
+        assert [row["Part Number"] for row in result["rows"]] == ["LM4", "BAD5"]
+        assert result["total_rows"] == 12
+        assert result["title"] == "Enriched Data (10/12 parts enriched)"
+
+    async def test_result_before_stored_copy(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            job = await wait_for(manager, (await manager.submit("a" * 32))["job_id"])
+        finally:
+            await manager.stop()
+        os.remove(datasets.enriched_path("a" * 32, job["job_id"]))
+
+        result = await manager.result(job["job_id"], offset=0, limit=2)
+        assert result["rows"][0]["lifecycle_status"] == "Active"
+        assert os.path.exists(datasets.enriched_path("a" * 32, job["job_id"]))
+
+    async def test_result_requires_completion(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        job = await manager.submit("a" * 32)
+
+        with pytest.raises(JobStateError):
+            await manager.result(job["job_id"])
+        assert await manager.result("missing") is None
+
+    async def test_unknown_upload(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        with pytest.raises(KeyError):
+            await manager.submit("b" * 32)
+
+
+@pytest.mark.asyncio
+class TestCheckpointsAndResume:
+    """Test that interrupted jobs resume from their last checkpoint"""
+
+    async def test_resume_after_crash(self, agent, session_factory, datasets):
+        agent.z2_client.gate = asyncio.Event()
+        crashed = make_manager(agent, session_factory, datasets, lease_seconds=0.2)
+        await crashed.start()
+        job_id = (await crashed.submit("a" * 32))["job_id"]
+
+        # Let exactly one batch of two parts through, then kill the workers without releasing the job
+        agent.z2_client.gate.set()
+        while await checkpointed(session_factory, job_id) < 2:
+            await asyncio.sleep(0.005)
+        agent.z2_client.gate.clear()
+        for task in crashed._tasks:
+            task.cancel()
+        await asyncio.gather(*crashed._tasks, return_exceptions=True)
+
+        started_at = (await crashed.get(job_id))["started_at"]
+        assert (await crashed.get(job_id))["status"] == "running"
+        done_before = list(agent.z2_client.searches)
+        agent.z2_client.gate.set()
+
+        restarted = make_manager(agent, session_factory, datasets, lease_seconds=0.2)
+        await restarted.start()
+        try:
+            job = await wait_for(restarted, job_id)
+        finally:
+            await restarted.stop()
+
+        assert job["status"] == "completed"
+        assert job["started_at"] == started_at
+        assert job["progress"]["completed_parts"] == 6
+        assert await checkpointed(session_factory, job_id) == 6
+        resumed = agent.z2_client.searches[len(done_before):]
+        assert not set(done_before[:2]) & set(resumed)
+
+    async def test_graceful_stop_requeues(self, agent, session_factory, datasets):
+        agent.z2_client.gate = asyncio.Event()
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        job_id = (await manager.submit("a" * 32))["job_id"]
+        await wait_for(manager, job_id, statuses=("running",))
+        await manager.stop()
+
+        assert (await manager.get(job_id))["status"] == "queued"
+
+        agent.z2_client.gate.set()
+        restarted = make_manager(agent, session_factory, datasets)
+        await restarted.start()
+        try:
+            assert (await wait_for(restarted, job_id))["status"] == "completed"
+        finally:
+            await restarted.stop()
+
+    async def test_rerun_uses_cached_parts(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            await wait_for(manager, (await manager.submit("a" * 32))["job_id"])
+            agent.z2_client.searches.clear()
+            job = await wait_for(manager, (await manager.submit("a" * 32))["job_id"])
+        finally:
+            await manager.stop()
+
+        # Only the part that failed is looked up again
+        assert agent.z2_client.searches == ["BAD5"]
+        assert job["status"] == "completed"
+        assert job["enriched_rows"] == 10
+
+    async def test_claim_is_exclusive(self, agent, session_factory, datasets):
+        first = make_manager(agent, session_factory, datasets)
+        second = make_manager(agent, session_factory, datasets)
+        job_id = (await first.submit("a" * 32))["job_id"]
+
+        claims = await asyncio.gather(first._claim(job_id), second._claim(job_id))
+        assert sorted(claims) == [False, True]
+
+
+@pytest.mark.asyncio
+class TestCancellation:
+    """Test cancelling queued and running jobs"""
+
+    async def test_cancel_running_job(self, agent, session_factory, datasets):
+        agent.z2_client.gate = asyncio.Event()
+        manager = make_manager(agent, session_factory, datasets)
+        await manager.start()
+        try:
+            job_id = (await manager.submit("a" * 32))["job_id"]
+            await wait_for(manager, job_id, statuses=("running",))
+            cancelled = await manager.cancel(job_id)
+            agent.z2_client.gate.set()
+            await asyncio.sleep(0.1)
+            job = await manager.get(job_id)
+        finally:
+            await manager.stop()
+
+        assert cancelled["status"] == "cancelled"
+        assert job["status"] == "cancelled"
+        assert await checkpointed(session_factory, job_id) == 0
+
+    async def test_cancel_finished_job(self, agent, session_factory, datasets):
+        manager = make_manager(agent, session_factory, datasets)
+        job_id = (await manager.submit("a" * 32))["job_id"]
+        await manager.cancel(job_id)
+
+        with pytest.raises(JobStateError):
+            await manager.cancel(job_id)
+        assert await manager.cancel("missing") is None
@@ -0,0 +1,175 @@
+"""
+Test suite for the code execution scheduler
+"""
+import pytest
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from execution_scheduler import ExecutionScheduler, ExecutionQueueFull
+
+
+class Gate:
+    """Job that records when it starts and holds its slot until released"""
+
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started.append(self.name)
+        await self.release.wait()
+        return self.name
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+class TestScheduling:
+    """Test the concurrency cap and round-robin fairness"""
+
+    async def test_concurrency_cap(self):
+        scheduler = ExecutionScheduler(max_concurrent=2, max_queue=10)
+        started = []
+        gates = [Gate(i, started) for i in range(3)]
+        tasks = [asyncio.create_task(scheduler.run("a", gate)) for gate in gates]
+        await settle()
+
+        assert started == [0, 1]
+        assert scheduler.running == 2
+        assert scheduler.queued == 1
+
+        gates[0].release.set()
+        await settle()
+        assert started == [0, 1, 2]
+
+        for gate in gates:
+            gate.release.set()
+        assert await asyncio.gather(*tasks) == [0, 1, 2]
+        assert scheduler.running == 0
+
+    async def test_conversations_take_turns(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=10)
+        started = []
+        gates = {name: Gate(name, started) for name in ["a1", "a2", "a3", "b1"]}
+        positions = {}
+
+        def recorder(name):
+            async def record(position):
+                positions.setdefault(name, []).append(position)
+            return record
+
+        tasks = []
+        for name in ["a1", "a2", "a3", "b1"]:
+            tasks.append(asyncio.create_task(scheduler.run(name[0], gates[name], recorder(name))))
+            await settle()
+
+        # b1 jumps ahead of a3: conversations alternate once both are waiting
+        assert positions == {"a2": [1], "a3": [2, 3], "b1": [2]}
+
+        for name in ["a1", "a2", "b1", "a3"]:
+            gates[name].release.set()
+            await settle()
+        await asyncio.gather(*tasks)
+
+        assert started == ["a1", "a2", "b1", "a3"]
+        assert positions["a3"] == [2, 3, 2, 1]
+
+
+@pytest.mark.asyncio
+class TestBackpressure:
+    """Test rejection, cancellation and metrics"""
+
+    async def test_full_queue_rejects_with_retry_hint(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=1)
+        started = []
+        gates = [Gate(i, started) for i in range(2)]
+        tasks = [asyncio.create_task(scheduler.run(f"c{i}", gate)) for i, gate in enumerate(gates)]
+        await settle()
+
+        with pytest.raises(ExecutionQueueFull) as rejected:
+            await scheduler.run("c2", Gate(2, started))
+        assert rejected.value.retry_after >= 1
+        assert scheduler.stats()["rejected"] == 1
+
+        for gate in gates:
+            gate.release.set()
+        await asyncio.gather(*tasks)
+
+    async def test_per_conversation_cap(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=10, max_queued_per_conversation=1)
+        started = []
+        gates = [Gate(i, started) for i in range(2)]
+        tasks = [asyncio.create_task(scheduler.run("a", gate)) for gate in gates]
+        await settle()
+
+        with pytest.raises(ExecutionQueueFull):
+            await scheduler.run("a", Gate(2, started))
+
+        # Other conversations can still queue
+        other = asyncio.create_task(scheduler.run("b", Gate("b", started)))
+        await settle()
+        assert scheduler.queued == 2
+
+        for gate in gates:
+            gate.release.set()
+        await asyncio.gather(*tasks)
+        other.cancel()
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=10)
+        started = []
+        first, second = Gate(1, started), Gate(2, started)
+        running = asyncio.create_task(scheduler.run("a", first))
+        waiting = asyncio.create_task(scheduler.run("b", second))
+        await settle()
+
+        waiting.cancel()
+        await settle()
+        assert scheduler.queued == 0
+
+        first.release.set()
+        await running
+        assert started == [1]
+        assert scheduler.running == 0
+
+    async def test_stats(self):
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=10)
+
+        async def job():
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(scheduler.run("a", job) for _ in range(3)))
+        stats = scheduler.stats()
+
+        assert stats["completed"] == 3
+        assert stats["admitted"] == 3
+        assert stats["running"] == 0 and stats["queued"] == 0
+        assert stats["wait_time_ms"]["max"] >= 10
+
+
+@pytest.mark.asyncio
+class TestCodeAgent:
+    """Test that the code agent surfaces a full queue as a retry hint"""
+
+    async def test_queue_full_response(self, monkeypatch):
+        import agents_simple
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=0)
+        monkeypatch.setattr(agents_simple, "execution_scheduler", scheduler)
+        started = []
+        gate = Gate(0, started)
+        busy = asyncio.create_task(scheduler.run("other", gate))
+        await settle()
+
+        result = await agents_simple.CodeAgent().process("print(1)", {"conversation_id": "c1"})
+
+        assert result["success"] is False
+        assert result["metadata"]["retry_after"] >= 1
+
+        gate.release.set()
+        await busy
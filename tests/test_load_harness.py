@@ -0,0 +1,143 @@
+"""
+Test suite for the load-test harness: mock gateway, fake LLMs and baseline comparison
+"""
+import pytest
+import httpx
+import json
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from z2data_client import Z2DataClient
+from mock_gateway import MockGateway, create_app
+from fake_llm import FakeChatModel
+from bench_load import compare, percentile, summarize
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Serve Z2DataClient requests from the mock gateway in-process"""
+    gateway = MockGateway(latency_ms=0)
+    asgi = httpx.ASGITransport(app=create_app(gateway))
+
+    async def handle(self, request):
+        return await asgi.handle_async_request(request)
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", handle)
+    return gateway
+
+
+@pytest.fixture
+def client():
+    return Z2DataClient(base_url="http://mock-gateway/")
+
+
+@pytest.mark.asyncio
+class TestMockGateway:
+    """Test that the client's parsing works unchanged against the mock"""
+
+    async def test_gateway_url_setting(self, monkeypatch):
+        monkeypatch.setenv("Z2_GATEWAY_URL", "http://127.0.0.1:8090/")
+        assert Z2DataClient().base_url == "http://127.0.0.1:8090"
+
+    async def test_part_flow(self, gateway, client):
+        validation = await client.validate_part("LM317", "Texas Instruments")
+        details = await client.get_part_details("LM317", part_id=validation["part_id"])
+        market = await client.get_market_availability("LM317", part_id=validation["part_id"])
+        crosses = await client.get_cross_references("LM317", part_id=validation["part_id"])
+
+        assert validation["success"] and validation["part_id"] > 0
+        assert details["data"]["MPNSummary"]["Lifecycle"] in ("Active", "NRND", "Obsolete")
+        assert market["data"][0]["PartID"] == validation["part_id"]
+        assert crosses["data"]["crossesDetails"]["Total_Crosses_Found"] == 3
+        assert gateway.requests["GetValidationPart"] == 1
+
+    async def test_ids_are_stable(self, gateway, client):
+        first = await client.validate_part("BAV99")
+        second = await client.validate_part("bav99")
+        assert first["part_id"] == second["part_id"]
+
+    async def test_unknown_part(self, gateway, client):
+        result = await client.validate_part("UNKNOWN42")
+        assert result["success"] is False
+        assert result["match_status"] == "No Match"
+
+    async def test_search_feeds_enrichment_extractors(self, gateway, client):
+        result = await client.search_parts("BENCH00001")
+        text = json.dumps(result)
+
+        assert result["success"] is True
+        assert " in stock" in text and "$" in text and "weeks" in text
+
+    async def test_company_endpoints(self, gateway, client):
+        litigations = await client.get_company_litigations("toshiba")
+        supply_chain = await client.get_company_supply_chain("toshiba")
+        events = await client.get_supply_chain_events()
+
+        assert litigations["data"]["Lawsuits"]
+        assert supply_chain["success"]
+        assert len(events["data"]) == 10
+
+    async def test_error_injection(self, gateway, client):
+        gateway.error_rate = 1.0
+        result = await client.validate_part("LM317")
+
+        assert result == {"success": False, "error": "API error: 503"}
+        assert gateway.errors["GetValidationPart"] == 1
+
+
+@pytest.mark.asyncio
+class TestFakeLLM:
+    """Test that fake models answer deterministically per role"""
+
+    async def test_router(self):
+        router = FakeChatModel("router")
+        assert router.invoke([{"role": "user", "content": "search for LM317"}]).content == "data"
+        assert (await router.ainvoke("write a python function")).content == "code"
+        assert router.invoke("hello there").content == "chat"
+        assert router.calls == 3
+
+    async def test_analysis_reads_query_from_template(self):
+        analysis = FakeChatModel("analysis")
+        prompt = 'Analyze this query.\n\nQuery: "toshiba litigations"\n\nExamples: LM317, BAV99'
+        result = json.loads((await analysis.ainvoke(prompt)).content)
+
+        assert result["is_litigation_query"] is True
+        assert result["part_number"] is None
+
+    async def test_code_is_runnable_and_stable(self):
+        from code_extraction import extract_code, check_syntax
+        code_model = FakeChatModel("code")
+        first = code_model.invoke("Generate Python code for: sum of squares").content
+
+        assert first == code_model.invoke("Generate Python code for: sum of squares").content
+        assert check_syntax(extract_code(first)) is None
+
+
+class TestReport:
+    """Test percentiles and baseline comparison"""
+
+    def test_percentile(self):
+        values = [i / 1000 for i in range(1, 101)]
+        assert percentile(values, 0.5) == 0.05
+        assert percentile(values, 0.99) == 0.099
+        assert percentile([], 0.95) == 0.0
+
+    def test_summarize(self):
+        result = summarize([0.1, 0.2, 0.3, 0.4], errors=1, duration=2.0, peak_rss_kb=204800)
+        assert result["turns"] == 5
+        assert result["throughput"] == 2.0
+        assert result["peak_rss_mb"] == 200.0
+
+    def test_compare(self, capsys):
+        baseline = {"results": {"data": {"throughput": 10.0, "p95_ms": 100.0, "p99_ms": 150.0, "peak_rss_mb": 300.0}}}
+        current = {
+            "data": {"throughput": 7.0, "p95_ms": 110.0, "p99_ms": 200.0, "peak_rss_mb": 250.0},
+            "chat": {"throughput": 1.0, "p95_ms": 1.0, "p99_ms": 1.0, "peak_rss_mb": 1.0}
+        }
+
+        regressions = compare(current, baseline, tolerance=0.2)
+
+        assert regressions == ["data throughput -30.0%", "data p99_ms +33.3%"]
+        assert "chat: no baseline" in capsys.readouterr().out
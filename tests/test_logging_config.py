@@ -0,0 +1,128 @@
+"""
+Test suite for queued JSON logging, per-module levels and payload sampling
+"""
+import pytest
+import io
+import json
+import logging
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from logging_config import (
+    configure_logging, stop_logging, parse_levels, PayloadSampler, JsonFormatter, PAYLOAD
+)
+from tracing import Tracer
+
+
+@pytest.fixture
+def output():
+    """Configure logging into a buffer and restore the root logger afterwards"""
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    stream = io.StringIO()
+    configure_logging(level="INFO", levels="test.verbose=DEBUG", fmt="json", sample_rate=0.25, stream=stream)
+    yield stream
+    stop_logging()
+    root.handlers[:] = saved_handlers
+    root.setLevel(saved_level)
+    logging.getLogger("test.verbose").setLevel(logging.NOTSET)
+
+
+def records(stream):
+    stop_logging()  # Drains the queue
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestLevels:
+    """Test LOG_LEVELS parsing"""
+
+    def test_parse_levels(self):
+        assert parse_levels("agents_simple=debug, httpx=WARNING") == {"agents_simple": "DEBUG", "httpx": "WARNING"}
+
+    def test_malformed_entries_ignored(self):
+        assert parse_levels("agents_simple,=DEBUG,app=") == {}
+        assert parse_levels("") == {}
+
+
+class TestSampler:
+    """Test payload record sampling"""
+
+    def make_record(self, payload):
+        record = logging.LogRecord("test", logging.DEBUG, __file__, 1, "payload", None, None)
+        if payload:
+            record.payload = True
+        return record
+
+    def test_keeps_every_nth_payload(self):
+        sampler = PayloadSampler(rate=0.25)
+        kept = [sampler.filter(self.make_record(True)) for _ in range(8)]
+        assert kept == [True, False, False, False, True, False, False, False]
+
+    def test_other_records_pass(self):
+        sampler = PayloadSampler(rate=0.0)
+        assert sampler.filter(self.make_record(False)) is True
+        assert sampler.filter(self.make_record(True)) is False
+
+
+class TestQueuedLogging:
+    """Test records written by the listener thread"""
+
+    def test_json_lines(self, output):
+        logging.getLogger("test.app").info("Saved %s rows", 3, extra={"conversation_id": "c1"})
+        entry = records(output)[0]
+
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "test.app"
+        assert entry["message"] == "Saved 3 rows"
+        assert entry["conversation_id"] == "c1"
+        assert "trace_id" not in entry
+
+    def test_per_module_levels(self, output):
+        logging.getLogger("test.app").debug("hidden")
+        logging.getLogger("test.verbose").debug("shown")
+        logging.getLogger("httpx").info("HTTP Request: GET /")
+
+        assert [entry["message"] for entry in records(output)] == ["shown"]
+
+    def test_payload_records_are_sampled(self, output):
+        log = logging.getLogger("test.verbose")
+        for i in range(8):
+            log.debug("params %s", i, extra=PAYLOAD)
+        log.debug("not a payload")
+
+        messages = [entry["message"] for entry in records(output)]
+        assert messages == ["params 0", "params 4", "not a payload"]
+
+    def test_arguments_merged_at_call_time(self, output):
+        params = {"part_number": "LM317"}
+        logging.getLogger("test.app").info("params %s", params)
+        params["part_number"] = "changed"
+
+        assert records(output)[0]["message"] == "params {'part_number': 'LM317'}"
+
+    def test_trace_id_attached(self, output):
+        tracer = Tracer(exporter=None)
+        with tracer.span("turn") as span:
+            logging.getLogger("test.app").info("inside")
+
+        assert records(output)[0]["trace_id"] == span.trace_id
+
+    def test_exception_rendered(self, output):
+        try:
+            raise ValueError("bad part")
+        except ValueError:
+            logging.getLogger("test.app").error("failed", exc_info=True)
+
+        entry = records(output)[0]
+        assert "ValueError: bad part" in entry["exception"]
+
+
+class TestFormatter:
+    """Test JSON rendering of unusual values"""
+
+    def test_non_serializable_extra(self):
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+        record.path = object()
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["path"].startswith("<object object")
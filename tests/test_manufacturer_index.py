@@ -0,0 +1,141 @@
+"""
+Test suite for the keyword automaton and the shared manufacturer alias index
+"""
+import pytest
+import sys
+import os
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from keyword_automaton import KeywordAutomaton
+from manufacturer_index import ManufacturerIndex, manufacturer_index
+
+
+class TestKeywordAutomaton:
+    """Test single-pass multi-keyword scanning"""
+
+    def test_overlapping_matches(self):
+        automaton = KeywordAutomaton()
+        for word in ["he", "she", "his", "hers"]:
+            automaton.add(word, word.upper())
+
+        found = sorted((start, keyword) for start, _, keyword, _ in automaton.scan("ushers"))
+        assert found == [(1, "she"), (2, "he"), (2, "hers")]
+
+    def test_word_boundaries(self):
+        automaton = KeywordAutomaton(word_boundaries=True)
+        automaton.add("ti", "Texas Instruments")
+
+        assert list(automaton.scan("litigation")) == []
+        assert [m[:2] for m in automaton.scan("lm317 ti")] == [(6, 8)]
+
+    def test_longest_matches(self):
+        automaton = KeywordAutomaton()
+        automaton.add("texas", 1)
+        automaton.add("texas instruments", 2)
+        automaton.add("instruments", 3)
+
+        matches = automaton.longest_matches("texas instruments lm317")
+        assert [value for _, _, _, value in matches] == [2]
+
+    def test_keywords_added_after_scan(self):
+        automaton = KeywordAutomaton()
+        automaton.add("nxp")
+        assert len(list(automaton.scan("nxp and rohm"))) == 1
+
+        automaton.add("rohm")
+        assert len(list(automaton.scan("nxp and rohm"))) == 2
+        assert len(automaton) == 2
+
+
+class TestManufacturerIndex:
+    """Test alias lookup, free-text scanning and learning"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        path = tmp_path / "manufacturers.json"
+        path.write_text(json.dumps({"manufacturers": [
+            {"name": "Texas Instruments", "aliases": ["TI", "Burr-Brown"]},
+            {"name": "TE Connectivity", "aliases": ["Tyco Electronics"], "lookup_only": ["TE"]},
+            {"name": "Diodes Incorporated", "aliases": []},
+        ]}))
+        return ManufacturerIndex(str(path))
+
+    def test_lookup(self, index):
+        assert index.lookup("ti") == "Texas Instruments"
+        assert index.lookup("BURR BROWN") == "Texas Instruments"
+        assert index.lookup("Texas Instruments Inc.") == "Texas Instruments"
+        assert index.lookup("Diodes") == "Diodes Incorporated"
+        assert index.lookup("Acme") is None
+        assert index.lookup(None) is None
+
+    def test_scan_offsets(self, index):
+        query = "LM317 by Burr-Brown or TI"
+        matches = index.scan(query)
+
+        assert [m["manufacturer"] for m in matches] == ["Texas Instruments", "Texas Instruments"]
+        assert [m["alias"] for m in matches] == ["Burr-Brown", "TI"]
+        assert query[matches[0]["start"]:matches[0]["end"]] == "Burr-Brown"
+
+    def test_lookup_only_aliases_are_not_scanned(self, index):
+        assert index.lookup("TE") == "TE Connectivity"
+        assert index.find("the te part") is None
+        assert index.find("Tyco Electronics connectors") == "TE Connectivity"
+
+    def test_no_match_inside_words(self, index):
+        assert index.find("litigations for acme") is None
+
+    def test_learn(self, index):
+        assert index.learn("Texas Instr.", "Texas Instruments Incorporated") == "Texas Instruments"
+        assert index.lookup("texas instr") == "Texas Instruments"
+
+        assert index.learn("Acme Semi", "ACME Semiconductor") == "ACME Semiconductor"
+        assert index.lookup("acme semi") == "ACME Semiconductor"
+        assert index.find("acme semiconductor litigations") == "ACME Semiconductor"
+
+        assert index.learn("Unknown", None) is None
+        assert index.lookup("Unknown") is None
+
+    def test_learned_spellings_are_lookup_only(self, index):
+        index.learn("the", "ACME Semiconductor")
+
+        assert index.lookup("the") == "ACME Semiconductor"
+        assert index.find("the price of LM317") is None
+
+    def test_bundled_data(self):
+        assert manufacturer_index.lookup("TI") == "Texas Instruments"
+        assert manufacturer_index.lookup("ON Semiconductor") == "onsemi"
+        assert manufacturer_index.find("toshiba litigations") == "Toshiba"
+
+
+class TestQueryExtraction:
+    """Test that MCP parameter extraction resolves manufacturers from the index"""
+
+    @pytest.fixture
+    def registry(self):
+        from mcp_registry import MCPRegistry
+        registry = MCPRegistry()
+        registry.llm = None
+        return registry
+
+    def test_company_query(self, registry):
+        params = registry._simple_extraction_fallback("toshiba litigations")
+        assert params == {"part_number": None, "manufacturer": None, "company": "Toshiba"}
+
+    def test_part_query(self, registry):
+        params = registry._simple_extraction_fallback("cross references for LM317-W Texas Instruments")
+        assert params == {"part_number": "LM317-W", "manufacturer": "Texas Instruments", "company": None}
+
+    @pytest.mark.asyncio
+    async def test_known_names_skip_the_llm(self, registry):
+        class RecordingLLM:
+            calls = 0
+
+            async def ainvoke(self, messages):
+                self.calls += 1
+
+        registry.llm = RecordingLLM()
+        analysis = await registry.analyze_query("company details for Intel")
+        assert registry.llm.calls == 0
+        assert analysis["tool"]["name"] == "Company_Details"
+        assert analysis["parameters"]["company"] == "Intel"
@@ -0,0 +1,130 @@
+"""
+Test suite for MCP tool selection
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mcp_registry import MCPRegistry
+
+
+class FakeLLM:
+    """Records extraction calls and returns a canned JSON answer"""
+
+    def __init__(self, content="{}"):
+        self.content = content
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return type("Response", (), {"content": self.content})()
+
+
+@pytest.fixture
+def registry():
+    registry = MCPRegistry()
+    registry.llm = FakeLLM()
+    return registry
+
+
+class TestToolSelection:
+    """Test keyword index scoring and boost rules"""
+
+    @pytest.mark.parametrize("query,tool", [
+        ("search for LM317", "Part_Search"),
+        ("LM317 TI", "Part_Details"),
+        ("market availability for LM317", "Market_Availability"),
+        ("cross references for LM317-W Texas Instruments", "Cross_References"),
+        ("alternatives for BAV99 Nexperia", "Cross_References"),
+        ("toshiba litigations", "Company_Litigations"),
+        ("Intel company details", "Company_Details"),
+        ("supply chain locations for NXP", "Supply_Chain_Locations"),
+        ("supply chain events", "Supply_Chain_Events"),
+        ("digikey stock for LM317", "Digikey_Stock"),
+        ("is LM317 rohs compliant", "Compliance_Data"),
+    ])
+    @pytest.mark.asyncio
+    async def test_selects_tool(self, registry, query, tool):
+        assert (await registry.analyze_query(query))["tool"]["name"] == tool
+
+    def test_substring_semantics(self, registry):
+        scores = registry._keyword_scores("litigations and lawsuits")
+        litigation = [t["name"] for t in registry.tools].index("Company_Litigations")
+
+        # 'litigation', 'litigations', 'lawsuit' keywords plus the litigation boost
+        assert scores[litigation] == 16.0
+
+    def test_supply_chain_boosts_are_exclusive(self, registry):
+        scores = registry._keyword_scores("supply chain events and locations for nxp")
+        names = [t["name"] for t in registry.tools]
+
+        # Locations takes the supply chain boost; Events only scores its own keywords
+        assert scores[names.index("Supply_Chain_Locations")] == 12.0
+        assert scores[names.index("Supply_Chain_Events")] == 2.0
+
+    @pytest.mark.asyncio
+    async def test_manufacturer_required_only_where_listed(self, registry):
+        requiring = [t["name"] for t in registry.tools if "manufacturer" in t.get("requires", [])]
+        assert requiring == ["Part_Details", "Cross_References"]
+
+        analysis = await registry.analyze_query("market availability for LM317")
+        assert analysis["parameters"]["manufacturer"] is None
+        assert analysis["tool"]["name"] == "Market_Availability"
+
+    @pytest.mark.asyncio
+    async def test_no_tool(self, registry):
+        analysis = await registry.analyze_query("hello")
+        assert analysis["tool"] is None
+        assert analysis["confidence"] == 0
+
+
+@pytest.mark.asyncio
+class TestLazyExtraction:
+    """Test that the LLM extractor only runs when the winning tool needs it"""
+
+    async def test_cheap_parameters_skip_llm(self, registry):
+        await registry.analyze_query("cross references for LM317 TI")
+        await registry.analyze_query("toshiba litigations")
+        await registry.analyze_query("search for BAV99")
+
+        assert registry.llm.calls == 0
+
+    async def test_unknown_company_uses_llm(self, registry):
+        registry.llm = FakeLLM('{"company": "Acme Semiconductor"}')
+
+        analysis = await registry.analyze_query("litigations for Acme Semiconductor")
+
+        assert registry.llm.calls == 1
+        assert analysis["tool"]["name"] == "Company_Litigations"
+        assert analysis["parameters"]["company"] == "Acme Semiconductor"
+
+    async def test_llm_fills_only_missing_values(self, registry):
+        registry.llm = FakeLLM('{"part_number": "lm317", "manufacturer": "EVVO Semi"}')
+
+        analysis = await registry.analyze_query("cross references for LM317-W by EVVO Semi")
+
+        assert analysis["parameters"]["part_number"] == "LM317-W"
+        assert analysis["parameters"]["manufacturer"] == "EVVO Semi"
+        assert analysis["tool"]["name"] == "Cross_References"
+
+
+@pytest.mark.asyncio
+class TestToolPlan:
+    """Test multi-tool plans for compound queries"""
+
+    async def test_compound_query(self, registry):
+        plan = (await registry.analyze_query("details, pricing and crosses for LM317 TI"))["plan"]
+
+        assert [tool["name"] for tool in plan] == ["Part_Details", "Market_Availability", "Cross_References"]
+
+    async def test_single_intent_has_single_step(self, registry):
+        assert len((await registry.analyze_query("cross references for LM317 TI"))["plan"]) == 1
+        assert (await registry.analyze_query("hello"))["plan"] == []
+
+    async def test_superseded_tools_are_dropped(self, registry):
+        plan = (await registry.analyze_query("digikey price for LM317"))["plan"]
+        assert [tool["name"] for tool in plan] == ["Digikey_Stock"]
+
+        plan = (await registry.analyze_query("datasheet and rohs for LM317 TI"))["plan"]
+        assert [tool["name"] for tool in plan] == ["Part_Details"]
@@ -0,0 +1,129 @@
+"""
+Test suite for the Prometheus-style metrics registry
+"""
+import pytest
+import httpx
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from metrics import MetricsRegistry, Counter, Gauge, Histogram, z2data_latency, cache_requests, model_name
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def sample(text, line_prefix):
+    """Value of the first exposition line starting with line_prefix"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not in output")
+
+
+class TestExposition:
+    """Test the text format for each metric type"""
+
+    def test_counter(self, registry):
+        requests = registry.register(Counter("requests_total", "Requests", ["route"]))
+        requests.labels(route="data").inc()
+        requests.labels(route="data").inc(2)
+        requests.labels(route='say "hi"').inc()
+
+        text = registry.render()
+        assert "# TYPE z2chat_requests_total counter" in text
+        assert 'z2chat_requests_total{route="data"} 3' in text
+        assert 'z2chat_requests_total{route="say \\"hi\\""} 1' in text
+
+    def test_gauge_and_callbacks(self, registry):
+        sockets = registry.register(Gauge("sockets", "Open sockets"))
+        sockets.inc()
+        sockets.inc()
+        sockets.dec()
+        registry.register(Gauge("memories", "Memories", callback=lambda: 7))
+        registry.register(Gauge("queue", "Queue", ["state"], callback=lambda: {"running": 2, "queued": 5}))
+
+        text = registry.render()
+        assert "z2chat_sockets 1" in text
+        assert "z2chat_memories 7" in text
+        assert 'z2chat_queue{state="running"} 2' in text
+        assert 'z2chat_queue{state="queued"} 5' in text
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        latency = registry.register(Histogram("latency_seconds", "Latency", ["tier"], buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            latency.labels(tier="llm").observe(value)
+
+        text = registry.render()
+        assert sample(text, 'z2chat_latency_seconds_bucket{tier="llm",le="0.1"}') == 1
+        assert sample(text, 'z2chat_latency_seconds_bucket{tier="llm",le="1"}') == 3
+        assert sample(text, 'z2chat_latency_seconds_bucket{tier="llm",le="+Inf"}') == 4
+        assert sample(text, 'z2chat_latency_seconds_count{tier="llm"}') == 4
+        assert sample(text, 'z2chat_latency_seconds_sum{tier="llm"}') == pytest.approx(4.05)
+
+    def test_histogram_timer(self, registry):
+        latency = registry.register(Histogram("op_seconds", "Op"))
+        with pytest.raises(ValueError):
+            with latency.labels().time():
+                raise ValueError("still observed")
+        assert sample(registry.render(), "z2chat_op_seconds_count") == 1
+
+    def test_duplicate_registration(self, registry):
+        registry.register(Counter("dup_total", "Dup"))
+        with pytest.raises(ValueError):
+            registry.register(Counter("dup_total", "Dup"))
+
+    def test_model_name(self):
+        class Anthropic:
+            model = "claude-3-haiku"
+
+        class OpenAI:
+            model_name = "gpt-5-nano"
+
+        assert model_name(Anthropic()) == "claude-3-haiku"
+        assert model_name(OpenAI()) == "gpt-5-nano"
+
+
+@pytest.mark.asyncio
+class TestInstrumentation:
+    """Test that hot paths feed the global metrics"""
+
+    async def test_z2data_transport(self, monkeypatch):
+        from z2data_client import InstrumentedTransport
+
+        async def fake_request(self, request):
+            return httpx.Response(503, request=request)
+
+        monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", fake_request)
+        series = z2data_latency.labels(endpoint="/GetValidationPart", status="503")
+        before = sum(series.counts)
+
+        async with httpx.AsyncClient(transport=InstrumentedTransport()) as client:
+            response = await client.post("https://gateway.example/GetValidationPart?ApiKey=x", json={})
+
+        assert response.status_code == 503
+        assert sum(series.counts) == before + 1
+
+    async def test_tool_cache_counters(self):
+        from tool_dispatch import ToolDispatcher
+
+        class Client:
+            async def lookup(self, value):
+                return {"success": True, "value": value}
+
+        class Agent:
+            z2_client = Client()
+
+        handler = {'method': 'lookup', 'args': ['part_number'], 'requires': ([], ''), 'cache_ttl': 60}
+        dispatcher = ToolDispatcher(Agent(), {'lookup': handler})
+        hits = cache_requests.labels(cache="tool", result="hit")
+        misses = cache_requests.labels(cache="tool", result="miss")
+        hits_before, misses_before = hits.value, misses.value
+
+        for _ in range(3):
+            await dispatcher.dispatch({'name': 'lookup', 'api_method': 'lookup'}, {'part_number': 'LM317'})
+
+        assert misses.value == misses_before + 1
+        assert hits.value == hits_before + 2
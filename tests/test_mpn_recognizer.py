@@ -0,0 +1,95 @@
+"""
+Test suite for the shared MPN recognizer
+"""
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from mpn_recognizer import extract_mpn, recognize, score_token
+
+# Golden set: query -> part number every call site must agree on
+GOLDEN_QUERIES = [
+    ("BAV99", "BAV99"),
+    ("bav99", "BAV99"),
+    ("search for LM317", "LM317"),
+    ("LM317-W", "LM317-W"),
+    ("cross references for LM317-W Texas Instruments", "LM317-W"),
+    ("lm317 ti", "LM317"),
+    ("bav99,lm toshiba", "BAV99"),
+    ("BAV99 by EVVO Semi", "BAV99"),
+    ("tps62840 market availability", "TPS62840"),
+    ("What is the lifecycle of STM32F103C8T6?", "STM32F103C8T6"),
+    ("Is 1N4148 RoHS compliant", "1N4148"),
+    ("2N2222 stock", "2N2222"),
+    ("LT1763CS8-3.3#TRPBF pricing", "LT1763CS8-3.3#TRPBF"),
+    ("GRM188R71H104KA93D", "GRM188R71H104KA93D"),
+    ("RC0603FR-0710KL datasheet", "RC0603FR-0710KL"),
+    ("SN74HC595N", "SN74HC595N"),
+    ("ATMEGA328P-PU alternatives", "ATMEGA328P-PU"),
+    ("find LM317.", "LM317"),
+    ("10000 units of LM317", "LM317"),
+    ("price of 430450212", "430450212"),
+    ("toshiba litigations", None),
+    ("Intel company details", None),
+    ("top 5 suppliers in 2024", None),
+    ("10uF 0805 capacitor 16V", None),
+    ("100k resistor 5%", None),
+    ("usb3 hub", None),
+    ("Q3 2024 report for TI", None),
+    ("", None),
+]
+
+
+class TestGoldenSet:
+    """Test the recognizer against the golden query set"""
+
+    @pytest.mark.parametrize("query,expected", GOLDEN_QUERIES)
+    def test_extract_mpn(self, query, expected):
+        assert extract_mpn(query) == expected
+
+    @pytest.mark.parametrize("query,expected", GOLDEN_QUERIES)
+    def test_registry_fallback_agrees(self, query, expected):
+        from mcp_registry import MCPRegistry
+        registry = MCPRegistry.__new__(MCPRegistry)
+
+        assert registry._simple_extraction_fallback(query)["part_number"] == expected
+
+
+class TestScoring:
+    """Test the candidate scoring model"""
+
+    def test_prefix_family_outranks_generic_token(self):
+        assert score_token("LM317") > score_token("AB317")
+
+    def test_values_are_not_parts(self):
+        for token in ["10uF", "3.3V", "100pcs", "2nd", "v1.2", "100nF"]:
+            assert score_token(token) == 0
+
+    def test_candidates_are_ranked(self):
+        candidates = recognize("replace XY12 with TPS62840")
+
+        assert [c["mpn"] for c in candidates] == ["TPS62840", "XY12"]
+        assert candidates[0]["start"] == 18
+        assert candidates[0]["end"] == 26
+
+
+@pytest.mark.asyncio
+class TestSearchParts:
+    """Test that Z2Data search uses the recognized part number"""
+
+    async def test_search_with_manufacturer(self):
+        from z2data_client import Z2DataClient
+
+        client = Z2DataClient(api_key="test")
+        requested = []
+
+        async def fake_details(part_number, manufacturer=""):
+            requested.append((part_number, manufacturer))
+            return {"success": True, "data": {}}
+
+        client.get_part_details = fake_details
+        result = await client.search_parts("search for LM317-W", "Texas Instruments")
+
+        assert requested == [("LM317-W", "Texas Instruments")]
+        assert result["part_found"] == "LM317-W"
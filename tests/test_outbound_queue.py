@@ -0,0 +1,164 @@
+"""
+Test suite for the per-connection outbound WebSocket queue
+"""
+import pytest
+import asyncio
+import json
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from outbound_queue import OutboundQueue, TurnSender, SLOW_CLIENT_CLOSE_CODE
+from metrics import websocket_frames_coalesced, websocket_slow_disconnects
+
+
+class FakeWebSocket:
+    """Records sent frames; sends block while the gate is closed"""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.close_code = None
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+    @property
+    def kinds(self):
+        return [frame.get("type") for frame in self.sent]
+
+
+def status(message):
+    return {"type": "status", "message": message}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+class TestOrdering:
+    """Test that frames reach the client in order, once"""
+
+    async def test_frames_sent_in_order(self):
+        ws = FakeWebSocket()
+        outbound = OutboundQueue(ws).start()
+        await outbound.send_json(status("working"))
+        await outbound.send_json({"type": "partial", "tool": "a"})
+        await outbound.send_text(json.dumps({"type": "response", "content": "done"}))
+        await outbound.close()
+
+        assert ws.kinds == ["status", "partial", "response"]
+
+    async def test_statuses_coalesce_behind_a_slow_send(self):
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        outbound = OutboundQueue(ws).start()
+        coalesced_before = websocket_frames_coalesced._series[()].value
+
+        await outbound.send_json(status("first"))  # Taken by the sender, blocked in send
+        await settle()
+        await outbound.send_json(status("second"))
+        await outbound.send_json({"type": "partial", "tool": "a"})
+        for i in range(3, 10):
+            await outbound.send_json(status(f"update {i}"))
+        await outbound.send_json({"type": "response", "content": "done"})
+        assert outbound.pending == 3
+
+        ws.gate.set()
+        await outbound.close()
+
+        assert [frame.get("message", frame["type"]) for frame in ws.sent] == ["first", "partial", "update 9", "response"]
+        assert websocket_frames_coalesced._series[()].value - coalesced_before == 7
+
+    async def test_each_turn_keeps_its_latest_status(self):
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        outbound = OutboundQueue(ws).start()
+        first, second = TurnSender(outbound, "a"), TurnSender(outbound, "b")
+
+        await outbound.send_json({"type": "partial"})  # Blocks the sender
+        await settle()
+        for i in range(3):
+            await first.send_json(status(f"a{i}"))
+            await second.send_json(status(f"b{i}"))
+        ws.gate.set()
+        await outbound.close()
+
+        assert [(frame.get("turn_id"), frame.get("message")) for frame in ws.sent[1:]] == [("a", "a2"), ("b", "b2")]
+
+    async def test_close_flushes_queued_frames(self):
+        ws = FakeWebSocket()
+        outbound = OutboundQueue(ws).start()
+        for i in range(20):
+            outbound.put({"type": "partial", "index": i})
+        await outbound.close()
+
+        assert [frame["index"] for frame in ws.sent] == list(range(20))
+        await outbound.send_json({"type": "response"})
+        assert len(ws.sent) == 20
+
+
+@pytest.mark.asyncio
+class TestSlowClients:
+    """Test that clients which do not keep up are disconnected"""
+
+    async def test_full_queue_disconnects(self):
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        outbound = OutboundQueue(ws, max_frames=3).start()
+        disconnects_before = websocket_slow_disconnects._series[()].value
+
+        for i in range(5):
+            await outbound.send_json({"type": "partial", "index": i})
+        await settle()
+
+        assert outbound.closed
+        assert ws.close_code == SLOW_CLIENT_CLOSE_CODE
+        assert websocket_slow_disconnects._series[()].value - disconnects_before == 1
+        await outbound.close()
+        assert ws.sent == []
+
+    async def test_statuses_never_fill_the_queue(self):
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        outbound = OutboundQueue(ws, max_frames=3).start()
+
+        for i in range(100):
+            await outbound.send_json(status(f"row {i}"))
+        assert not outbound.closed
+        assert outbound.pending <= 2
+        ws.gate.set()
+        await outbound.close()
+
+    async def test_stalled_send_disconnects(self):
+        ws = FakeWebSocket()
+        ws.gate.clear()
+        outbound = OutboundQueue(ws, send_timeout=0.05).start()
+
+        await outbound.send_json({"type": "response"})
+        await asyncio.sleep(0.1)
+
+        assert outbound.closed
+        assert ws.close_code == SLOW_CLIENT_CLOSE_CODE
+        await outbound.close()
+
+    async def test_client_gone(self):
+        class GoneWebSocket(FakeWebSocket):
+            async def send_text(self, text):
+                raise RuntimeError("Cannot call send once a close message has been sent")
+
+        ws = GoneWebSocket()
+        outbound = OutboundQueue(ws).start()
+        await outbound.send_json({"type": "response"})
+        await settle()
+
+        assert outbound.closed
+        assert ws.close_code is None
+        await outbound.close()
@@ -0,0 +1,85 @@
+"""
+Test suite for JSON serialization of response frames and persisted payloads
+"""
+import pytest
+import json
+import math
+import sys
+import os
+from datetime import datetime
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import serialization
+from serialization import ResponseFrame, dumps, loads
+from db_helpers import format_history_for_llm
+
+TABLE = {"type": "table", "title": "Enriched Data", "data": [{"Part Number": "LM317", "Price": "$0.42", "Note": "±5%"}]}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """Run a test with orjson (when installed) and with the stdlib fallback"""
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+class TestEncoding:
+    """Test dumps/loads on both encoders"""
+
+    def test_matches_stdlib_document(self, backend):
+        assert json.loads(dumps(TABLE)) == TABLE
+        assert "±5%" in dumps(TABLE)
+        assert ", " not in dumps({"a": 1, "b": [1, 2]})
+
+    def test_unsupported_values_become_strings(self, backend):
+        encoded = loads(dumps({"when": datetime(2024, 1, 2, 3, 4, 5), 7: "int key"}))
+        assert encoded["when"].startswith("2024-01-02")
+        assert encoded["7"] == "int key"
+
+    def test_large_integers(self, backend):
+        assert loads(dumps({"id": 2 ** 70})) == {"id": 2 ** 70}
+
+    def test_reads_nan_from_older_rows(self, backend):
+        assert math.isnan(loads('{"price": NaN}')["price"])
+
+
+class TestResponseFrame:
+    """Test that frames are encoded once and match the send_json document"""
+
+    def test_frame_document(self, backend):
+        frame = ResponseFrame(TABLE, "data", {"intent": "bom"})
+        assert json.loads(frame.encode()) == frame.to_dict()
+
+    def test_content_encoded_once(self, monkeypatch):
+        calls = []
+        real_dumps = serialization.dumps
+        monkeypatch.setattr(serialization, "dumps", lambda obj: calls.append(obj) or real_dumps(obj))
+
+        frame = ResponseFrame(TABLE, "data")
+        stored = frame.stored_content
+        frame.metadata = {"timings": {"total_ms": 12.5}}
+        encoded = frame.encode()
+
+        assert calls.count(TABLE) == 1
+        assert json.loads(stored) == TABLE
+        assert json.loads(encoded)["metadata"]["timings"]["total_ms"] == 12.5
+
+    def test_text_content_stored_as_is(self):
+        frame = ResponseFrame('He said "hi"', "chat")
+        assert frame.stored_content == 'He said "hi"'
+        assert json.loads(frame.encode())["content"] == 'He said "hi"'
+
+
+@pytest.mark.asyncio
+class TestHistory:
+    """Test history formatting of persisted structured content"""
+
+    async def test_stored_frame_content_in_history(self):
+        history = [
+            {"role": "user", "content": "enrich my BOM"},
+            {"role": "assistant", "content": ResponseFrame({"type": "text", "content": "Done"}, "data").stored_content},
+        ]
+        assert await format_history_for_llm(history) == "User: enrich my BOM\nAssistant: Done"
@@ -0,0 +1,292 @@
+"""
+Test suite for the shared state store: in-process and Redis-protocol backends
+"""
+import pytest
+import pytest_asyncio
+import asyncio
+import time
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from state_store import InProcessStore, RedisStore, StateStoreError, RELEASE_LOCK_SCRIPT
+
+
+class FakeRedisServer:
+    """Local stand-in speaking the subset of RESP2 RedisStore uses"""
+
+    def __init__(self):
+        self.data = {}  # key -> (expiry or None, str or list)
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/0"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry and entry[0] is not None and entry[0] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                writer.write(self._reply(self._run(args[0].upper(), args[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self, command, args):
+        if command in ("PING", "AUTH", "SELECT"):
+            return "+OK"
+        if command == "GET":
+            entry = self._live(args[0])
+            return entry[1] if entry else None
+        if command == "SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            if "NX" in options and self._live(key):
+                return None
+            expiry = time.monotonic() + int(args[2:][options.index("PX") + 1]) / 1000 if "PX" in options else None
+            self.data[key] = (expiry, value)
+            return "+OK"
+        if command == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if command == "RPUSH":
+            entry = self._live(args[0])
+            items = (entry[1] if entry else []) + list(args[1:])
+            self.data[args[0]] = (entry[0] if entry else None, items)
+            return len(items)
+        if command == "LTRIM":
+            entry = self._live(args[0])
+            if entry:
+                items = entry[1]
+                start, stop = int(args[1]), int(args[2])
+                start, stop = (start + len(items) if start < 0 else start), (stop + len(items) if stop < 0 else stop)
+                self.data[args[0]] = (entry[0], items[max(start, 0):stop + 1])
+            return "+OK"
+        if command == "LRANGE":
+            entry = self._live(args[0])
+            return list(entry[1]) if entry else []
+        if command == "EVAL":
+            # Only the lock release script is supported: delete KEYS[1] if it holds ARGV[1]
+            if args[0] != RELEASE_LOCK_SCRIPT or args[1] != "1":
+                return RuntimeError("ERR unsupported script")
+            entry = self._live(args[2])
+            if entry and entry[1] == args[3]:
+                del self.data[args[2]]
+                return 1
+            return 0
+        if command == "PEXPIRE":
+            entry = self._live(args[0])
+            if entry:
+                self.data[args[0]] = (time.monotonic() + int(args[1]) / 1000, entry[1])
+            return int(bool(entry))
+        return RuntimeError(f"ERR unknown command '{command}'")
+
+    def _reply(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, RuntimeError):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._reply(item) for item in value)
+        if value.startswith("+"):
+            return f"{value}\r\n".encode()
+        data = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+@pytest_asyncio.fixture
+async def redis_server():
+    server = FakeRedisServer()
+    url = await server.start()
+    server.url = url
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture(params=["memory", "redis"])
+async def store(request, redis_server):
+    if request.param == "memory":
+        store = InProcessStore()
+    else:
+        store = RedisStore(redis_server.url)
+    yield store
+    await store.close()
+
+
+@pytest.mark.asyncio
+class TestStoreContract:
+    """Test behavior both backends share"""
+
+    async def test_values_round_trip_as_copies(self, store):
+        value = {"part": "LM317", "sellers": ["DigiKey"]}
+        await store.set("tool:a", value)
+        value["sellers"].append("Mouser")
+
+        assert await store.get("tool:a") == {"part": "LM317", "sellers": ["DigiKey"]}
+        assert await store.get("missing") is None
+
+    async def test_ttl_and_delete(self, store):
+        await store.set("short", 1, ttl=0.05)
+        await store.set("long", 2)
+        await store.delete("long")
+        await asyncio.sleep(0.1)
+
+        assert await store.get("short") is None
+        assert await store.get("long") is None
+
+    async def test_append_keeps_newest(self, store):
+        await store.append("memory:c1", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+        await store.append("memory:c1", [{"role": "user", "content": "again"}], max_len=2, ttl=60)
+
+        assert [turn["content"] for turn in await store.get_list("memory:c1")] == ["hello", "again"]
+        assert await store.get_list("memory:none") == []
+
+    async def test_lock_is_exclusive(self, store):
+        order = []
+
+        async def worker(name):
+            async with store.lock("tool:x") as acquired:
+                assert acquired
+                order.append(f"{name} in")
+                await asyncio.sleep(0.02)
+                order.append(f"{name} out")
+
+        await asyncio.gather(worker("a"), worker("b"))
+        assert order in (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"])
+
+    async def test_lock_wait_times_out(self, store):
+        async with store.lock("tool:x"):
+            async with store.lock("tool:x", wait=0.05) as acquired:
+                assert acquired is False
+        async with store.lock("tool:x", wait=0.05) as acquired:
+            assert acquired is True
+
+
+@pytest.mark.asyncio
+class TestInProcessStore:
+    """Test in-process bounds"""
+
+    async def test_oldest_keys_evicted(self):
+        store = InProcessStore(max_keys=2)
+        for key in ("memory:a", "memory:b", "tool:c"):
+            await store.set(key, 1)
+
+        assert store.keys() == ["memory:b", "tool:c"]
+        assert store.keys("memory:") == ["memory:b"]
+
+    async def test_lock_entries_released(self):
+        store = InProcessStore()
+        async with store.lock("tool:x"):
+            pass
+        assert store._locks == {}
+
+
+@pytest.mark.asyncio
+class TestRedisStore:
+    """Test the RESP client against the stand-in server"""
+
+    async def test_connections_are_reused(self, redis_server):
+        store = RedisStore(redis_server.url)
+        for i in range(5):
+            await store.set(f"k{i}", i)
+        await store.close()
+        assert redis_server.connections == 1
+
+    async def test_expired_lock_is_not_released_by_old_holder(self, redis_server):
+        store = RedisStore(redis_server.url)
+        async with store.lock("tool:x", ttl=0.05) as acquired:
+            assert acquired
+            await asyncio.sleep(0.1)
+            # The lock expired and another worker took it
+            await store.execute(("SET", "lock:tool:x", "other-token"))
+
+        assert redis_server.data["lock:tool:x"][1] == "other-token"
+        await store.close()
+
+    async def test_server_errors_raise(self, redis_server):
+        store = RedisStore(redis_server.url)
+        with pytest.raises(StateStoreError, match="unknown command"):
+            await store.execute(("FLUSHALL",))
+        assert await store.get("still-works") is None
+        await store.close()
+
+    async def test_unreachable_server(self):
+        store = RedisStore("redis://127.0.0.1:1/0")
+        with pytest.raises(StateStoreError, match="Cannot connect"):
+            await store.get("key")
+
+
+@pytest.mark.asyncio
+class TestSharedAcrossWorkers:
+    """Test that separate workers sharing one server see the same state"""
+
+    async def test_memory_survives_reconnect_to_another_worker(self, redis_server):
+        from agents_simple import SimpleAgentOrchestrator
+        first, second = SimpleAgentOrchestrator(), SimpleAgentOrchestrator()
+        first.state_store, second.state_store = RedisStore(redis_server.url), RedisStore(redis_server.url)
+
+        await first.save_memory("c1", "My name is Ada", "Nice to meet you, Ada")
+        memory = await second.load_memory("c1")
+
+        assert [m.content for m in memory.chat_memory.messages] == ["My name is Ada", "Nice to meet you, Ada"]
+
+    async def test_tool_calls_single_flight(self, redis_server):
+        from tool_dispatch import ToolDispatcher
+        calls = []
+
+        class Client:
+            async def lookup(self, value):
+                calls.append(value)
+                await asyncio.sleep(0.1)
+                return {"success": True, "value": value}
+
+        class Agent:
+            z2_client = Client()
+
+        handler = {'method': 'lookup', 'args': ['part_number'], 'requires': ([], ''), 'cache_ttl': 60}
+        workers = [ToolDispatcher(Agent(), {'lookup': handler}, store=RedisStore(redis_server.url)) for _ in range(3)]
+
+        results = await asyncio.gather(*(
+            worker.dispatch({'name': 'lookup', 'api_method': 'lookup'}, {'part_number': 'LM317'})
+            for worker in workers
+        ))
+
+        assert calls == ["LM317"]
+        assert all(result["value"] == "LM317" for result in results)
+
+    async def test_store_outage_falls_back_to_direct_calls(self):
+        from tool_dispatch import ToolDispatcher
+
+        class Client:
+            async def lookup(self, value):
+                return {"success": True, "value": value}
+
+        class Agent:
+            z2_client = Client()
+
+        handler = {'method': 'lookup', 'args': ['part_number'], 'requires': ([], ''), 'cache_ttl': 60}
+        dispatcher = ToolDispatcher(Agent(), {'lookup': handler}, store=RedisStore("redis://127.0.0.1:1/0"))
+
+        result = await dispatcher.dispatch({'name': 'lookup', 'api_method': 'lookup'}, {'part_number': 'LM317'})
+        assert result["value"] == "LM317"
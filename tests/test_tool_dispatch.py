@@ -0,0 +1,213 @@
+"""
+Test suite for the declarative MCP tool dispatch table
+"""
+import pytest
+import asyncio
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tool_dispatch import TOOL_HANDLERS
+from mcp_registry import MCPRegistry
+
+
+class MockZ2Client:
+    """Records calls and returns canned Z2Data results"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_company_supply_chain(self, company_name):
+        self.calls.append(("get_company_supply_chain", company_name))
+        return {"success": True, "data": [{"SiteName": "Fab 1", "Country": "Japan"}], "company_name": company_name}
+
+    async def get_market_availability(self, part_number, manufacturer=""):
+        self.calls.append(("get_market_availability", part_number, manufacturer))
+        return {
+            "type": "market_availability",
+            "success": True,
+            "part_number": part_number,
+            "data": [{"PartNumber": part_number, "NumberOfSeller": 2, "Sellers": [
+                {"SellerName": "Digi-Key Electronics"},
+                {"SellerName": "Mouser"},
+            ]}]
+        }
+
+    async def get_company_litigations(self, company_name):
+        self.calls.append(("get_company_litigations", company_name))
+        return {"success": False, "error": "Company not found"}
+
+
+@pytest.fixture
+def agent():
+    from agents_simple import DataAgent
+    from state_store import InProcessStore
+    agent = DataAgent()
+    agent.z2_client = MockZ2Client()
+    agent.tool_dispatcher.store = InProcessStore()  # Keep cached results from leaking between tests
+    return agent
+
+
+def tool(name):
+    return MCPRegistry().get_tool_by_name(name)
+
+
+class TestHandlerTable:
+    """Test that every registry tool has a handler"""
+
+    def test_every_tool_is_dispatchable(self):
+        from z2data_client import Z2DataClient
+        from agents_simple import DataAgent
+
+        for spec in MCPRegistry().tools:
+            handler = TOOL_HANDLERS[spec['api_method']]
+            owner = DataAgent if handler.get('owner') == 'agent' else Z2DataClient
+            assert hasattr(owner, handler['method']), spec['name']
+            if handler.get('formatter'):
+                assert hasattr(DataAgent, handler['formatter']), spec['name']
+
+
+@pytest.mark.asyncio
+class TestDispatch:
+    """Test parameter binding, formatting, errors and caching"""
+
+    async def test_supply_chain_locations(self, agent):
+        result = await agent._execute_mcp_tool({
+            "tool": tool("Supply_Chain_Locations"),
+            "parameters": {"part_number": None, "manufacturer": None, "company": "Toshiba"}
+        })
+
+        assert agent.z2_client.calls == [("get_company_supply_chain", "Toshiba")]
+        assert result["type"] == "table"
+        assert result["data"] == [{"SiteName": "Fab 1", "Country": "Japan"}]
+
+    async def test_digikey_stock_filters_sellers(self, agent):
+        result = await agent._execute_mcp_tool({
+            "tool": tool("Digikey_Stock"),
+            "parameters": {"part_number": "LM317", "manufacturer": None, "company": None}
+        })
+
+        assert agent.z2_client.calls == [("get_market_availability", "LM317", "")]
+        assert result["type"] == "market_availability"
+        assert result["data"][0]["Sellers"] == [{"SellerName": "Digi-Key Electronics"}]
+        assert result["data"][0]["NumberOfSeller"] == 1
+
+    async def test_part_details_query_is_the_requested_part(self, agent):
+        async def get_part_details(part_number, manufacturer):
+            return {"type": "sections", "sections": [], "raw_data": {"MPN": "LM317T/NOPB"},
+                    "part_number": "LM317T/NOPB"}
+
+        agent._get_part_details = get_part_details
+        result = await agent._execute_mcp_tool({
+            "tool": tool("Part_Details"),
+            "parameters": {"part_number": "LM317T", "manufacturer": "Texas Instruments", "company": None}
+        })
+
+        assert result == {"type": "part_details", "data": {"MPN": "LM317T/NOPB"}, "query": "LM317T"}
+
+    async def test_missing_parameter(self, agent):
+        result = await agent._execute_mcp_tool({
+            "tool": tool("Company_Litigations"),
+            "parameters": {"part_number": None, "manufacturer": None, "company": None}
+        })
+
+        assert result == "Company name is required for litigation search"
+        assert agent.z2_client.calls == []
+
+    async def test_failure_message(self, agent):
+        result = await agent._execute_mcp_tool({
+            "tool": tool("Company_Litigations"),
+            "parameters": {"part_number": None, "manufacturer": None, "company": "Acme"}
+        })
+
+        assert result == "Failed to get litigation data: Company not found"
+
+    async def test_successful_results_are_cached(self, agent):
+        analysis = {
+            "tool": tool("Supply_Chain_Locations"),
+            "parameters": {"part_number": None, "manufacturer": None, "company": "Toshiba"}
+        }
+
+        await agent._execute_mcp_tool(analysis)
+        await agent._execute_mcp_tool(analysis)
+
+        assert len(agent.z2_client.calls) == 1
+
+    async def test_failures_are_not_cached(self, agent):
+        analysis = {
+            "tool": tool("Company_Litigations"),
+            "parameters": {"part_number": None, "manufacturer": None, "company": "Acme"}
+        }
+
+        await agent._execute_mcp_tool(analysis)
+        await agent._execute_mcp_tool(analysis)
+
+        assert len(agent.z2_client.calls) == 2
+
+    async def test_unknown_api_method(self, agent):
+        result = await agent._execute_mcp_tool({
+            "tool": {"name": "Mystery", "api_method": "get_mystery"},
+            "parameters": {}
+        })
+
+        assert result == "Unknown API method: get_mystery"
+
+
+class PlanZ2Client:
+    """Slow-ish fake client that records part validations and part_id reuse"""
+
+    def __init__(self):
+        self.validations = 0
+        self.part_ids = []
+
+    async def validate_part(self, part_number, manufacturer=""):
+        self.validations += 1
+        return {"success": True, "part_id": 42}
+
+    async def get_part_details(self, part_number, manufacturer="", part_id=None):
+        self.part_ids.append(part_id)
+        await asyncio.sleep(0.02)
+        return {"type": "part_details", "success": True, "data": {"MPN": part_number}}
+
+    async def get_market_availability(self, part_number, manufacturer="", part_id=None):
+        self.part_ids.append(part_id)
+        return {"type": "market_availability", "success": True, "data": []}
+
+    async def get_cross_references(self, part_number, manufacturer="", part_id=None):
+        self.part_ids.append(part_id)
+        await asyncio.sleep(0.01)
+        return {"success": True, "data": {}, "part_number": part_number}
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, frame):
+        self.frames.append(frame)
+
+
+@pytest.mark.asyncio
+class TestToolPlan:
+    """Test concurrent execution of multi-tool plans"""
+
+    async def test_compound_query(self, agent):
+        agent.z2_client = PlanZ2Client()
+        agent.mcp_registry.llm = None
+        websocket = FakeWebSocket()
+
+        result = await agent.process("details, pricing and crosses for LM317 TI", {}, websocket)
+
+        # One shared validation, reused by every part-level tool
+        assert agent.z2_client.validations == 1
+        assert agent.z2_client.part_ids == [42, 42, 42]
+
+        composite = result["response"]
+        assert composite["type"] == "composite"
+        assert [step["tool"] for step in composite["results"]] == [
+            "Part_Details", "Market_Availability", "Cross_References"
+        ]
+
+        # Partial frames arrive in completion order, before the final response
+        partials = [frame["tool"] for frame in websocket.frames if frame["type"] == "partial"]
+        assert partials == ["Market_Availability", "Cross_References", "Part_Details"]
@@ -0,0 +1,181 @@
+"""
+Test suite for per-turn span tracing
+"""
+import pytest
+import asyncio
+import json
+import threading
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from tracing import Tracer, RingBufferExporter, FileExporter, current_span, timings_requested
+from execution_scheduler import ExecutionScheduler
+import tracing
+import execution_scheduler
+
+
+@pytest.fixture
+def exporter():
+    return RingBufferExporter(max_spans=100)
+
+
+@pytest.fixture
+def tracer(exporter):
+    return Tracer(exporter)
+
+
+def span_names(otlp):
+    return [span["name"] for span in otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+
+
+class TestSpans:
+    """Test span nesting, status and export"""
+
+    def test_nesting_and_export_on_root_end(self, tracer, exporter):
+        with tracer.span("turn") as turn:
+            with tracer.span("router.route") as route:
+                assert current_span() is route
+            with tracer.span("agent.data"):
+                with tracer.span("z2data.validate_part"):
+                    pass
+            assert len(exporter.spans) == 0
+
+        spans = {span.name: span for span in exporter.spans}
+        assert set(spans) == {"turn", "router.route", "agent.data", "z2data.validate_part"}
+        assert {span.trace_id for span in spans.values()} == {turn.trace_id}
+        assert spans["z2data.validate_part"].parent_id == spans["agent.data"].span_id
+        assert spans["turn"].parent_id is None
+        assert current_span() is None
+
+    def test_error_status(self, tracer, exporter):
+        with pytest.raises(ValueError):
+            with tracer.span("turn"):
+                raise ValueError("boom")
+
+        otlp = exporter.spans[0].to_otlp()
+        assert otlp["status"] == {"code": 2, "message": "ValueError: boom"}
+
+    def test_otlp_fields(self, tracer, exporter):
+        with tracer.span("turn", conversation_id="c1", rows=3):
+            with tracer.span("child"):
+                pass
+
+        root, child = exporter.traces()[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+        assert child["parentSpanId"] == root["spanId"]
+        assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+        assert {"key": "rows", "value": {"intValue": "3"}} in root["attributes"]
+
+    def test_breakdown(self, tracer):
+        with tracer.span("turn") as turn:
+            with tracer.span("db.save_message"):
+                pass
+            with tracer.span("agent.code"):
+                with tracer.span("sandbox.execute"):
+                    pass
+            breakdown = turn.breakdown()
+
+        assert [(s["name"], s["depth"]) for s in breakdown["spans"]] == [
+            ("db.save_message", 1), ("agent.code", 1), ("sandbox.execute", 2)
+        ]
+        assert breakdown["trace_id"] == turn.trace_id
+        assert all(s["offset_ms"] <= breakdown["total_ms"] for s in breakdown["spans"])
+
+    def test_no_exporter_still_times(self):
+        tracer = Tracer(None)
+        with tracer.span("turn") as turn:
+            with tracer.span("child"):
+                pass
+        assert [s["name"] for s in turn.breakdown()["spans"]] == ["child"]
+
+    def test_ring_buffer_limit(self, tracer, exporter):
+        for i in range(5):
+            with tracer.span(f"turn-{i}"):
+                pass
+
+        traces = exporter.traces(limit=2)
+        assert [span_names(t) for t in traces] == [["turn-4"], ["turn-3"]]
+
+    def test_file_exporter(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        exporter = FileExporter(str(path))
+        tracer = Tracer(exporter)
+        for _ in range(2):
+            with tracer.span("turn"):
+                with tracer.span("child"):
+                    pass
+        exporter.flush()
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        assert span_names(json.loads(lines[0])) == ["turn", "child"]
+
+    def test_file_exporter_writes_off_the_caller_thread(self, tmp_path, monkeypatch):
+        path = tmp_path / "traces.jsonl"
+        exporter = FileExporter(str(path))
+        writers = []
+        real_otlp_request = tracing.otlp_request
+
+        def recording_otlp_request(spans):
+            writers.append(threading.current_thread())
+            return real_otlp_request(spans)
+
+        monkeypatch.setattr(tracing, "otlp_request", recording_otlp_request)
+        with Tracer(exporter).span("turn"):
+            pass
+        exporter.flush()
+
+        assert writers and threading.current_thread() not in writers
+        assert len(path.read_text().splitlines()) == 1
+
+
+@pytest.mark.asyncio
+class TestAsyncTracing:
+    """Test spans across awaits, concurrent tasks and threads"""
+
+    async def test_decorator_and_concurrent_children(self, tracer, exporter):
+        @tracer.traced("z2data.get_part_details")
+        async def fetch(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        @tracer.traced("mcp.extract_parameters")
+        def extract():
+            return current_span().name
+
+        with tracer.span("turn") as turn:
+            assert await asyncio.gather(fetch(0.01), fetch(0)) == [0.01, 0]
+            assert await asyncio.to_thread(extract) == "mcp.extract_parameters"
+
+        children = [s for s in exporter.spans if s.parent_id == turn.span_id]
+        assert sorted(s.name for s in children) == [
+            "mcp.extract_parameters", "z2data.get_part_details", "z2data.get_part_details"
+        ]
+
+    async def test_scheduler_wait_span(self, exporter, monkeypatch):
+        tracer = Tracer(exporter)
+        monkeypatch.setattr(execution_scheduler, "tracer", tracer)
+        scheduler = ExecutionScheduler(max_concurrent=1, max_queue=4)
+
+        async def job():
+            return current_span().name
+
+        with tracer.span("turn"):
+            assert await scheduler.run("c1", job) == "turn"
+
+        assert [s.name for s in exporter.spans] == ["turn", "scheduler.wait"]
+
+
+class TestTimingsRequested:
+    """Test when responses carry a timing breakdown"""
+
+    def test_per_message_flag(self, monkeypatch):
+        monkeypatch.setattr(tracing, "RESPONSE_TIMINGS", False)
+        assert timings_requested({"trace": True}) is True
+        assert timings_requested({}) is False
+        assert timings_requested(None) is False
+
+    def test_global_setting(self, monkeypatch):
+        monkeypatch.setattr(tracing, "RESPONSE_TIMINGS", True)
+        assert timings_requested({}) is True
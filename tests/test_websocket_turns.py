@@ -0,0 +1,148 @@
+"""
+Test suite for concurrent turns and cancellation on one WebSocket connection
+"""
+import pytest
+import asyncio
+import time
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+import app as appmod
+from models import Base
+
+
+class FakeOrchestrator:
+    """Answers "quick" at once and blocks on anything else until cancelled"""
+
+    def __init__(self):
+        self.cancelled = []
+
+    async def process_message(self, message, conversation_id, context=None, websocket=None):
+        if message != "quick":
+            await websocket.send_json({"type": "status", "message": f"working on {message}"})
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled.append(message)
+                raise
+        return {"response": f"answer to {message}", "agent_type": "chat", "success": True}
+
+
+@pytest.fixture
+def orchestrator(monkeypatch, tmp_path):
+    """The app with a fake orchestrator and a throwaway database"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'turns.db'}")
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    asyncio.run(create_tables())
+
+    orchestrator = FakeOrchestrator()
+    monkeypatch.setattr(appmod, "async_session", sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    monkeypatch.setattr(appmod, "agent_orchestrator", orchestrator)
+    yield orchestrator
+    asyncio.run(engine.dispose())
+
+
+def receive_until(ws, frame_type, turn_id=None):
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == frame_type and (turn_id is None or frame.get("turn_id") == turn_id
+                                            or frame.get("metadata", {}).get("turn_id") == turn_id):
+            return frame
+
+
+class TestConcurrentTurns:
+    """Test that a connection keeps reading while a turn runs"""
+
+    def test_quick_question_during_slow_turn(self, orchestrator):
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            ws.send_json({"content": "enrich my BOM", "turn_id": "slow"})
+            assert receive_until(ws, "status", "slow")["message"] == "working on enrich my BOM"
+
+            ws.send_json({"content": "quick", "turn_id": "fast"})
+            response = receive_until(ws, "response", "fast")
+            assert response["content"] == "answer to quick"
+
+            ws.send_json({"type": "cancel", "turn_id": "slow"})
+            assert receive_until(ws, "cancelled")["turn_id"] == "slow"
+
+        assert orchestrator.cancelled == ["enrich my BOM"]
+
+    def test_turn_ids_are_assigned(self, orchestrator):
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            ws.send_json({"content": "quick"})
+            response = receive_until(ws, "response")
+            assert response["metadata"]["turn_id"]
+
+    def test_in_flight_limit(self, orchestrator, monkeypatch):
+        monkeypatch.setattr(appmod, "MAX_TURNS_IN_FLIGHT", 1)
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            ws.send_json({"content": "first", "turn_id": "a"})
+            receive_until(ws, "status", "a")
+            ws.send_json({"content": "second", "turn_id": "b"})
+
+            error = receive_until(ws, "error", "b")
+            assert "already in progress" in error["content"]
+
+            ws.send_json({"type": "cancel"})
+            receive_until(ws, "cancelled", "a")
+            ws.send_json({"content": "quick", "turn_id": "c"})
+            assert receive_until(ws, "response", "c")["content"] == "answer to quick"
+
+    def test_duplicate_turn_id(self, orchestrator):
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            ws.send_json({"content": "first", "turn_id": "a"})
+            receive_until(ws, "status", "a")
+            ws.send_json({"content": "again", "turn_id": "a"})
+
+            error = receive_until(ws, "error", "a")
+            assert "turn_id 'a' is already in progress" in error["content"]
+            ws.send_json({"type": "cancel"})
+            receive_until(ws, "cancelled", "a")
+
+
+class TestCancellation:
+    """Test that abandoned turns stop"""
+
+    def test_cancel_all(self, orchestrator):
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            for turn_id in ("a", "b"):
+                ws.send_json({"content": f"task {turn_id}", "turn_id": turn_id})
+                receive_until(ws, "status", turn_id)
+            ws.send_json({"type": "cancel"})
+            cancelled = {receive_until(ws, "cancelled")["turn_id"] for _ in range(2)}
+
+        assert cancelled == {"a", "b"}
+
+    def test_disconnect_cancels_turns(self, orchestrator):
+        with TestClient(appmod.app).websocket_connect("/ws/c1") as ws:
+            ws.send_json({"content": "long report", "turn_id": "a"})
+            receive_until(ws, "status", "a")
+
+        deadline = time.monotonic() + 5
+        while not orchestrator.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert orchestrator.cancelled == ["long report"]
+
+    def test_cancelled_sandbox_run_kills_its_worker(self):
+        from code_sandbox import SimpleSandbox
+
+        async def scenario():
+            sandbox = SimpleSandbox(pool_size=0)
+            sandbox.timeout = 30
+            run = asyncio.create_task(sandbox.execute("while True:\n    pass"))
+            await asyncio.sleep(1.0)
+            run.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await run
+
+        started = time.monotonic()
+        asyncio.run(scenario())
+        assert time.monotonic() - started < 10